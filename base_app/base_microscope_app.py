@@ -14,6 +14,7 @@ from typing import Any, Dict, List, Protocol
 from qtpy import QtCore, QtGui, QtWidgets
 
 from ScopeFoundry import h5_io, ini_io
+from ScopeFoundry.h5_catalog import H5Catalog
 from ScopeFoundry.dynamical_widgets import new_tree_widget, new_widget
 from ScopeFoundry.h5_analyze_with_ipynb import generate_ipynb, generate_loaders_py
 from ScopeFoundry.helper_funcs import (
@@ -120,6 +121,19 @@ class BaseMicroscopeApp(BaseApp):
             initial="{timestamp:%y%m%d_%H%M%S}_{measurement.name}.{ext}",
         )
         # Potential new alternative default: '{unique_id_short}_{measurement.name}.{ext}'
+        self.settings.New(
+            name="settings_snapshots",
+            dtype=bool,
+            initial=False,
+            description="h5 files reference app and hardware settings stored once per directory in <i>settings_snapshots.h5</i> instead of embedding them",
+        )
+        self._h5_catalog = None
+        self.settings.New(
+            name="h5_catalog",
+            dtype=bool,
+            initial=False,
+            description="keep a searchable catalog of the h5 files in save_dir (<i>scopefoundry_catalog.sqlite</i>), updated when files are closed and by a background rescan",
+        ).add_listener(self.on_change_h5_catalog)
 
         self.settings.new_file(
             name="propose_from_file",
@@ -440,6 +454,37 @@ class BaseMicroscopeApp(BaseApp):
                 hw.settings.disconnect_all_from_hardware()
             except Exception as err:
                 self.log.error(f"tried to disconnect {hw.name}: {err}")
+        if self._h5_catalog is not None:
+            self._h5_catalog.stop_background_rescan()
+
+    def on_change_h5_catalog(self) -> None:
+        if self.settings["h5_catalog"]:
+            self.get_h5_catalog()
+        elif self._h5_catalog is not None:
+            self._h5_catalog.stop_background_rescan()
+            self._h5_catalog = None
+
+    def get_h5_catalog(self) -> H5Catalog:
+        """catalog covering save_dir, rescanned in the background"""
+        save_dir = Path(self.settings["save_dir"]).absolute()
+        catalog = self._h5_catalog
+        if catalog is None or not (
+            catalog.root == save_dir or catalog.root in save_dir.parents
+        ):
+            if catalog is not None:
+                catalog.stop_background_rescan()
+            catalog = self._h5_catalog = H5Catalog.for_dir(save_dir)
+            catalog.start_background_rescan()
+        return catalog
+
+    def catalog_h5_file(self, fname: str) -> None:
+        """adds a closed h5 file to the catalog if enabled"""
+        if not self.settings["h5_catalog"]:
+            return
+        try:
+            self.get_h5_catalog().add_file(fname)
+        except Exception as err:
+            self.log.warning(f"failed to catalog {fname}: {err}")
 
     def on_analyze_with_ipynb(self, folder: str = None) -> Path:
         if folder is None:
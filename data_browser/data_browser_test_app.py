@@ -1,6 +1,7 @@
 import sys
 
 from ScopeFoundry.data_browser import DataBrowser
+from ScopeFoundry.data_browser.plug_ins.h5_catalog_search import H5CatalogSearchPlugIn
 from ScopeFoundry.data_browser.plug_ins.h5_search import H5SearchPlugIn
 from ScopeFoundry.data_browser.plug_ins.time_note import TimeNote
 from ScopeFoundry.data_browser.viewers import H5TreeView, RangedOptimizationH5View
@@ -14,6 +15,7 @@ class MyDataBrowser(DataBrowser):
     def setup(self):
 
         self.add_plugin(H5SearchPlugIn(self))
+        self.add_plugin(H5CatalogSearchPlugIn(self))
         self.add_plugin(TimeNote(self))
 
         self.add_view(H5TreeView(self))
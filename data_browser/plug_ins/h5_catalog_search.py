@@ -0,0 +1,87 @@
+import datetime
+from pathlib import Path
+
+from qtpy import QtCore, QtWidgets
+
+from ScopeFoundry.data_browser.data_browser_plug_in import DataBrowserPlugIn
+from ScopeFoundry.h5_catalog import H5Catalog
+
+
+class H5CatalogSearchPlugIn(DataBrowserPlugIn):
+    name = "h5_catalog_search"
+    button_text = "🗂catalog"
+    show_keyboard_key = QtCore.Qt.Key_K
+    description = "search all .h5 files in browse_dir via the h5 catalog (Ctrl+K)"
+
+    def setup(self):
+        self.catalog = None
+
+        self.search_line = QtWidgets.QLineEdit()
+        self.measurement_line = QtWidgets.QLineEdit()
+        self.measurement_line.setPlaceholderText("*")
+        self.rescan_btn = QtWidgets.QPushButton("rescan")
+        self.results_list = QtWidgets.QListWidget()
+
+        search_layout = QtWidgets.QHBoxLayout()
+        search_layout.addWidget(QtWidgets.QLabel("🔍 text"))
+        search_layout.addWidget(self.search_line)
+        search_layout.addWidget(QtWidgets.QLabel("measurement"))
+        search_layout.addWidget(self.measurement_line)
+        search_layout.addWidget(self.rescan_btn)
+
+        self.ui = QtWidgets.QWidget(objectName="CatalogWidget")
+        self.ui.setMaximumHeight(1200)
+
+        layout = QtWidgets.QVBoxLayout(self.ui)
+        layout.addLayout(search_layout)
+        layout.addWidget(self.results_list)
+        self.ui.setStyleSheet(
+            "QWidget#CatalogWidget{background-color:rgba(120, 200, 120, 0.1)}"
+        )
+
+        self.search_line.textChanged.connect(self.new_search)
+        self.measurement_line.textChanged.connect(self.new_search)
+        self.rescan_btn.clicked.connect(self.rescan)
+        self.results_list.currentItemChanged.connect(self.on_select)
+        self.databrowser.settings.browse_dir.add_listener(self.on_change_browse_dir)
+        self.on_change_browse_dir()
+
+    def update(self, fname: str = None) -> None:
+        # keep the results (and selection) while browsing through them
+        if self.results_list.count() == 0:
+            self.new_search()
+
+    def on_change_browse_dir(self):
+        if self.catalog is not None:
+            self.catalog.stop_background_rescan()
+        self.catalog = H5Catalog.for_dir(self.databrowser.settings["browse_dir"])
+        self.catalog.start_background_rescan()
+
+    def rescan(self):
+        n = self.catalog.rescan()
+        print(f"catalog rescan: {n} file(s) indexed")
+        self.new_search()
+
+    def new_search(self):
+        results = self.catalog.search(
+            text=self.search_line.text(),
+            measurement=self.measurement_line.text() or None,
+        )
+        self.results_list.clear()
+        for entry in results:
+            t = ""
+            if entry["time_id"] is not None:
+                t = f"{datetime.datetime.fromtimestamp(entry['time_id']):%y%m%d %H:%M}"
+            item = QtWidgets.QListWidgetItem(
+                f"{t}  {entry['measurement']}  {entry['path'].name}"
+            )
+            item.setData(QtCore.Qt.UserRole, str(entry["path"]))
+            item.setToolTip(str(entry["path"]))
+            self.results_list.addItem(item)
+
+    def on_select(self, item, prev=None):
+        if item is None:
+            return
+        fname = item.data(QtCore.Qt.UserRole)
+        if Path(fname).is_file():
+            self.databrowser.settings["data_filename"] = fname
@@ -3,6 +3,8 @@ from typing import Dict, List, Set, Tuple
 
 import h5py
 
+from ScopeFoundry.h5_catalog import H5Catalog
+
 LOADERS_FNAME = "h5_data_loaders.py"
 
 LOADERS_PY_HEADER = """# generated with ScopeFoundry.tools
@@ -49,6 +51,23 @@ def load_settings(fname: str) -> Dict[str, Any]:
         for key, val in file.attrs.items():
             settings[key] = val       
         file.visititems(visit_func)
+
+        # settings stored as references to a shared settings snapshot store
+        snapshot_groups = []
+        file.visititems(
+            lambda name, node: (
+                snapshot_groups.append(name)
+                if "settings_snapshot" in node.attrs
+                else None
+            )
+        )
+        for name in snapshot_groups:
+            attrs = file[name].attrs
+            store_path = path.parent / attrs["settings_snapshot_store"]
+            with h5py.File(store_path, "r") as store:
+                snapshot = store["snapshots"][attrs["settings_snapshot"]]
+                for key, val in snapshot.attrs.items():
+                    settings[f"{name}/{key}"] = val
  
     return settings
 
@@ -142,30 +161,57 @@ def generate_loaders(dsets: Dict[str, Set[str]]) -> List[str]:
     return lines
 
 
-def get_dset_names(folder: str) -> Dict[str, Set[str]]:
+def find_h5_files(folder: str) -> List[Tuple[Path, str]]:
+    """(fname, measurement name) of the h5 files in *folder*, oldest first.
+    Queries the h5 catalog instead of opening the files if there is one."""
     path = Path(folder)
+    catalog = H5Catalog.find(path)
+    if catalog is None:
+        return [(fname, get_measurement_name(fname)) for fname in path.rglob("*.h5")]
+
+    catalog.rescan()
+    files = []
+    for entry in reversed(catalog.search()):
+        try:
+            rel = entry["path"].relative_to(path.absolute())
+        except ValueError:
+            continue
+        if entry["measurement"]:
+            files.append((path / rel, entry["measurement"]))
+    return files
+
+
+def get_dset_names(folder: str) -> Dict[str, Set[str]]:
+    catalog = H5Catalog.find(folder)
     dset_names = {}
-    for fname in path.rglob("*.h5"):
-        mm_name = get_measurement_name(fname)
-        with h5py.File(fname, "r") as file:
+    for fname, mm_name in find_h5_files(folder):
+        if catalog is not None:
+            prefix = f"measurement/{mm_name}/"
             new_keys = set(
-                [
-                    name
-                    for name, val in file[f"measurement/{mm_name}"].items()
-                    if isinstance(val, h5py.Dataset)
-                ]
+                name[len(prefix) :]
+                for name in catalog.datasets(fname)
+                if name.startswith(prefix) and "/" not in name[len(prefix) :]
             )
-            if mm_name in dset_names:
-                dset_names[mm_name] = dset_names[mm_name].union(new_keys)
-            else:
-                dset_names[mm_name] = new_keys
+        else:
+            with h5py.File(fname, "r") as file:
+                new_keys = set(
+                    [
+                        name
+                        for name, val in file[f"measurement/{mm_name}"].items()
+                        if isinstance(val, h5py.Dataset)
+                    ]
+                )
+        if mm_name in dset_names:
+            dset_names[mm_name] = dset_names[mm_name].union(new_keys)
+        else:
+            dset_names[mm_name] = new_keys
 
     return dset_names
 
 
 def generate_loaders_py(folder: str = ".") -> Tuple[Path, Dict[str, Set[str]]]:
     path = Path(folder)
-    fnames = tuple(path.rglob("*.h5"))
+    fnames = find_h5_files(folder)
     lines = [LOADERS_PY_HEADER]
 
     if len(fnames):
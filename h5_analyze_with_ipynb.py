@@ -3,7 +3,7 @@ import os
 from pathlib import Path
 from typing import List, Dict, Union
 
-from ScopeFoundry.generate_loaders_py import generate_loaders_py, get_measurement_name
+from ScopeFoundry.generate_loaders_py import find_h5_files, generate_loaders_py
 from .helper_funcs import open_file
 
 IPYNB_DEMO_FNAME = "overview.ipynb"
@@ -62,8 +62,7 @@ def mk_cell_sources(folder: str) -> List:
 
     file_load_lines = []
     fname = "your_file_name.h5"
-    for fname in path.rglob("*.h5"):
-        mm_name = get_measurement_name(fname)
+    for fname, mm_name in find_h5_files(folder):
         file_load_lines.append(f'load_{mm_name}(r"{fname.relative_to(folder)}")')
 
     src_0 = [
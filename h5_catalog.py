@@ -0,0 +1,276 @@
+"""
+Incremental sqlite catalog of the h5 files below a data directory.
+
+Each file is opened once when it is closed by a measurement or found by a
+rescan. Searches afterwards only query the catalog database.
+"""
+
+import fnmatch
+import logging
+import sqlite3
+import threading
+from contextlib import closing
+from pathlib import Path
+from typing import Dict, List, Sequence, Tuple, Union
+
+import h5py
+
+from ScopeFoundry import h5_io
+
+logger = logging.getLogger(__name__)
+
+CATALOG_FNAME = "scopefoundry_catalog.sqlite"
+DEFAULT_SETTINGS_PATTERNS = ("app/sample", "measurement/*")
+SKIP_FNAMES = (h5_io.SETTINGS_SNAPSHOT_STORE_FNAME, h5_io.VIRTUAL_INDEX_FNAME)
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS files (
+    path TEXT PRIMARY KEY,
+    unique_id TEXT,
+    time_id INTEGER,
+    measurement TEXT,
+    mtime REAL,
+    size INTEGER
+);
+CREATE TABLE IF NOT EXISTS datasets (
+    path TEXT,
+    name TEXT,
+    shape TEXT,
+    dtype TEXT
+);
+CREATE TABLE IF NOT EXISTS settings (
+    path TEXT,
+    key TEXT,
+    value TEXT
+);
+CREATE INDEX IF NOT EXISTS files_measurement ON files (measurement);
+CREATE INDEX IF NOT EXISTS files_time_id ON files (time_id);
+CREATE INDEX IF NOT EXISTS datasets_path ON datasets (path);
+CREATE INDEX IF NOT EXISTS settings_path ON settings (path);
+CREATE INDEX IF NOT EXISTS settings_key ON settings (key);
+"""
+
+
+class H5Catalog:
+    """
+    sqlite catalog of the h5 files below *root*.
+
+    Paths are stored relative to *root* so the catalog moves with the data.
+    Only settings whose path matches one of *settings_patterns* are recorded.
+    """
+
+    def __init__(
+        self,
+        root: Union[str, Path],
+        fname: str = CATALOG_FNAME,
+        settings_patterns: Sequence[str] = DEFAULT_SETTINGS_PATTERNS,
+    ):
+        self.root = Path(root).absolute()
+        self.db_path = self.root / fname
+        self.settings_patterns = tuple(settings_patterns)
+        self._rescan_thread = None
+        self._stop_rescan = threading.Event()
+        with closing(self._connect()) as conn, conn:
+            conn.executescript(SCHEMA)
+
+    @classmethod
+    def find(cls, path: Union[str, Path], **kwargs) -> Union["H5Catalog", None]:
+        """catalog in *path* or its closest parent, None if there is none"""
+        path = Path(path).absolute()
+        for folder in (path, *path.parents):
+            if (folder / CATALOG_FNAME).is_file():
+                return cls(folder, **kwargs)
+        return None
+
+    @classmethod
+    def for_dir(cls, path: Union[str, Path], **kwargs) -> "H5Catalog":
+        """like *find* but creates a new catalog in *path* if there is none"""
+        return cls.find(path, **kwargs) or cls(path, **kwargs)
+
+    def _connect(self) -> sqlite3.Connection:
+        # one connection per call, so the catalog can be used from any thread
+        conn = sqlite3.connect(self.db_path, timeout=10.0)
+        conn.row_factory = sqlite3.Row
+        return conn
+
+    def _rel(self, fname: Union[str, Path]) -> str:
+        path = Path(fname).absolute()
+        try:
+            return path.relative_to(self.root).as_posix()
+        except ValueError:
+            return path.as_posix()
+
+    def _abs(self, rel: str) -> Path:
+        return self.root / rel
+
+    def add_file(self, fname: Union[str, Path]) -> bool:
+        """(re)index a single file, returns False if it could not be read"""
+        with closing(self._connect()) as conn, conn:
+            return self._add_file(conn, Path(fname))
+
+    def _add_file(self, conn: sqlite3.Connection, path: Path) -> bool:
+        try:
+            stat = path.stat()
+            entry, dsets, settings = self._read_file(path)
+        except (OSError, KeyError) as err:
+            # e.g. still open for writing, retried on the next rescan
+            logger.debug(f"could not catalog {path}: {err}")
+            return False
+        rel = self._rel(path)
+        conn.execute("DELETE FROM datasets WHERE path=?", (rel,))
+        conn.execute("DELETE FROM settings WHERE path=?", (rel,))
+        conn.execute(
+            "INSERT OR REPLACE INTO files VALUES (?, ?, ?, ?, ?, ?)",
+            (rel, *entry, stat.st_mtime, stat.st_size),
+        )
+        conn.executemany(
+            "INSERT INTO datasets VALUES (?, ?, ?, ?)",
+            [(rel, *dset) for dset in dsets],
+        )
+        conn.executemany(
+            "INSERT INTO settings VALUES (?, ?, ?)",
+            [(rel, key, str(val)) for key, val in settings.items()],
+        )
+        return True
+
+    def _read_file(self, path: Path) -> Tuple[Tuple, List[Tuple], Dict]:
+        dsets = []
+
+        def visit_func(name, node):
+            if isinstance(node, h5py.Dataset):
+                dsets.append((name, str(node.shape), str(node.dtype)))
+
+        with h5py.File(path, "r") as file:
+            attrs = file.attrs
+            unique_id = str(attrs.get("unique_id", ""))
+            time_id = int(attrs["time_id"]) if "time_id" in attrs else None
+            measurement = ""
+            if "measurement" in file:
+                names = list(file["measurement"].keys())
+                measurement = names[0] if len(names) == 1 else ""
+                measurement = str(attrs.get("measurement", measurement))
+            file.visititems(visit_func)
+
+        settings = {}
+        if self.settings_patterns:
+            for key, val in h5_io.load_settings(path).items():
+                if any(fnmatch.fnmatch(key, p) for p in self.settings_patterns):
+                    settings[key] = val
+        return (unique_id, time_id, measurement), dsets, settings
+
+    def rescan(self, pattern: str = "*.h5") -> int:
+        """
+        indexes new and modified files below root and drops entries of
+        removed files. returns the number of (re)indexed files.
+        """
+        with closing(self._connect()) as conn, conn:
+            known = {
+                row["path"]: (row["mtime"], row["size"])
+                for row in conn.execute("SELECT path, mtime, size FROM files")
+            }
+            n_indexed = 0
+            for path in self.root.rglob(pattern):
+                if path.name in SKIP_FNAMES:
+                    continue
+                rel = self._rel(path)
+                stat = path.stat()
+                if known.pop(rel, None) == (stat.st_mtime, stat.st_size):
+                    continue
+                n_indexed += self._add_file(conn, path)
+                if self._stop_rescan.is_set():
+                    return n_indexed
+            for rel in known:
+                if not self._abs(rel).exists():
+                    self._remove(conn, rel)
+        return n_indexed
+
+    def _remove(self, conn: sqlite3.Connection, rel: str) -> None:
+        for table in ("files", "datasets", "settings"):
+            conn.execute(f"DELETE FROM {table} WHERE path=?", (rel,))
+
+    def start_background_rescan(self, interval: float = 60.0) -> None:
+        """rescans every *interval* seconds in a daemon thread"""
+        if self._rescan_thread is not None and self._rescan_thread.is_alive():
+            return
+        self._stop_rescan.clear()
+
+        def loop():
+            while not self._stop_rescan.is_set():
+                try:
+                    self.rescan()
+                except sqlite3.Error as err:
+                    logger.warning(f"catalog rescan failed: {err}")
+                self._stop_rescan.wait(interval)
+
+        self._rescan_thread = threading.Thread(
+            target=loop, name="h5_catalog_rescan", daemon=True
+        )
+        self._rescan_thread.start()
+
+    def stop_background_rescan(self) -> None:
+        self._stop_rescan.set()
+        if self._rescan_thread is not None:
+            self._rescan_thread.join()
+            self._rescan_thread = None
+
+    def search(
+        self,
+        text: str = "",
+        measurement: str = None,
+        since: int = None,
+        until: int = None,
+        settings: Dict[str, str] = None,
+    ) -> List[Dict]:
+        """
+        files matching all given criteria, newest first.
+
+        *text* is a case-insensitive substring of the path, measurement name,
+        a dataset name or a recorded settings key or value. *measurement* and
+        the keys of *settings* may be fnmatch patterns. *since* and *until*
+        bound the time_id.
+        """
+        query = "SELECT * FROM files WHERE 1"
+        params = []
+        if text:
+            like = f"%{text}%"
+            query += """ AND (path LIKE ? OR measurement LIKE ?
+                OR path IN (SELECT path FROM datasets WHERE name LIKE ?)
+                OR path IN (SELECT path FROM settings
+                            WHERE key LIKE ? OR value LIKE ?))"""
+            params += [like] * 5
+        if measurement is not None:
+            query += " AND measurement GLOB ?"
+            params.append(measurement)
+        if since is not None:
+            query += " AND time_id >= ?"
+            params.append(since)
+        if until is not None:
+            query += " AND time_id <= ?"
+            params.append(until)
+        for key, val in (settings or {}).items():
+            query += (
+                " AND path IN (SELECT path FROM settings WHERE key GLOB ? AND value=?)"
+            )
+            params += [key, str(val)]
+        query += " ORDER BY time_id DESC, path DESC"
+
+        with closing(self._connect()) as conn:
+            rows = conn.execute(query, params).fetchall()
+        return [dict(row, path=self._abs(row["path"])) for row in rows]
+
+    def datasets(self, fname: Union[str, Path]) -> Dict[str, Tuple[str, str]]:
+        """recorded {dataset name: (shape, dtype)} of a file"""
+        with closing(self._connect()) as conn:
+            rows = conn.execute(
+                "SELECT name, shape, dtype FROM datasets WHERE path=?",
+                (self._rel(fname),),
+            ).fetchall()
+        return {row["name"]: (row["shape"], row["dtype"]) for row in rows}
+
+    def settings(self, fname: Union[str, Path]) -> Dict[str, str]:
+        """recorded settings values of a file (as strings)"""
+        with closing(self._connect()) as conn:
+            rows = conn.execute(
+                "SELECT key, value FROM settings WHERE path=?", (self._rel(fname),)
+            ).fetchall()
+        return {row["key"]: row["value"] for row in rows}
@@ -1,6 +1,12 @@
+import fnmatch
 import functools
+import hashlib
+import os
+import queue
+import re
+import threading
 from pathlib import Path
-from typing import Any, Dict, Tuple
+from typing import Any, Callable, Dict, List, Sequence, Tuple, Union
 
 import h5py
 import numpy as np
@@ -51,16 +57,61 @@ other thoughts:
     store git revision of code
     store git revision of ScopeFoundry
     EMD compatibility, NeXUS compatibility
+
+settings snapshots (app setting *settings_snapshots*):
+    the settings of /app and /hardware/<hc> are hashed and stored only once
+    in a snapshot store shared by all files of a directory (or a run).
+    The measurement file references the snapshot instead of embedding it:
+
+    * app
+        - settings_snapshot = # hash of the settings
+        - settings_snapshot_store = settings_snapshots.h5 # relative to file
+        L settings --> external link to settings_snapshots.h5:/snapshots/<hash>
 """
 
+SETTINGS_SNAPSHOT_STORE_FNAME = "settings_snapshots.h5"
+
+# store path -> (file identity, hashes known to exist in that store). The
+# hashes are only trusted while the identity (see _store_identity) is the one
+# seen after the last read, a deleted, recreated or otherwise modified store
+# is read again
+_known_snapshots: Dict[str, Tuple[tuple, set]] = {}
+
+
+def _store_identity(path: Path) -> Union[tuple, None]:
+    try:
+        stat = os.stat(path)
+    except FileNotFoundError:
+        return None
+    return (stat.st_dev, stat.st_ino, stat.st_mtime_ns, stat.st_size)
+
 
 def h5_base_file(
-    app, fname: str = None, measurement=None, dataset_metadata: DatasetMetadata = None
+    app,
+    fname: str = None,
+    measurement=None,
+    dataset_metadata: DatasetMetadata = None,
+    snapshot_store: Union[str, Path] = None,
 ) -> h5py.File:
+    """
+    creates an h5 file with groups /app and /hardware.
+
+    if *snapshot_store* is given (or the app setting *settings_snapshots* is
+    True) settings are stored as references to a shared snapshot store.
+    """
 
     if dataset_metadata is None:
         dataset_metadata = new_dataset_metadata(measurement, fname)
 
+    if (
+        snapshot_store is None
+        and "settings_snapshots" in app.settings
+        and app.settings["settings_snapshots"]
+    ):
+        snapshot_store = (
+            Path(dataset_metadata.h5_file_path).parent / SETTINGS_SNAPSHOT_STORE_FNAME
+        )
+
     h5_file = h5py.File(dataset_metadata.h5_file_path, "a")
     root = h5_file["/"]
     root.attrs["ScopeFoundry_version"] = 210
@@ -68,31 +119,101 @@ def h5_base_file(
     root.attrs["unique_id"] = dataset_metadata.unique_id
     root.attrs["uuid"] = str(dataset_metadata.u)
 
-    h5_save_app_lq(app, root)
-    h5_save_hardware_lq(app, root)
+    h5_save_app_lq(app, root, snapshot_store)
+    h5_save_hardware_lq(app, root, snapshot_store)
     return h5_file
 
 
-def h5_save_app_lq(app, h5group: h5py.Group) -> None:
+def h5_save_app_lq(app, h5group: h5py.Group, snapshot_store: Path = None) -> None:
     h5_app_group = h5group.create_group("app/")
     h5_app_group.attrs["name"] = app.name
     h5_app_group.attrs["ScopeFoundry_type"] = "App"
+    if snapshot_store is not None:
+        h5_link_lqcoll_snapshot(app.settings, h5_app_group, snapshot_store)
+        return
     settings_group = h5_app_group.create_group("settings")
     h5_save_lqcoll_to_attrs(app.settings, settings_group)
 
 
-def h5_save_hardware_lq(app, h5group: h5py.Group) -> None:
+def h5_save_hardware_lq(app, h5group: h5py.Group, snapshot_store: Path = None) -> None:
     h5_hardware_group = h5group.create_group("hardware/")
     h5_hardware_group.attrs["ScopeFoundry_type"] = "HardwareList"
     for hc_name, hc in app.hardware.items():
         h5_hc_group = h5_hardware_group.create_group(hc_name)
         h5_hc_group.attrs["name"] = hc.name
         h5_hc_group.attrs["ScopeFoundry_type"] = "Hardware"
+        if snapshot_store is not None:
+            h5_link_lqcoll_snapshot(hc.settings, h5_hc_group, snapshot_store)
+            continue
         h5_hc_settings_group = h5_hc_group.create_group("settings")
         h5_save_lqcoll_to_attrs(hc.settings, h5_hc_settings_group)
     return h5_hardware_group
 
 
+def lqcoll_snapshot_hash(settings) -> str:
+    """returns a hash that changes whenever a value or unit of *settings* changes"""
+    h = hashlib.sha1()
+    for lqname, lq in sorted(settings.as_dict().items()):
+        val = lq.val
+        h.update(lqname.encode())
+        if hasattr(val, "tobytes"):
+            # the same bytes in another shape or dtype are another value
+            h.update(f"{np.dtype(val.dtype).str}{np.shape(val)}".encode())
+            h.update(val.tobytes())
+        else:
+            h.update(repr(val).encode())
+        h.update(str(lq.unit).encode())
+    return h.hexdigest()
+
+
+def h5_link_lqcoll_snapshot(
+    settings, h5group: h5py.Group, snapshot_store: Union[str, Path]
+) -> str:
+    """
+    stores the settings of LQCollection *settings* in *snapshot_store* (only
+    if an identical snapshot does not exist yet) and references it from
+    *h5group*. returns the snapshot hash
+    """
+    snapshot_store = Path(snapshot_store).absolute()
+    snapshot_hash = lqcoll_snapshot_hash(settings)
+
+    key = snapshot_store.as_posix()
+    identity, known = _known_snapshots.get(key, (None, set()))
+    if (
+        snapshot_hash not in known
+        or identity is None
+        or identity != _store_identity(snapshot_store)
+    ):
+        with h5py.File(snapshot_store, "a") as store:
+            snapshots = store.require_group("snapshots")
+            if snapshot_hash not in snapshots:
+                h5_save_lqcoll_to_attrs(settings, snapshots.create_group(snapshot_hash))
+            known = set(snapshots.keys())
+        _known_snapshots[key] = (_store_identity(snapshot_store), known)
+
+    file_dir = Path(h5group.file.filename).absolute().parent
+    try:
+        store_ref = snapshot_store.relative_to(file_dir).as_posix()
+    except ValueError:
+        store_ref = snapshot_store.as_posix()
+
+    h5group.attrs["settings_snapshot"] = snapshot_hash
+    h5group.attrs["settings_snapshot_store"] = store_ref
+    h5group["settings"] = h5py.ExternalLink(store_ref, f"snapshots/{snapshot_hash}")
+    return snapshot_hash
+
+
+def load_settings_snapshot(
+    fname: Union[str, Path], h5group: h5py.Group
+) -> Dict[str, Any]:
+    """returns the settings attrs referenced by *h5group* of file *fname*"""
+    store_path = Path(h5group.attrs["settings_snapshot_store"])
+    if not store_path.is_absolute():
+        store_path = Path(fname).parent / store_path
+    with h5py.File(store_path, "r") as store:
+        return dict(store["snapshots"][h5group.attrs["settings_snapshot"]].attrs)
+
+
 def h5_save_lqcoll_to_attrs(settings, h5group: h5py.Group) -> None:
     """
     take a LQCollection
@@ -321,6 +442,346 @@ def extend_h5_dataset_along_axis(ds: np.ndarray, new_len: int, axis: int = 0) ->
     ds.resize(newshape)
 
 
+class GrowingH5Dataset:
+    """
+    Extendable HDF5 dataset for long acquisitions with an unknown number of
+    entries along *axis*.
+
+    Capacity grows geometrically (by *growth_factor*) so that n appends cost
+    O(log n) resizes, and appended entries are buffered in memory and written
+    in blocks of *buffer_size*. The number of entries on disk is tracked in
+    the dataset attribute *logical_length*, :meth:`close` trims the dataset
+    to it. Blocks are stored with *write(dset, index, value)*, pass
+    AsyncH5Writer.write to store them in the background.
+
+        ds = GrowingH5Dataset(h5_group, "counts", shape=(0, 512), dtype=float)
+        for spec in spectra:
+            ds.append(spec)
+        ds.close()
+    """
+
+    def __init__(
+        self,
+        h5_group: h5py.Group,
+        name: str,
+        shape: Tuple,
+        axis: int = 0,
+        dtype=None,
+        initial_capacity: int = 1024,
+        growth_factor: float = 2.0,
+        buffer_size: int = 256,
+        write: Callable = None,
+        **kwargs,
+    ) -> None:
+        assert growth_factor > 1
+        self.axis = axis
+        self.write = write
+        self.growth_factor = growth_factor
+        shape = list(shape)
+        shape[axis] = max(initial_capacity, 1)
+        kwargs.setdefault("chunks", True)
+        self.dset = create_extendable_h5_dataset(
+            h5_group, name, tuple(shape), axis, dtype, **kwargs
+        )
+        entry_shape = shape[:axis] + shape[axis + 1 :]
+        self._buffer = np.empty(
+            (max(buffer_size, 1),) + tuple(entry_shape), self.dset.dtype
+        )
+        self._n_buffered = 0
+        self.length = 0  # entries written to the dataset
+        self.dset.attrs["logical_length"] = 0
+
+    def __len__(self) -> int:
+        return self.length + self._n_buffered
+
+    @property
+    def capacity(self) -> int:
+        return self.dset.shape[self.axis]
+
+    def _slice(self, start: int, stop: int) -> Tuple:
+        sl = [slice(None)] * self.dset.ndim
+        sl[self.axis] = slice(start, stop)
+        return tuple(sl)
+
+    def reserve(self, n: int) -> None:
+        """makes sure the dataset can hold at least *n* entries"""
+        if n <= self.capacity:
+            return
+        new_capacity = self.capacity
+        while new_capacity < n:
+            new_capacity = int(new_capacity * self.growth_factor) + 1
+        extend_h5_dataset_along_axis(self.dset, new_capacity, self.axis)
+
+    def append(self, data: np.ndarray) -> None:
+        """appends a single entry"""
+        self._buffer[self._n_buffered] = data
+        self._n_buffered += 1
+        if self._n_buffered == len(self._buffer):
+            self._write_buffer()
+
+    def extend(self, data: np.ndarray) -> None:
+        """appends several entries stacked along *axis*"""
+        self._write_buffer()
+        self._write(np.asarray(data))
+
+    def _write(self, data: np.ndarray) -> None:
+        n = data.shape[self.axis]
+        self.reserve(self.length + n)
+        index = self._slice(self.length, self.length + n)
+        if self.write is None:
+            self.dset[index] = data
+        else:
+            self.write(self.dset, index, data)
+        self.length += n
+        self.dset.attrs["logical_length"] = self.length
+
+    def _write_buffer(self) -> None:
+        if self._n_buffered:
+            block = np.moveaxis(self._buffer[: self._n_buffered], 0, self.axis)
+            self._n_buffered = 0
+            self._write(block)
+
+    def flush(self) -> None:
+        """writes buffered entries and records the logical length in the file"""
+        self._write_buffer()
+        self.dset.attrs["logical_length"] = self.length
+
+    def trim(self) -> None:
+        """shrinks the dataset to its logical length"""
+        self.flush()
+        extend_h5_dataset_along_axis(self.dset, self.length, self.axis)
+
+    def close(self) -> None:
+        if self.dset.id.valid:
+            self.trim()
+
+
+class AsyncH5Writer:
+    """
+    Writes dset[index] = value in a background thread.
+
+    At most *max_pending* writes are queued, :meth:`write` blocks when the
+    queue is full, so memory use stays bounded. A failed write is raised
+    by the next call of :meth:`write` or :meth:`flush`.
+
+        writer = AsyncH5Writer()
+        writer.write(h5_group["counts"], (3, 0), spectrum)
+        writer.close()
+    """
+
+    def __init__(self, max_pending: int = 64) -> None:
+        self._queue = queue.Queue(maxsize=max_pending)
+        self._error = None
+        self._thread = threading.Thread(
+            target=self._run, name="AsyncH5Writer", daemon=True
+        )
+        self._thread.start()
+
+    def _run(self) -> None:
+        while True:
+            item = self._queue.get()
+            try:
+                if item is None:
+                    return
+                dset, index, value = item
+                if self._error is None:
+                    dset[index] = value
+            except Exception as err:
+                self._error = err
+            finally:
+                self._queue.task_done()
+
+    def _raise_error(self) -> None:
+        if self._error is not None:
+            err, self._error = self._error, None
+            raise err
+
+    def write(self, dset: h5py.Dataset, index, value) -> None:
+        self._raise_error()
+        # copy, the caller may reuse its array
+        self._queue.put((dset, index, np.array(value)))
+
+    def flush(self) -> None:
+        """waits until all queued writes are done"""
+        self._queue.join()
+        self._raise_error()
+
+    def close(self) -> None:
+        if self._thread.is_alive():
+            self._queue.put(None)
+            self._thread.join()
+        self._raise_error()
+
+
+VIRTUAL_INDEX_FNAME = "virtual_index.h5"
+
+
+def _natural_key(name: str) -> List:
+    return [int(x) if x.isdigit() else x for x in re.split(r"(\d+)", name)]
+
+
+def find_h5_datasets(
+    run_dir: Union[str, Path], dset_path: str, pattern: str = "*.h5"
+) -> List[Tuple[Path, str]]:
+    """
+    returns (file path, dataset name) of all datasets matching *dset_path*
+    (fnmatch pattern, e.g. 'measurement/*/counts') in files *pattern* of
+    *run_dir*. Sorted in acquisition order: by time_id of the file,
+    then by name, numbers within names are compared numerically.
+    """
+    found = []
+    for fpath in Path(run_dir).glob(pattern):
+        if fpath.name == VIRTUAL_INDEX_FNAME:
+            continue
+        with h5py.File(fpath, "r") as file:
+            names = []
+            file.visititems(
+                lambda name, node: (
+                    names.append(name)
+                    if isinstance(node, h5py.Dataset)
+                    and fnmatch.fnmatchcase(name, dset_path)
+                    else None
+                )
+            )
+            time_id = file.attrs.get("time_id", 0)
+        for name in names:
+            found.append(
+                (time_id, _natural_key(fpath.name), _natural_key(name), fpath, name)
+            )
+    found.sort(key=lambda x: x[:3])
+    return [(fpath, name) for *_, fpath, name in found]
+
+
+def h5_create_virtual_index(
+    sources: Sequence[Tuple[Path, str]],
+    fname: Union[str, Path],
+    base_shape: Tuple[int] = None,
+    dim_arrays: Sequence[np.ndarray] = None,
+    dim_names: Sequence[str] = None,
+    name: str = "data",
+    fillvalue=None,
+) -> Path:
+    """
+    creates file *fname* with a virtual dataset *name* that presents the
+    datasets of *sources* (file path, dataset name) as one array of shape
+    base_shape + source shape. The k-th source is placed at
+    np.unravel_index(k, base_shape), positions without a source (or None in
+    *sources*) read as *fillvalue*. All sources must have identical shapes
+    and dtypes.
+
+    *dim_arrays* (optional) are attached as dimension scales named
+    *dim_names* to the leading len(base_shape) dimensions.
+    """
+    if not any(sources):
+        raise ValueError("no source datasets to stitch")
+
+    fname = Path(fname)
+    shapes, dtypes = set(), set()
+    for fpath, dset_name in filter(None, sources):
+        with h5py.File(fpath, "r") as file:
+            shapes.add(file[dset_name].shape)
+            dtypes.add(file[dset_name].dtype)
+    if len(shapes) != 1 or len(dtypes) != 1:
+        raise ValueError(
+            f"incompatible source datasets: shapes {shapes}, dtypes {dtypes}"
+        )
+    shape, dtype = shapes.pop(), dtypes.pop()
+
+    if base_shape is None:
+        base_shape = (len(sources),)
+    base_shape = tuple(base_shape)
+    if len(sources) > np.prod(base_shape):
+        raise ValueError(f"{len(sources)} sources do not fit in {base_shape}")
+
+    layout = h5py.VirtualLayout(shape=base_shape + shape, dtype=dtype)
+    for k, source in enumerate(sources):
+        if source is None:
+            continue
+        fpath, dset_name = source
+        fpath = Path(fpath).absolute()
+        try:
+            src_fname = fpath.relative_to(fname.absolute().parent).as_posix()
+        except ValueError:
+            src_fname = fpath.as_posix()
+        if fpath == fname.absolute():
+            src_fname = "."
+        vsource = h5py.VirtualSource(src_fname, dset_name, shape=shape, dtype=dtype)
+        layout[np.unravel_index(k, base_shape)] = vsource
+
+    if fillvalue is None and dtype.kind == "f":
+        fillvalue = np.nan
+
+    with h5py.File(fname, "a") as file:
+        if name in file:
+            del file[name]
+        vds = file.create_virtual_dataset(name, layout, fillvalue=fillvalue)
+        vds.attrs["n_sources"] = sum(1 for src in sources if src is not None)
+        if dim_arrays is not None:
+            for ii, dim_array in enumerate(dim_arrays):
+                if dim_array is None or len(dim_array) != base_shape[ii]:
+                    continue
+                dim_name = dim_names[ii] if dim_names is not None else f"dim{ii+1}"
+                if dim_name in file:
+                    del file[dim_name]
+                dim_dset = file.create_dataset(dim_name, data=dim_array)
+                dim_dset.make_scale(dim_name)
+                vds.dims[ii].attach_scale(dim_dset)
+                vds.dims[ii].label = dim_name
+    return fname
+
+
+def h5_stitch_run_dir(
+    run_dir: Union[str, Path],
+    dset_path: str,
+    fname: Union[str, Path] = None,
+    pattern: str = "*.h5",
+) -> Path:
+    """
+    builds a virtual dataset index (default: run_dir/virtual_index.h5) of all
+    datasets *dset_path* (fnmatch pattern) in the files of *run_dir*, e.g. of
+    a sweep with res_in_new_dir or container_mode.
+
+    If run_dir contains a sweep file (with *indices* and *range_** datasets)
+    the data is arranged as the sweep: base_shape + (repetitions,) + shape
+    with the sweep ranges as dimension scales.
+
+        h5_stitch_run_dir("data/250101_120000_sweep_2d", "measurement/*/counts")
+        with h5py.File("data/250101_120000_sweep_2d/virtual_index.h5") as f:
+            f["data"][:, 3, 0]  # reads across all files
+    """
+    run_dir = Path(run_dir)
+    if fname is None:
+        fname = run_dir / VIRTUAL_INDEX_FNAME
+    sources = find_h5_datasets(run_dir, dset_path, pattern)
+
+    base_shape, dim_arrays, dim_names = None, None, None
+    sweeps = find_h5_datasets(run_dir, "measurement/*/indices", pattern)
+    if sweeps:
+        sweep_fpath, indices_name = sweeps[-1]
+        sweep_group_name = indices_name.rsplit("/", 1)[0]
+        with h5py.File(sweep_fpath, "r") as file:
+            indices = file[indices_name][:]
+            sweep_group = file[sweep_group_name]
+            ranges = sorted(k for k in sweep_group.keys() if k.startswith("range_"))
+            dim_names = ranges
+            dim_arrays = [sweep_group[k][:] for k in ranges]
+        if len(indices):
+            sweep_shape = tuple(indices.max(axis=0) + 1)
+            n_reps = int(np.ceil(len(sources) / len(indices)))
+            base_shape = sweep_shape + (n_reps,)
+            dim_arrays = dim_arrays + [np.arange(n_reps)]
+            dim_names = dim_names + ["repetition"]
+            # sources are in acquisition order, map them to sweep indices
+            flat = np.ravel_multi_index(tuple(indices.T), sweep_shape)
+            ordered = [None] * int(np.prod(base_shape))
+            for k, src in enumerate(sources):
+                point, rep = divmod(k, n_reps)
+                ordered[flat[point] * n_reps + rep] = src
+            sources = ordered
+
+    return h5_create_virtual_index(sources, fname, base_shape, dim_arrays, dim_names)
+
+
 def load_settings(fname: str) -> None:
     """
     returns a dictionary (path, value) of all settings stored in a h5 file
@@ -336,6 +797,18 @@ def load_settings(fname: str) -> None:
         file.visititems(visit_func)
         for key, val in file.attrs.items():
             settings[key] = val
+
+        snapshot_groups = []
+        file.visititems(
+            lambda name, node: (
+                snapshot_groups.append(name)
+                if "settings_snapshot" in node.attrs
+                else None
+            )
+        )
+        for name in snapshot_groups:
+            for key, val in load_settings_snapshot(fname, file[name]).items():
+                settings[f"{name}/{key}"] = val
     return settings
 
 
@@ -79,6 +79,11 @@ class Measurement:
         self.acq_thread = None
 
         self.interrupt_measurement_called = False
+        self._nested_in_thread = []  # see run_nested_in_thread
+
+        # if set to an open h5 group, open_new_h5_file appends the measurement
+        # group to it instead of creating a new file (see Sweep container mode)
+        self.h5_container = None
 
         self.settings = LQCollection(
             path=f"mm/{self.name}", event_filter=self.app.event_filter
@@ -297,16 +302,24 @@ class Measurement:
         self.progress.update_value(pct)
 
         if pct:
-            text = f"{self.name} (in {to_etr_str((100 - pct)/pct * (time.time() - self._t0))})"
+            text = f"{self.name} (in {to_etr_str(self.remaining_time(pct))})"
         else:
             text = self.name
 
-        if hasattr(self, "subwin"):
+        if self.subwin is not None:
             self.subwin.setWindowTitle(text)
 
         for manager in self._subtree_managers_:
             manager.set_header_text(0, text, None)
 
+    def remaining_time(self, pct):
+        """
+        Estimated seconds until the measurement is done at *pct* progress,
+        extrapolated linearly from the time since the run started. Override
+        for a better estimate.
+        """
+        return (100 - pct) / pct * (time.time() - self._t0)
+
     def _interrupt(self):
         """
         Kindly ask the measurement to stop.
@@ -320,6 +333,8 @@ class Measurement:
         if self.settings["run_state"].startswith("run"):
             self.log.info(f"measurement {self.name} interrupt called")
             self.interrupt_measurement_called = True
+            for measure in list(self._nested_in_thread):
+                measure._interrupt()
         # self.activation.update_value(False)
         # Make sure display is up to date
         # self.q_object._on_display_update_timer()
@@ -463,6 +478,68 @@ class Measurement:
         # returns false for a run failure or interrupted measurement
         return measure.settings["run_state"] == "stop_success"
 
+    def run_nested_in_thread(self, measure, nested_interrupt: bool = True):
+        """
+        Run the *run* method of another measurement *measure* directly on the
+        calling thread, usually from within this measurement's run.
+
+        In contrast to start_nested_measure_and_wait no thread is started and
+        there is no round trip to the GUI thread: *measure*'s pre_run, post_run
+        and display timer are not called. *measure*'s run_state goes through
+        run_thread_run to stop_success, stop_interrupted or stop_failure.
+
+        Interrupting this measurement also interrupts *measure*. If
+        *nested_interrupt* is True then interrupting the nested *measure* will
+        also interrupt the outer measurement.
+
+        An exception raised by measure.run is logged and not raised.
+
+        returns True if successful run, otherwise returns false for a run failure or interrupted measurement
+        """
+        measure.interrupt_measurement_called = False
+        # no signal: activation would start the thread of *measure*, but
+        # measure.interrupt() still reaches measure._interrupt
+        measure.activation.update_value(True, send_signal=False)
+        measure.run_state.update_value("run_thread_run")
+        self._nested_in_thread.append(measure)
+        measure._t0 = time.time()
+        success = False
+        profile = None
+        try:
+            # one profiler per thread, a profiling host includes *measure*
+            if measure.settings["profile"] and not self.settings["profile"]:
+                import cProfile
+
+                profile = cProfile.Profile()
+                profile.enable()
+            measure.run()
+            success = True
+        except Exception as err:
+            measure.log.error(f"nested run of {measure.name} failed: {err!r}")
+            traceback.print_exc()
+        finally:
+            if profile is not None:
+                profile.disable()
+                profile.print_stats(sort="time")
+            self._nested_in_thread.remove(measure)
+            measure.set_progress(0.0)  # set progress bars back to zero
+            measure.activation.update_value(False, send_signal=False)
+            if measure.interrupt_measurement_called:
+                measure.interrupt_measurement_called = False
+                measure.measurement_interrupted.emit()
+                end_state = "stop_interrupted"
+                if nested_interrupt:
+                    # on this thread, the activation signal would be queued
+                    self._interrupt()
+            elif not success:
+                end_state = "stop_failure"
+            else:
+                measure.measurement_sucessfully_completed.emit()
+                end_state = "stop_success"
+            measure.end_state = end_state
+            measure.run_state.update_value(end_state)
+        return end_state == "stop_success"
+
     def load_ui(self, ui_fname=None):
         """
         Loads and shows user interface.
@@ -644,8 +721,16 @@ class Measurement:
 
         from ScopeFoundry import h5_io
 
-        self.h5_file = h5_io.h5_base_file(self.app, dataset_metadata=dataset_metadata)
-        self.h5_meas_group = h5_io.h5_create_measurement_group(self, self.h5_file)
+        if self.h5_container is not None:
+            self.h5_file = self.h5_container.file
+            self.h5_meas_group = self._create_container_measurement_group(
+                dataset_metadata
+            )
+        else:
+            self.h5_file = h5_io.h5_base_file(
+                self.app, dataset_metadata=dataset_metadata
+            )
+            self.h5_meas_group = h5_io.h5_create_measurement_group(self, self.h5_file)
 
         if data:
             for name, value in data.items():
@@ -660,9 +745,29 @@ class Measurement:
 
         return self.h5_meas_group
 
+    def _create_container_measurement_group(self, dataset_metadata):
+        from ScopeFoundry import h5_io
+
+        group_name = f"measurement/{self.name}"
+        k = 1
+        while group_name in self.h5_container:
+            group_name = f"measurement/{self.name}_{k}"
+            k += 1
+        H = h5_io.h5_create_measurement_group(self, self.h5_container, group_name)
+        H.attrs["time_id"] = int(dataset_metadata.t0)
+        H.attrs["unique_id"] = dataset_metadata.unique_id
+        return H
+
     def close_h5_file(self):
-        if hasattr(self, "h5_file") and self.h5_file.id is not None:
-            self.h5_file.close()
+        if not hasattr(self, "h5_file") or not self.h5_file:
+            return
+        if self.h5_container is not None and self.h5_file == self.h5_container.file:
+            # shared file is owned by the host, do not close
+            self.h5_file.flush()
+            return
+        fname = self.h5_file.filename
+        self.h5_file.close()
+        self.app.catalog_h5_file(fname)
 
 
 class MeasurementQObject(QtCore.QObject):
@@ -0,0 +1,71 @@
+"""
+Streaming per-element statistics (Welford's algorithm).
+
+RunningStats keeps count, mean, sum of squared deviations, min and max of
+every element of an array of *shape*, updated one sample at a time in place,
+so repeated acquisitions need not be stored to get their mean and variance.
+"""
+
+from typing import Tuple
+
+import h5py
+import numpy as np
+
+STAT_NAMES = ("mean", "variance", "min", "max", "count")
+
+
+class RunningStats:
+
+    def __init__(self, shape: Tuple = (), dtype=float):
+        self.shape = tuple(shape)
+        self.count = np.zeros(self.shape, dtype=np.int64)
+        self.mean = np.zeros(self.shape, dtype=dtype)
+        self.m2 = np.zeros(self.shape, dtype=dtype)
+        self.min = np.full(self.shape, np.inf, dtype=dtype)
+        self.max = np.full(self.shape, -np.inf, dtype=dtype)
+
+    def reset(self):
+        self.count[...] = 0
+        self.mean[...] = 0
+        self.m2[...] = 0
+        self.min[...] = np.inf
+        self.max[...] = -np.inf
+
+    def add(self, index, value):
+        """adds the sample *value* to the elements at *index* (any numpy index)"""
+        value = np.asarray(value, dtype=self.mean.dtype)
+        count = self.count[index] + 1
+        mean = self.mean[index]
+        delta = value - mean
+        mean = mean + delta / count
+        self.count[index] = count
+        self.mean[index] = mean
+        self.m2[index] += delta * (value - mean)
+        self.min[index] = np.minimum(self.min[index], value)
+        self.max[index] = np.maximum(self.max[index], value)
+
+    def add_all(self, values):
+        """adds a sample of every element"""
+        self.add(Ellipsis, values)
+
+    @property
+    def variance(self) -> np.ndarray:
+        """unbiased sample variance, nan where fewer than 2 samples"""
+        with np.errstate(invalid="ignore", divide="ignore"):
+            return np.where(self.count > 1, self.m2 / (self.count - 1), np.nan)
+
+    @property
+    def std(self) -> np.ndarray:
+        return np.sqrt(self.variance)
+
+    def stats(self) -> dict:
+        return {name: getattr(self, name) for name in STAT_NAMES}
+
+    def write_h5(self, h5_group: h5py.Group, prefix: str):
+        """creates or overwrites datasets *prefix*_mean, *prefix*_variance, ..."""
+        for name, values in self.stats().items():
+            dset_name = f"{prefix}_{name}"
+            if dset_name in h5_group:
+                h5_group[dset_name][...] = values
+            else:
+                h5_group.create_dataset(dset_name, data=values)
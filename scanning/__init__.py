@@ -2,3 +2,4 @@ from .base_raster_scan import BaseRaster2DScan, BaseRaster3DScan
 from .base_raster_slow_scan import BaseRaster2DSlowScan, BaseRaster3DSlowScan
 from .base_raster_frame_slow_scan import BaseRaster2DFrameSlowScan
 from .base_raster_slow_scan_v2 import BaseRaster2DSlowScanV2, BaseRaster3DSlowScanV2
+from .base_nonraster_scan import BaseNonRaster2DScan
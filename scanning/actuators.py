@@ -1,4 +1,10 @@
-from typing import Any, Callable, Dict, Iterable, List, Tuple, Union
+import inspect
+import time
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass
+from typing import Any, Callable, Dict, Iterable, List, Sequence, Tuple, Union
+
+import numpy as np
 
 from ScopeFoundry.base_app import BaseMicroscopeApp
 
@@ -74,10 +80,184 @@ def mk_actuator_func(
         write_func = app.get_lq(write_info).update_value
 
     if read_info is None:
-        read_func = lambda: 0
+        if callable(write_info):
+            read_func = no_read
+        else:
+            read_func = LQReadBack(app.get_lq(write_info))
     elif callable(read_info):
         read_func = read_info
     else:
         read_func = app.get_lq(read_info).read_from_hardware
 
     return read_func, write_func
+
+
+def no_read():
+    """read func of actuators without read back"""
+    return 0
+
+
+class LQReadBack:
+    """
+    read func of an actuator given only by the settings path of its write
+    LQ: reads the LQ from hardware while it is connected to a hardware read
+    func (that is checked on every read, the hardware connects later)
+    """
+
+    def __init__(self, lq):
+        self.lq = lq
+
+    @property
+    def available(self) -> bool:
+        return self.lq.has_hardware_read()
+
+    def __call__(self):
+        if not self.available:
+            return no_read()
+        return self.lq.read_from_hardware()
+
+
+def has_read_back(read_func: ReadFunc) -> bool:
+    if isinstance(read_func, LQReadBack):
+        return read_func.available
+    return read_func is not no_read
+
+
+def actuator_owner(write_info: WriteInfo):
+    """
+    the component that writes an actuator: hw/<name> or mm/<name> of a
+    settings path, the object of a bound method, else the function itself
+    """
+    if isinstance(write_info, str):
+        parts = write_info.split("/")
+        return "/".join(parts[:2]) if parts[0] in ("hw", "mm") else parts[0]
+    return write_info.__self__ if inspect.ismethod(write_info) else write_info
+
+
+# delay: wait a fixed time after writing
+# tolerance: poll the read func until it is within tolerance of the target
+# stable: poll the read func until n_stable reads are within tolerance
+SETTLE_MODES = ("delay", "tolerance", "stable")
+
+
+@dataclass
+class SettleCondition:
+    mode: str = "delay"
+    tolerance: float = 0.0
+    n_stable: int = 3
+    timeout: float = 1.0
+    poll_interval: float = 0.001
+
+
+def wait_settled(
+    read_func: ReadFunc, target: float, condition: SettleCondition
+) -> Tuple[float, Any, bool]:
+    """
+    polls *read_func* until *condition* is met or it times out, returns the
+    time it took, the last read value and whether it settled
+    """
+    t0 = time.perf_counter()
+    recent = []
+    while True:
+        value = read_func()
+        elapsed = time.perf_counter() - t0
+        if condition.mode == "tolerance":
+            settled = abs(value - target) <= condition.tolerance
+        else:
+            recent = (recent + [value])[-condition.n_stable :]
+            settled = (
+                len(recent) == condition.n_stable
+                and max(recent) - min(recent) <= condition.tolerance
+            )
+        if settled or elapsed >= condition.timeout:
+            return elapsed, value, settled
+        time.sleep(condition.poll_interval)
+
+
+class ActuatorMover:
+    """
+    writes all actuators at once and waits until each one settled.
+
+    Actuators of different *owners* (see actuator_owner, default: one per
+    actuator) are written and polled in their own thread (unless not
+    *concurrent*), a move takes as long as the slowest owner. The actuators
+    of one owner, e.g. the axes of a stage whose connection is not thread
+    safe, are moved one after another. Actuators in "delay" mode, or without
+    read back, wait *delay* after all writes returned.
+    """
+
+    def __init__(
+        self,
+        actuator_funcs: Sequence[ActuatorFuncs],
+        conditions: Sequence[SettleCondition],
+        delay: float = 0.0,
+        concurrent: bool = True,
+        owners: Sequence[Any] = None,
+    ):
+        self.actuator_funcs = list(actuator_funcs)
+        self.conditions = list(conditions)
+        self.delay = delay
+        self.write_time = 0.0
+        if owners is None:
+            owners = range(len(self.actuator_funcs))
+        groups = {}
+        for i, owner in enumerate(owners):
+            groups.setdefault(owner, []).append(i)
+        self.groups = list(groups.values())
+        self.executor = None
+        if concurrent and len(self.groups) > 1:
+            self.executor = ThreadPoolExecutor(
+                max_workers=len(self.groups), thread_name_prefix="actuator"
+            )
+
+    def waits_delay(self, funcs: ActuatorFuncs, condition: SettleCondition) -> bool:
+        return condition.mode == "delay" or not has_read_back(funcs[0])
+
+    def _move_one(self, funcs: ActuatorFuncs, position, condition: SettleCondition):
+        read, write = funcs
+        t0 = time.perf_counter()
+        write(position)
+        t_written = time.perf_counter()
+        if self.waits_delay(funcs, condition):
+            return None, False, t_written
+        _, _, settled = wait_settled(read, position, condition)
+        return time.perf_counter() - t0, settled, t_written
+
+    def _move_group(self, args: Sequence[Tuple]) -> List[Tuple]:
+        return [self._move_one(*a) for a in args]
+
+    def move(self, positions) -> Tuple[np.ndarray, np.ndarray]:
+        """
+        returns the settle times and whether each actuator settled in time.
+        write_time is set to the time until all writes returned.
+        """
+        t0 = time.perf_counter()
+        args = list(zip(self.actuator_funcs, positions, self.conditions))
+        group_args = [[args[i] for i in group] for group in self.groups]
+        if self.executor is None:
+            group_results = [self._move_group(a) for a in group_args]
+        else:
+            futures = [self.executor.submit(self._move_group, a) for a in group_args]
+            group_results = [f.result() for f in futures]
+        results = [None] * len(args)
+        for group, group_result in zip(self.groups, group_results):
+            for i, result in zip(group, group_result):
+                results[i] = result
+        t_written = max((r[2] for r in results), default=t0)
+        self.write_time = t_written - t0
+        # the delay is counted once, from when all writes returned
+        if any(self.waits_delay(funcs, c) for funcs, _, c in args):
+            time.sleep(max(0.0, t_written + self.delay - time.perf_counter()))
+            delay_time = time.perf_counter() - t0
+            results = [
+                (delay_time, False, w) if t is None else (t, s, w)
+                for t, s, w in results
+            ]
+        settle_times = np.array([r[0] for r in results])
+        settled = np.array([r[1] for r in results], dtype=bool)
+        return settle_times, settled
+
+    def shutdown(self):
+        if self.executor is not None:
+            self.executor.shutdown(wait=True)
+            self.executor = None
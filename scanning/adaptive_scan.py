@@ -0,0 +1,116 @@
+"""
+Coarse-to-fine sample selection for adaptive 2D raster scans.
+
+A coarse grid with spacing *step* is acquired first. The partially measured
+image is filled by nearest measured neighbours, an importance map is derived
+from it and every step x step block whose importance exceeds a threshold is
+resampled at half the spacing. Halving continues down to single pixels.
+"""
+
+import numpy as np
+
+IMPORTANCE_MEASURES = ("gradient", "intensity", "callback")
+
+# one row per acquired pixel of the sparse "adaptive_samples" h5 dataset
+ADAPTIVE_SAMPLE_DTYPE = np.dtype(
+    [
+        ("sample_num", np.int64),
+        ("level", np.int16),
+        ("j", np.int32),
+        ("i", np.int32),
+        ("h", float),
+        ("v", float),
+        ("time", float),
+        ("value", float),
+    ]
+)
+
+
+def serpentine_sorted(points: np.ndarray) -> np.ndarray:
+    """(n, 2) (j, i) points sorted by row, alternating direction along i"""
+    if not len(points):
+        return points
+    j, i = points.T
+    rank = np.unique(j, return_inverse=True)[1]
+    i_key = np.where(rank % 2 == 1, -i, i)
+    return points[np.lexsort((i_key, j))]
+
+
+def coarse_grid(shape, step: int) -> np.ndarray:
+    """every *step*-th pixel of (Nv, Nh) *shape*, including the last row and column"""
+    Nv, Nh = shape
+    jj = np.unique(np.append(np.arange(0, Nv, step), Nv - 1))
+    ii = np.unique(np.append(np.arange(0, Nh, step), Nh - 1))
+    J, I = np.meshgrid(jj, ii, indexing="ij")
+    return serpentine_sorted(np.stack([J.ravel(), I.ravel()], axis=1))
+
+
+def _fill_along(values, valid, axis):
+    # forward, then backward fill of the invalid entries along *axis*
+    values = np.moveaxis(values, axis, -1).copy()
+    valid = np.moveaxis(valid, axis, -1).copy()
+    for direction in (1, -1):
+        v, m = values[..., ::direction], valid[..., ::direction]
+        idx = np.where(m, np.arange(m.shape[-1]), 0)
+        np.maximum.accumulate(idx, axis=-1, out=idx)
+        filled = np.take_along_axis(v, idx, axis=-1)
+        has_prior = np.maximum.accumulate(m, axis=-1)
+        v[...] = np.where(has_prior, filled, v)
+        m |= has_prior
+    return np.moveaxis(values, -1, axis), np.moveaxis(valid, -1, axis)
+
+
+def fill_unmeasured(image: np.ndarray, measured: np.ndarray) -> np.ndarray:
+    """*image* with unmeasured pixels set to a nearby measured value"""
+    values, valid = _fill_along(image, measured, axis=1)
+    # rows with any measured pixel are complete now, fill the others
+    values, _ = _fill_along(values, valid, axis=0)
+    return values
+
+
+def importance_map(filled: np.ndarray, measure: str = "gradient") -> np.ndarray:
+    """importance of each pixel of the *filled* image, scaled to 0..1"""
+    if measure == "gradient":
+        axes = [axis for axis, n in enumerate(filled.shape) if n > 1]
+        gradients = np.gradient(filled, axis=axes) if axes else []
+        if len(axes) == 1:
+            gradients = [gradients]
+        importance = np.sqrt(sum(g**2 for g in gradients)) + np.zeros(filled.shape)
+    elif measure == "intensity":
+        importance = filled
+    else:
+        raise ValueError(f"unknown importance measure {measure}")
+    return normalized(importance)
+
+
+def normalized(importance) -> np.ndarray:
+    importance = np.nan_to_num(np.asarray(importance, dtype=float))
+    span = importance.max() - importance.min()
+    if span == 0:
+        return np.zeros_like(importance)
+    return (importance - importance.min()) / span
+
+
+def refinement_points(
+    measured: np.ndarray, importance: np.ndarray, step: int, threshold: float
+) -> np.ndarray:
+    """
+    unmeasured (j, i) pixels at spacing step // 2 within the step x step
+    blocks whose maximum importance (including the block's far edge) exceeds
+    *threshold*
+    """
+    Nv, Nh = measured.shape
+    sub_step = max(1, step // 2)
+    nbj, nbi = -(-Nv // step), -(-Nh // step)
+    # blocks include their far edge, i.e. the anchors of the next blocks
+    padded = np.zeros((nbj * step + 1, nbi * step + 1))
+    padded[:Nv, :Nh] = importance
+    padded[:-1] = np.maximum(padded[:-1], padded[1:])
+    padded[:, :-1] = np.maximum(padded[:, :-1], padded[:, 1:])
+    padded = padded[:-1, :-1]
+    block_max = padded.reshape(nbj, step, nbi, step).max(axis=(1, 3))
+    selected = np.repeat(np.repeat(block_max > threshold, step, 0), step, 1)
+    jj, ii = np.ogrid[:Nv, :Nh]
+    on_grid = ((jj % step) % sub_step == 0) & ((ii % step) % sub_step == 0)
+    new = selected[:Nv, :Nh] & on_grid & ~measured
+    return serpentine_sorted(np.argwhere(new))
@@ -1,77 +1,142 @@
-from ScopeFoundry import Measurement
-from ScopeFoundry.scanning.base_raster_scan import BaseRaster2DScan
-import time
 import numpy as np
 
+from ScopeFoundry.scanning.base_raster_scan import BaseRaster2DScan
+
+from .path_ordering import MoveTimeModel, optimize_order
+
+
 class BaseNonRaster2DScan(BaseRaster2DScan):
+    """
+    2D scan over a list of points. The data of point n lands at
+    scan_index_array[n] of the unordered list: (0, j, i) for raster,
+    (0, 0, n) for spiral and custom (*custom_scan_points*) scans.
+
+    With optimize_order the points are visited in a travel-optimized order
+    (nearest neighbour + 2-opt) estimated with the per-axis velocity and
+    settle time settings; scan_order maps pixel_i to the point number.
+    """
+
     name = "base_non_raster_2Dscan"
+    timing_condition_names = ("pixel_time", "scan_type", "optimize_order")
+
+    def setup(self):
+        super().setup()
+        self.scan_type.change_choice_list(("raster", "spiral", "custom"))
+
+        S = self.settings
+        S.New("optimize_order", dtype=bool, initial=False)
+        S.get_lq("optimize_order").add_listener(self.compute_times)
+        S.New(
+            "h_velocity", dtype=float, initial=1.0, vmin=1e-12, unit=f"{self.h_unit}/s"
+        )
+        S.New(
+            "v_velocity", dtype=float, initial=1.0, vmin=1e-12, unit=f"{self.v_unit}/s"
+        )
+        S.New("h_settle_time", dtype=float, initial=0.0, vmin=0, si=True, unit="s")
+        S.New("v_settle_time", dtype=float, initial=0.0, vmin=0, si=True, unit="s")
+        S.New("baseline_travel_time", dtype=float, ro=True, si=True, unit="s")
+        S.New("travel_time", dtype=float, ro=True, si=True, unit="s")
+        self.scan_order = np.zeros(0, dtype=int)
+
+    def move_time_model(self) -> MoveTimeModel:
+        S = self.settings
+        return MoveTimeModel(
+            velocity=(S["h_velocity"], S["v_velocity"]),
+            settle_time=(S["h_settle_time"], S["v_settle_time"]),
+        )
+
+    def compute_times(self):
+        BaseRaster2DScan.compute_times(self)
+        if "travel_time" in self.settings and not self.timing_model_active():
+            S = self.settings
+            S["frame_time"] = S["pixel_time"] * self.Npixels + S["travel_time"]
+            S["total_time"] = S["frame_time"] * S["n_frames"]
+
+    def scan_counts(self):
+        return self.Npixels, 1, 1
 
+    def set_scan_points(self, h, v, index):
+        """
+        fills the scan arrays to visit points *h*, *v* (in travel-optimized
+        order if optimize_order) with point n saved at (k, j, i) = *index*[n]
+        """
+        S = self.settings
+        points = np.stack([h, v], axis=1)
+        model = self.move_time_model()
+        if S["optimize_order"]:
+            result = optimize_order(points, model)
+            self.scan_order = result.order
+            baseline_time, travel_time = result.baseline_time, result.travel_time
+            self.log.info(
+                f"optimized order of {len(points)} points: estimated travel "
+                f"{travel_time:.3g} s, baseline {baseline_time:.3g} s"
+            )
+        else:
+            self.scan_order = np.arange(len(points))
+            baseline_time = travel_time = model.path_time(points)
+        S["baseline_travel_time"] = baseline_time
+        S["travel_time"] = travel_time
+
+        self.create_empty_scan_arrays()
+        self.scan_h_positions[:] = h[self.scan_order]
+        self.scan_v_positions[:] = v[self.scan_order]
+        self.scan_index_array[:] = index[self.scan_order]
+        self.scan_slow_move[0] = True
+        self.compute_times()
+
+    def save_scan_arrays_h5(self, H):
+        BaseRaster2DScan.save_scan_arrays_h5(self, H)
+        H["scan_order"] = self.scan_order
+        H["scan_order"].attrs["baseline_travel_time"] = self.settings[
+            "baseline_travel_time"
+        ]
+        H["scan_order"].attrs["travel_time"] = self.settings["travel_time"]
+
+    #### Scan Generators
     def gen_raster_scan(self, gen_arrays=True):
-        self.Npixels = self.Nh.val*self.Nv.val
+        self.Npixels = self.Nh.val * self.Nv.val
         self.scan_shape = (1, self.Nv.val, self.Nh.val)
-        
+
         if gen_arrays:
-            #print "t0", time.time() - t0
-            self.create_empty_scan_arrays()            
-            #print "t1", time.time() - t0
-            
-#             t0 = time.time()
-#             pixel_i = 0
-#             for jj in range(self.Nv.val):
-#                 #print "tjj", jj, time.time() - t0
-#                 self.scan_slow_move[pixel_i] = True
-#                 for ii in range(self.Nh.val):
-#                     self.scan_v_positions[pixel_i] = self.v_array[jj]
-#                     self.scan_h_positions[pixel_i] = self.h_array[ii]
-#                     self.scan_index_array[pixel_i,:] = [0, jj, ii] 
-#                     pixel_i += 1
-#             print "for loop raster gen", time.time() - t0
-             
-            t0 = time.time()
-             
             H, V = np.meshgrid(self.h_array, self.v_array)
-            self.scan_h_positions[:] = H.flat
-            self.scan_v_positions[:] = V.flat
-            
-            II,JJ = np.meshgrid(np.arange(self.Nh.val), np.arange(self.Nv.val))
-            self.scan_index_array[:,1] = JJ.flat
-            self.scan_index_array[:,2] = II.flat
-            #self.scan_v_positions
-            print("array flatten raster gen", time.time() - t0)
-            
-            
+            JJ, II = np.meshgrid(np.arange(self.Nv.val), np.arange(self.Nh.val))
+            index = np.zeros((self.Npixels, 3), dtype=int)
+            index[:, 1] = JJ.T.flat
+            index[:, 2] = II.T.flat
+            self.set_scan_points(H.ravel(), V.ravel(), index)
+
     def gen_spiral_scan(self, gen_arrays=True):
-        #self.Npixels = self.Nh.val*self.Nv.val
-        self.scan_shape = (1, Npixels)
-        
+        self.Npixels = self.Nh.val * self.Nv.val
+        self.scan_shape = (1, 1, self.Npixels)
+
         if gen_arrays:
-            #print "t0", time.time() - t0
-            self.create_empty_scan_arrays()            
-            #print "t1", time.time() - t0
-            
-#             t0 = time.time()
-#             pixel_i = 0
-#             for jj in range(self.Nv.val):
-#                 #print "tjj", jj, time.time() - t0
-#                 self.scan_slow_move[pixel_i] = True
-#                 for ii in range(self.Nh.val):
-#                     self.scan_v_positions[pixel_i] = self.v_array[jj]
-#                     self.scan_h_positions[pixel_i] = self.h_array[ii]
-#                     self.scan_index_array[pixel_i,:] = [0, jj, ii] 
-#                     pixel_i += 1
-#             print "for loop raster gen", time.time() - t0
-            
-            h = ix * np.cos(ix)
-            v = ix * np.sin(ix)
-            
-            t0 = time.time()
-             
-            H, V = np.meshgrid(self.h_array, self.v_array)
-            self.scan_h_positions[:] = H.flat
-            self.scan_v_positions[:] = V.flat
-            
-            II,JJ = np.meshgrid(np.arange(self.Nh.val), np.arange(self.Nv.val))
-            self.scan_index_array[:,1] = JJ.flat
-            self.scan_index_array[:,2] = II.flat
-            #self.scan_v_positions
-            print("array flatten raster gen", time.time() - t0)
+            # Archimedean spiral with about equal spacing along the arc,
+            # filling the h0..h1, v0..v1 ellipse
+            n_turns = max(self.Nh.val, self.Nv.val) / 2
+            r = np.sqrt(np.linspace(0, 1, self.Npixels))
+            phi = 2 * np.pi * n_turns * r
+            h_mid = 0.5 * (self.h0.val + self.h1.val)
+            v_mid = 0.5 * (self.v0.val + self.v1.val)
+            h = h_mid + 0.5 * (self.h1.val - self.h0.val) * r * np.cos(phi)
+            v = v_mid + 0.5 * (self.v1.val - self.v0.val) * r * np.sin(phi)
+            self.set_scan_points(h, v, self.point_index(self.Npixels))
+
+    def gen_custom_scan(self, gen_arrays=True):
+        h, v = self.custom_scan_points()
+        self.Npixels = len(h)
+        self.scan_shape = (1, 1, self.Npixels)
+
+        if gen_arrays:
+            h, v = np.asarray(h, dtype=float), np.asarray(v, dtype=float)
+            self.set_scan_points(h, v, self.point_index(self.Npixels))
+
+    def custom_scan_points(self):
+        """override to return the h, v position arrays of a custom scan"""
+        H, V = np.meshgrid(self.h_array, self.v_array)
+        return H.ravel(), V.ravel()
+
+    @staticmethod
+    def point_index(n):
+        index = np.zeros((n, 3), dtype=int)
+        index[:, 2] = np.arange(n)
+        return index
@@ -3,14 +3,91 @@ import time
 import numpy as np
 
 from ScopeFoundry import h5_io
+from ScopeFoundry.running_stats import RunningStats
 
 from .base_raster_scan import BaseRaster2DScan
 
 
+class FrameAccumulator:
+    """
+    Stand-in for a framed h5 dataset when accumulate_frames is on.
+
+    Writes map_h5[frame_i, k, j, i, ...] = value update running mean,
+    variance, min and max of each pixel in place; only these summaries
+    (*name*_mean, *name*_variance, ...) and every *raw_frame_interval*-th
+    frame (dataset *name*, frame numbers in *name*_frame_index) are stored.
+    """
+
+    def __init__(self, h5_group, name, single_frame_map, raw_frame_interval=0):
+        self.h5_group = h5_group
+        self.name = name
+        self.raw_frame_interval = raw_frame_interval
+        self.frame_shape = single_frame_map.shape
+        self.stats = RunningStats(self.frame_shape)
+        self.frame_i = None
+        self.raw_frame = None
+        self.raw_frames_h5 = None
+        if raw_frame_interval > 0:
+            self.raw_frame = np.zeros(self.frame_shape, dtype=single_frame_map.dtype)
+            self.raw_frames_h5 = h5_io.GrowingH5Dataset(
+                h5_group,
+                name,
+                shape=(0,) + self.frame_shape,
+                dtype=single_frame_map.dtype,
+                initial_capacity=1,
+                buffer_size=1,
+                compression="gzip",
+            )
+            self.raw_frames_h5.dset.attrs["raw_frame_interval"] = raw_frame_interval
+            self.frame_index_h5 = h5_io.GrowingH5Dataset(
+                h5_group, f"{name}_frame_index", shape=(0,), dtype=np.int64
+            )
+
+    @property
+    def shape(self):
+        return (None,) + self.frame_shape
+
+    def keeps_raw(self, frame_i) -> bool:
+        return self.raw_frame is not None and frame_i % self.raw_frame_interval == 0
+
+    def __setitem__(self, key, value):
+        frame_i, index = key[0], key[1:]
+        if frame_i != self.frame_i:
+            self.end_frame()
+            self.frame_i = frame_i
+        self.stats.add(index, value)
+        if self.keeps_raw(frame_i):
+            self.raw_frame[index] = value
+
+    def end_frame(self):
+        """stores the summaries and, if kept, the raw frame of the current frame"""
+        if self.frame_i is None:
+            return
+        if self.keeps_raw(self.frame_i):
+            self.raw_frames_h5.append(self.raw_frame)
+            self.raw_frames_h5.flush()
+            self.frame_index_h5.append(self.frame_i)
+            self.frame_index_h5.flush()
+            self.raw_frame[...] = 0
+        self.stats.write_h5(self.h5_group, self.name)
+        self.frame_i = None
+
+    def close(self):
+        self.end_frame()
+        if self.raw_frames_h5 is not None:
+            self.raw_frames_h5.close()
+            self.frame_index_h5.close()
+
+
 class BaseRaster2DFrameSlowScan(BaseRaster2DScan):
 
     name = "base_raster_2D_frame_slowscan"
 
+    def setup(self):
+        super().setup()
+        self.settings.New("accumulate_frames", dtype=bool, initial=False)
+        self.settings.New("raw_frame_interval", dtype=int, initial=0, vmin=0)
+
     def run(self):
         S = self.settings
 
@@ -29,6 +106,7 @@ class BaseRaster2DFrameSlowScan(BaseRaster2DScan):
 
         self.display_image_map = np.zeros(self.scan_shape, dtype=float)
         self.pixel_times = np.zeros(self.scan_shape, dtype=float)
+        self.incremental_display.reset()
 
         # h5 data file setup
         self.t0 = time.time()
@@ -47,12 +125,14 @@ class BaseRaster2DFrameSlowScan(BaseRaster2DScan):
             H["range_extent"] = self.range_extent
             H["corners"] = self.corners
             H["imshow_extent"] = self.imshow_extent
-            H["scan_h_positions"] = self.scan_h_positions
-            H["scan_v_positions"] = self.scan_v_positions
-            H["scan_slow_move"] = self.scan_slow_move
-            H["scan_index_array"] = self.scan_index_array
+            self.save_scan_arrays_h5(H)
+            self._h5_framed_datasets = []
+            # time stamps are never accumulated, their mean means nothing
             self.pixel_times_h5 = self.create_h5_framed_dataset(
-                name="pixel_times", single_frame_map=self.pixel_times, dtype=float
+                name="pixel_times",
+                single_frame_map=self.pixel_times,
+                accumulate=False,
+                dtype=float,
             )
 
         self.frame_i = 0
@@ -72,6 +152,7 @@ class BaseRaster2DFrameSlowScan(BaseRaster2DScan):
                     # start frame
                     self.pixel_i = 0
                     self.current_scan_index = self.scan_index_array[0]
+                    frame_t0 = time.time()
                     self.move_position_start(
                         self.scan_h_positions[0], self.scan_v_positions[0]
                     )
@@ -112,11 +193,15 @@ class BaseRaster2DFrameSlowScan(BaseRaster2DScan):
                         if self.settings["save_h5"]:
                             self.pixel_times_h5[self.frame_i, kk, jj, ii] = pixel_t0
                         self.collect_pixel(self.pixel_i, self.frame_i, kk, jj, ii)
+                        self.incremental_display.mark(kk, jj)
                         S["progress"] = (
                             100.0
                             * (self.frame_i * self.Npixels + self.pixel_i)
                             / (self.Npixels * self.settings["n_frames"])
                         )
+                    if not self.interrupt_measurement_called:
+                        self.calibrate_timing(self.pixel_times, frame_t0)
+                    self.end_accumulated_frames()
                     self.on_end_frame(self.frame_i)
                     self.frame_i += 1
                 if not self.settings["continuous_scan"]:
@@ -124,7 +209,8 @@ class BaseRaster2DFrameSlowScan(BaseRaster2DScan):
         finally:
             self.post_scan_cleanup()
             if self.settings["save_h5"] and hasattr(self, "h5_file"):
-                self.h5_file.close()
+                self.trim_h5_framed_datasets(self.frame_i)
+                self.close_h5_file()
 
     def move_position_start(self, x, y):
         self.stage.settings["x_position"] = x
@@ -165,6 +251,11 @@ class BaseRaster2DFrameSlowScan(BaseRaster2DScan):
     def on_end_frame(self, frame_i):
         pass
 
+    def progress_counts(self):
+        n_pixels, n_lines, n_frames = self.scan_counts()
+        n = self.settings["n_frames"]
+        return n_pixels * n, n_lines * n, n_frames * n
+
     @property
     def frames_scan_shape(self):
         """
@@ -173,7 +264,9 @@ class BaseRaster2DFrameSlowScan(BaseRaster2DScan):
         """
         return (self.settings["n_frames"],) + self.scan_shape
 
-    def create_h5_framed_dataset(self, name, single_frame_map, **kwargs):
+    def create_h5_framed_dataset(
+        self, name, single_frame_map, accumulate=True, **kwargs
+    ):
         """
         Create and return an empty HDF5 dataset in self.h5_meas_group that can store
         multiple frames of single_frame_map.
@@ -182,7 +275,26 @@ class BaseRaster2DFrameSlowScan(BaseRaster2DScan):
 
         creates reasonable defaults for compression and dtype, can be overriden
         with**kwargs are sent directly to create_dataset
+
+        With accumulate_frames a FrameAccumulator is returned instead, that
+        stores per pixel statistics and every raw_frame_interval-th frame,
+        unless not *accumulate*.
         """
+        if (
+            self.settings["save_h5"]
+            and self.settings["accumulate_frames"]
+            and accumulate
+        ):
+            accumulator = FrameAccumulator(
+                self.h5_meas_group,
+                name,
+                single_frame_map,
+                self.settings["raw_frame_interval"],
+            )
+            if not hasattr(self, "_h5_framed_datasets"):
+                self._h5_framed_datasets = []
+            self._h5_framed_datasets.append(accumulator)
+            return accumulator
         if self.settings["save_h5"]:
             shape = (self.settings["n_frames"],) + single_frame_map.shape
             if self.settings["continuous_scan"]:
@@ -202,20 +314,28 @@ class BaseRaster2DFrameSlowScan(BaseRaster2DScan):
             )
             default_kwargs.update(kwargs)
             map_h5 = self.h5_meas_group.create_dataset(**default_kwargs)
+            if not hasattr(self, "_h5_framed_datasets"):
+                self._h5_framed_datasets = []
+            self._h5_framed_datasets.append(map_h5)
             return map_h5
 
     def extend_h5_framed_dataset(self, map_h5, frame_num):
         """
         Adds additional frames to dataset map_h5, if frame_num
-        is too large. Adds n_frames worth of extra frames
+        is too large. Capacity at least doubles (in multiples of n_frames),
+        excess frames are trimmed by trim_h5_framed_datasets at the end of run
         """
+        if isinstance(map_h5, FrameAccumulator):
+            # grows by itself
+            return False
         if self.settings["continuous_scan"]:
             current_num_frames = map_h5.shape[0]
             frame_shape = map_h5.shape[1:]
             if frame_num >= current_num_frames:
                 # print ("extend_h5_framed_dataset", map_h5.name, map_h5.shape, frame_num)
                 n_frames_extend = self.settings["n_frames"]
-                new_num_frames = n_frames_extend * (1 + frame_num // n_frames_extend)
+                new_num_frames = max(frame_num + 1, 2 * current_num_frames)
+                new_num_frames = n_frames_extend * -(-new_num_frames // n_frames_extend)
                 map_h5.resize((new_num_frames,) + tuple(frame_shape))
                 return True
             else:
@@ -224,3 +344,28 @@ class BaseRaster2DFrameSlowScan(BaseRaster2DScan):
         else:
             # "non continuous scan, no expansion"
             return False
+
+    def end_accumulated_frames(self):
+        for map_h5 in getattr(self, "_h5_framed_datasets", []):
+            if isinstance(map_h5, FrameAccumulator):
+                map_h5.end_frame()
+
+    def trim_h5_framed_datasets(self, num_frames):
+        """
+        Shrinks the datasets created with create_h5_framed_dataset to the
+        *num_frames* frames acquired in a continuous scan, and closes
+        frame accumulators
+        """
+        framed = getattr(self, "_h5_framed_datasets", [])
+        for map_h5 in framed:
+            if isinstance(map_h5, FrameAccumulator):
+                map_h5.close()
+        if not self.settings["continuous_scan"]:
+            self._h5_framed_datasets = []
+            return
+        for map_h5 in framed:
+            if isinstance(map_h5, FrameAccumulator):
+                continue
+            if map_h5.id.valid and map_h5.shape[0] > num_frames:
+                map_h5.resize((num_frames,) + tuple(map_h5.shape[1:]))
+        self._h5_framed_datasets = []
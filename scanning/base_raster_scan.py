@@ -4,7 +4,6 @@ Created on Feb 4, 2016
 @author: Edward Barnard
 """
 
-import time
 from typing import Tuple
 
 import numpy as np
@@ -15,8 +14,16 @@ from ScopeFoundry import LQRange, Measurement
 from ScopeFoundry.helper_funcs import load_qt_ui_file, sibling_path
 from ScopeFoundry.logged_quantity.collection import LQCollection
 
+from .incremental_display import (
+    LEVEL_PERCENTILES,
+    IncrementalDisplay,
+    IncrementalImageItem,
+)
+from .scan_timing import ScanTimingMixin
+from .scan_trajectory import ScanTrajectory
 
-class BaseRaster2DScan(Measurement):
+
+class BaseRaster2DScan(ScanTimingMixin, Measurement):
     name = "base_raster_2D_scan"
 
     def __init__(
@@ -45,6 +52,8 @@ class BaseRaster2DScan(Measurement):
         self.circ_roi_size = circ_roi_size
         self.img_items = []
         self.current_scan_index = (0, 0, 0)
+        self.scan_trajectory = None
+        self.incremental_display = IncrementalDisplay()
         Measurement.__init__(self, app)
 
     def setup(self):
@@ -161,6 +170,12 @@ class BaseRaster2DScan(Measurement):
         self.settings.New("save_h5", dtype=bool, initial=True, ro=False)
 
         self.settings.New("show_previous_scans", dtype=bool, initial=True)
+        self.settings.New(
+            "display_levels",
+            dtype=str,
+            initial="min_max",
+            choices=tuple(LEVEL_PERCENTILES),
+        )
 
         self.settings.New("n_frames", dtype=int, initial=1, vmin=1)
 
@@ -171,6 +186,7 @@ class BaseRaster2DScan(Measurement):
         self.settings.New("frame_time", dtype=float, ro=True, si=True, unit="s")
         self.settings.New("total_time", dtype=float, ro=True, si=True, unit="s")
 
+        self.setup_timing_settings()
         for lq_name in ["Nh", "Nv", "pixel_time", "n_frames"]:
             self.settings.get_lq(lq_name).add_listener(self.compute_times)
 
@@ -190,6 +206,9 @@ class BaseRaster2DScan(Measurement):
         self.scan_type.updated_value.connect(self.compute_scan_params)
 
         # connect events
+        self.settings.get_lq("display_levels").add_listener(
+            self.incremental_display.set_level_mode, argtype=(str,)
+        )
         self.settings.get_lq("show_previous_scans").add_listener(
             self.show_hide_previous_scans,
             argtype=(bool),
@@ -297,6 +316,7 @@ class BaseRaster2DScan(Measurement):
         getattr(self, gen_func_name)(gen_arrays=True)
 
     def create_empty_scan_arrays(self):
+        self.scan_trajectory = None
         self.scan_h_positions = np.zeros(self.Npixels, dtype=float)
         self.scan_v_positions = np.zeros(self.Npixels, dtype=float)
         self.scan_slow_move = np.zeros(self.Npixels, dtype=bool)
@@ -332,7 +352,7 @@ class BaseRaster2DScan(Measurement):
 
         self.img_items = []
 
-        self.img_item = pg.ImageItem()
+        self.img_item = IncrementalImageItem()
         self.img_items.append(self.img_item)
 
         self.img_plot.addItem(self.img_item)
@@ -450,7 +470,7 @@ class BaseRaster2DScan(Measurement):
     def update_display(self):
         # self.log.debug('update_display')
         if self.initial_scan_setup_plotting:
-            self.img_item = pg.ImageItem()
+            self.img_item = IncrementalImageItem()
             self.img_items.append(self.img_item)
             self.img_plot.addItem(self.img_item)
             self.hist_lut.setImageItem(self.img_item)
@@ -467,7 +487,13 @@ class BaseRaster2DScan(Measurement):
             # if self.settings.scan_type.val in ['raster']
             kk, jj, ii = self.current_scan_index
             self.disp_img = self.display_image_map[kk, :, :].T
-            self.img_item.setImage(self.disp_img, autoRange=False, autoLevels=True)
+            if self.incremental_display.active:
+                # redraw only the rows acquired since the last update
+                self.incremental_display.update_image(
+                    self.img_item, self.display_image_map, kk
+                )
+            else:
+                self.img_item.setImage(self.disp_img, autoRange=False, autoLevels=True)
             # Important to set rectangle after setImage for non-square pixels
             self.img_item.setRect(self.img_item_rect)
             self.update_LUT()
@@ -548,92 +574,47 @@ class BaseRaster2DScan(Measurement):
     def compute_times(self):
         # self.settings['pixel_time'] = 1.0/self.scanDAQ.settings['dac_rate']
         S = self.settings
-        S["line_time"] = S["pixel_time"] * S["Nh"]
-        S["frame_time"] = S["pixel_time"] * self.Npixels
+        if self.timing_model_active():
+            model = self.timing_model
+            S["line_time"] = model.predict(S["Nh"], 1, 0)
+            S["frame_time"] = model.predict(*self.scan_counts())
+        else:
+            S["line_time"] = S["pixel_time"] * S["Nh"]
+            S["frame_time"] = S["pixel_time"] * self.Npixels
         S["total_time"] = S["frame_time"] * S["n_frames"]
 
+    def scan_counts(self):
+        """(n_pixels, n_lines, n_frames) of one frame"""
+        return self.Npixels, self.Npixels // max(self.Nh.val, 1), 1
+
     #### Scan Generators
     def gen_raster_scan(self, gen_arrays=True):
         self.Npixels = self.Nh.val * self.Nv.val
         self.scan_shape = (1, self.Nv.val, self.Nh.val)
 
         if gen_arrays:
-
-            self.create_empty_scan_arrays()
-
-            t0 = time.time()
-
-            H, V = np.meshgrid(self.h_array, self.v_array)
-            self.scan_h_positions[:] = H.flat
-            self.scan_v_positions[:] = V.flat
-
-            self.scan_slow_move[:: self.Nh.val] = True
-
-            II, JJ = np.meshgrid(np.arange(self.Nh.val), np.arange(self.Nv.val))
-            self.scan_index_array[:, 1] = JJ.flat
-            self.scan_index_array[:, 2] = II.flat
-            # self.scan_v_positions
-            print("array flatten raster gen", time.time() - t0)
+            self.set_scan_trajectory("raster")
 
     def gen_serpentine_scan(self, gen_arrays=True):
         self.Npixels = self.Nh.val * self.Nv.val
         self.scan_shape = (1, self.Nv.val, self.Nh.val)
 
         if gen_arrays:
-            self.create_empty_scan_arrays()
-            pixel_i = 0
-            for jj in range(self.Nv.val):
-                self.scan_slow_move[pixel_i] = True
-
-                if jj % 2:  # odd lines
-                    h_line_indicies = range(self.Nh.val)[::-1]
-                else:  # even lines -- traverse in opposite direction
-                    h_line_indicies = range(self.Nh.val)
-
-                for ii in h_line_indicies:
-                    self.scan_v_positions[pixel_i] = self.v_array[jj]
-                    self.scan_h_positions[pixel_i] = self.h_array[ii]
-                    self.scan_index_array[pixel_i, :] = [0, jj, ii]
-                    pixel_i += 1
+            self.set_scan_trajectory("serpentine")
 
     def gen_trace_retrace_scan(self, gen_arrays=True):
         self.Npixels = 2 * self.Nh.val * self.Nv.val
         self.scan_shape = (2, self.Nv.val, self.Nh.val)
 
         if gen_arrays:
-            self.create_empty_scan_arrays()
-            pixel_i = 0
-            for jj in range(self.Nv.val):
-                self.scan_slow_move[pixel_i] = True
-                for kk, step in [(0, 1), (1, -1)]:  # trace kk =0, retrace kk=1
-                    h_line_indicies = range(self.Nh.val)[::step]
-                    for ii in h_line_indicies:
-                        self.scan_v_positions[pixel_i] = self.v_array[jj]
-                        self.scan_h_positions[pixel_i] = self.h_array[ii]
-                        self.scan_index_array[pixel_i, :] = [kk, jj, ii]
-                        pixel_i += 1
+            self.set_scan_trajectory("trace_retrace")
 
     def gen_ortho_raster_scan(self, gen_arrays=True):
         self.Npixels = 2 * self.Nh.val * self.Nv.val
         self.scan_shape = (2, self.Nv.val, self.Nh.val)
 
         if gen_arrays:
-            self.create_empty_scan_arrays()
-            pixel_i = 0
-            for jj in range(self.Nv.val):
-                self.scan_slow_move[pixel_i] = True
-                for ii in range(self.Nh.val):
-                    self.scan_v_positions[pixel_i] = self.v_array[jj]
-                    self.scan_h_positions[pixel_i] = self.h_array[ii]
-                    self.scan_index_array[pixel_i, :] = [0, jj, ii]
-                    pixel_i += 1
-            for ii in range(self.Nh.val):
-                self.scan_slow_move[pixel_i] = True
-                for jj in range(self.Nv.val):
-                    self.scan_v_positions[pixel_i] = self.v_array[jj]
-                    self.scan_h_positions[pixel_i] = self.h_array[ii]
-                    self.scan_index_array[pixel_i, :] = [1, jj, ii]
-                    pixel_i += 1
+            self.set_scan_trajectory("ortho_raster")
 
     def gen_ortho_trace_retrace_scan(self, gen_arrays=True):
         print("gen_ortho_trace_retrace_scan")
@@ -641,29 +622,26 @@ class BaseRaster2DScan(Measurement):
         self.scan_shape = (4, self.Nv.val, self.Nh.val)
 
         if gen_arrays:
-            self.create_empty_scan_arrays()
-            pixel_i = 0
-            for jj in range(self.Nv.val):
-                self.scan_slow_move[pixel_i] = True
-                for kk, step in [(0, 1), (1, -1)]:  # trace kk =0, retrace kk=1
-                    h_line_indicies = range(self.Nh.val)[::step]
-                    for ii in h_line_indicies:
-                        self.scan_v_positions[pixel_i] = self.v_array[jj]
-                        self.scan_h_positions[pixel_i] = self.h_array[ii]
-                        self.scan_index_array[pixel_i, :] = [kk, jj, ii]
-                        pixel_i += 1
-            for ii in range(self.Nh.val):
-                self.scan_slow_move[pixel_i] = True
-                for kk, step in [(2, 1), (3, -1)]:  # trace kk =2, retrace kk=3
-                    v_line_indicies = range(self.Nv.val)[::step]
-                    for jj in v_line_indicies:
-                        self.scan_v_positions[pixel_i] = self.v_array[jj]
-                        self.scan_h_positions[pixel_i] = self.h_array[ii]
-                        self.scan_index_array[pixel_i, :] = [kk, jj, ii]
-                        pixel_i += 1
-
-
-class BaseRaster3DScan(Measurement):
+            self.set_scan_trajectory("ortho_trace_retrace")
+
+    def set_scan_trajectory(self, pattern):
+        """lazy ScanTrajectory, scan_*_positions etc. become read-only views"""
+        self.scan_trajectory = ScanTrajectory(pattern, (self.h_array, self.v_array))
+        for name, view in self.scan_trajectory.views().items():
+            setattr(self, name, view)
+
+    def save_scan_arrays_h5(self, H):
+        """compact trajectory description, or full arrays for custom generators"""
+        if self.scan_trajectory is not None:
+            self.scan_trajectory.write_h5(H)
+            return
+        H["scan_h_positions"] = self.scan_h_positions
+        H["scan_v_positions"] = self.scan_v_positions
+        H["scan_slow_move"] = self.scan_slow_move
+        H["scan_index_array"] = self.scan_index_array
+
+
+class BaseRaster3DScan(ScanTimingMixin, Measurement):
     name = "base_raster_3D_scan"
 
     def __init__(
@@ -698,6 +676,8 @@ class BaseRaster3DScan(Measurement):
         self.z_unit = z_unit
         self.use_external_range_sync = use_external_range_sync
         self.circ_roi_size = circ_roi_size
+        self.scan_trajectory = None
+        self.incremental_display = IncrementalDisplay()
         Measurement.__init__(self, app)
 
     def setup(self):
@@ -845,6 +825,12 @@ class BaseRaster3DScan(Measurement):
         self.settings.New("save_h5", dtype=bool, initial=True, ro=False)
 
         self.settings.New("show_previous_scans", dtype=bool, initial=True)
+        self.settings.New(
+            "display_levels",
+            dtype=str,
+            initial="min_max",
+            choices=tuple(LEVEL_PERCENTILES),
+        )
 
         self.settings.New(
             "pixel_time", dtype=float, ro=True, si=True, initial=1, unit="s"
@@ -853,6 +839,7 @@ class BaseRaster3DScan(Measurement):
         self.settings.New("frame_time", dtype=float, ro=True, si=True, unit="s")
         self.settings.New("total_time", dtype=float, ro=True, si=True, unit="s")
 
+        self.setup_timing_settings()
         for lq_name in ["Nh", "Nv", "Nz", "pixel_time"]:
             self.settings.get_lq(lq_name).add_listener(self.compute_times)
 
@@ -875,6 +862,9 @@ class BaseRaster3DScan(Measurement):
         self.scan_type.updated_value.connect(self.compute_scan_params)
 
         # connect events
+        self.settings.get_lq("display_levels").add_listener(
+            self.incremental_display.set_level_mode, argtype=(str,)
+        )
         self.activation.connect_to_pushButton(self.ui.start_pushButton)
 
         self.h0.connect_to_widget(self.ui.h0_doubleSpinBox)
@@ -991,6 +981,7 @@ class BaseRaster3DScan(Measurement):
         getattr(self, gen_func_name)(gen_arrays=True)
 
     def create_empty_scan_arrays(self):
+        self.scan_trajectory = None
         self.scan_h_positions = np.zeros(self.Npixels, dtype=float)
         self.scan_v_positions = np.zeros(self.Npixels, dtype=float)
         self.scan_z_positions = np.zeros(self.Npixels, dtype=float)
@@ -1028,7 +1019,7 @@ class BaseRaster3DScan(Measurement):
 
         self.img_items = []
 
-        self.img_item = pg.ImageItem()
+        self.img_item = IncrementalImageItem()
         self.img_items.append(self.img_item)
 
         self.img_plot.addItem(self.img_item)
@@ -1147,7 +1138,7 @@ class BaseRaster3DScan(Measurement):
         # self.log.debug('update_display')
         if self.initial_scan_setup_plotting:
             if self.settings["show_previous_scans"]:
-                self.img_item = pg.ImageItem()
+                self.img_item = IncrementalImageItem()
                 self.img_items.append(self.img_item)
                 self.img_plot.addItem(self.img_item)
                 self.hist_lut.setImageItem(self.img_item)
@@ -1164,14 +1155,21 @@ class BaseRaster3DScan(Measurement):
             # if self.settings.scan_type.val in ['raster']
             kk, jj, ii = self.current_scan_index
             self.disp_img = self.display_image_map[kk, :, :].T
-            self.img_item.setImage(self.disp_img, autoRange=False, autoLevels=True)
+            if self.incremental_display.active:
+                # redraw only the rows acquired since the last update
+                self.incremental_display.update_image(
+                    self.img_item, self.display_image_map, kk
+                )
+            else:
+                self.img_item.setImage(self.disp_img, autoRange=False, autoLevels=True)
             # Important to set rectangle after setImage for non-square pixels
             self.img_item.setRect(self.img_item_rect)
             self.update_LUT()
 
     def update_LUT(self):
         """override this function to control display LUT scaling"""
-        self.hist_lut.imageChanged(autoLevel=True)
+        # levels come from the running estimate when updating incrementally
+        self.hist_lut.imageChanged(autoLevel=not self.incremental_display.active)
         # DISABLE below because of crashing
         # non_zero_index = np.nonzero(self.disp_img)
         # if len(non_zero_index[0]) > 0:
@@ -1250,9 +1248,20 @@ class BaseRaster3DScan(Measurement):
     def compute_times(self):
         # self.settings['pixel_time'] = 1.0/self.scanDAQ.settings['dac_rate']
         S = self.settings
-        S["line_time"] = S["pixel_time"] * S["Nh"]
-        S["frame_time"] = S["line_time"] * S["Nv"]
-        S["total_time"] = S["frame_time"] * S["Nz"]
+        if self.timing_model_active():
+            model = self.timing_model
+            S["line_time"] = model.predict(S["Nh"], 1, 0)
+            S["frame_time"] = model.predict(S["Nh"] * S["Nv"], S["Nv"], 1)
+            S["total_time"] = model.predict(*self.scan_counts())
+        else:
+            S["line_time"] = S["pixel_time"] * S["Nh"]
+            S["frame_time"] = S["line_time"] * S["Nv"]
+            S["total_time"] = S["frame_time"] * S["Nz"]
+
+    def scan_counts(self):
+        """(n_pixels, n_lines, n_frames) of the whole scan, a frame is a z slice"""
+        S = self.settings
+        return S["Nh"] * S["Nv"] * S["Nz"], S["Nv"] * S["Nz"], S["Nz"]
 
     #### Scan Generators
     def gen_raster_scan(self, gen_arrays=True):
@@ -1260,67 +1269,33 @@ class BaseRaster3DScan(Measurement):
         self.scan_shape = (self.Nz.val, self.Nv.val, self.Nh.val)
 
         if gen_arrays:
-            # print "t0", time.time() - t0
-            self.create_empty_scan_arrays()
-            # print "t1", time.time() - t0
-
-            #             t0 = time.time()
-            #             pixel_i = 0
-            #             for jj in range(self.Nv.val):
-            #                 #print "tjj", jj, time.time() - t0
-            #                 self.scan_slow_move[pixel_i] = True
-            #                 for ii in range(self.Nh.val):
-            #                     self.scan_v_positions[pixel_i] = self.v_array[jj]
-            #                     self.scan_h_positions[pixel_i] = self.h_array[ii]
-            #                     self.scan_index_array[pixel_i,:] = [0, jj, ii]
-            #                     pixel_i += 1
-            #             print "for loop raster gen", time.time() - t0
-
-            t0 = time.time()
-
-            V, Z, H = np.meshgrid(self.v_array, self.z_array, self.h_array)
-            self.scan_h_positions[:] = H.flat
-            self.scan_v_positions[:] = V.flat
-            self.scan_z_positions[:] = Z.flat
-            # print(self.scan_h_positions[0:self.Nh.val])
-            # print(self.scan_v_positions[0:self.Nh.val*self.Nv.val])
-            # print(self.scan_z_positions[0:self.Nh.val*self.Nv.val])
-
-            self.scan_slow_move[:: self.Nh.val] = True
-            self.scan_start_move[:: self.Nh.val * self.Nv.val] = True
-
-            JJ, KK, II = np.meshgrid(
-                np.arange(self.Nv.val), np.arange(self.Nz.val), np.arange(self.Nh.val)
-            )
-            self.scan_index_array[:, 0] = KK.flat
-            self.scan_index_array[:, 1] = JJ.flat
-            self.scan_index_array[:, 2] = II.flat
-            # self.scan_v_positions
-            print("array flatten raster gen", time.time() - t0)
+            self.set_scan_trajectory("raster")
 
     def gen_serpentine_scan(self, gen_arrays=True):
         self.Npixels = self.Nh.val * self.Nv.val * self.Nz.val
         self.scan_shape = (self.Nz.val, self.Nv.val, self.Nh.val)
 
         if gen_arrays:
-            self.create_empty_scan_arrays()
-            pixel_i = 0
-            for kk in range(self.Nz.val):
-                self.scan_start_move[pixel_i] = True
-                for jj in range(self.Nv.val):
-                    self.scan_slow_move[pixel_i] = True
-
-                    if jj % 2:  # odd lines
-                        h_line_indicies = range(self.Nh.val)[::-1]
-                    else:  # even lines -- traverse in opposite direction
-                        h_line_indicies = range(self.Nh.val)
-
-                    for ii in h_line_indicies:
-                        self.scan_z_positions[pixel_i] = self.z_array[kk]
-                        self.scan_v_positions[pixel_i] = self.v_array[jj]
-                        self.scan_h_positions[pixel_i] = self.h_array[ii]
-                        self.scan_index_array[pixel_i, :] = [kk, jj, ii]
-                        pixel_i += 1
+            self.set_scan_trajectory("serpentine")
+
+    def set_scan_trajectory(self, pattern):
+        """lazy ScanTrajectory, scan_*_positions etc. become read-only views"""
+        self.scan_trajectory = ScanTrajectory(
+            pattern, (self.h_array, self.v_array, self.z_array)
+        )
+        for name, view in self.scan_trajectory.views().items():
+            setattr(self, name, view)
+
+    def save_scan_arrays_h5(self, H):
+        """compact trajectory description, or full arrays for custom generators"""
+        if self.scan_trajectory is not None:
+            self.scan_trajectory.write_h5(H)
+            return
+        H["scan_h_positions"] = self.scan_h_positions
+        H["scan_v_positions"] = self.scan_v_positions
+        H["scan_z_positions"] = self.scan_z_positions
+        H["scan_slow_move"] = self.scan_slow_move
+        H["scan_index_array"] = self.scan_index_array
 
 
 #
@@ -1389,21 +1364,29 @@ class BaseRaster3DScan(Measurement):
 #                         self.scan_h_positions[pixel_i] = self.h_array[ii]
 #                         self.scan_index_array[pixel_i,:] = [kk, jj, ii]
 #                         pixel_i += 1
-def ijk_zigzag_generator(dims, axis_order=(0, 1, 2)):
-    """3D zig-zag scan pattern generator with arbitrary fast axis order"""
+def ijk_zigzag_indices(dims, axis_order=(0, 1, 2)) -> np.ndarray:
+    """(N, 3) index array of ijk_zigzag_generator"""
+    slabs = [_zigzag_slab(dims, axis_order, i) for i in range(dims[axis_order[0]])]
+    return np.concatenate([np.zeros((0, 3), dtype=int)] + slabs)
+
 
+def _zigzag_slab(dims, axis_order, i_ax0):
     ax0, ax1, ax2 = axis_order
+    n1, n2 = dims[ax1], dims[ax2]
+    i_ax1 = np.arange(n1)[:: (1, -1)[i_ax0 % 2]]
+    i_ax2 = np.tile(np.arange(n2), (n1, 1))
+    zag = (i_ax0 + i_ax1) % 2 == 1
+    i_ax2[zag] = i_ax2[zag, ::-1]
 
-    for i_ax0 in range(dims[ax0]):
-        zig_or_zag0 = (1, -1)[i_ax0 % 2]
-        for i_ax1 in range(dims[ax1])[::zig_or_zag0]:
-            zig_or_zag1 = (1, -1)[(i_ax0 + i_ax1) % 2]
-            for i_ax2 in range(dims[ax2])[::zig_or_zag1]:
+    ijk = np.zeros((n1 * n2, 3), dtype=int)
+    ijk[:, ax0] = i_ax0
+    ijk[:, ax1] = np.repeat(i_ax1, n2)
+    ijk[:, ax2] = i_ax2.ravel()
+    return ijk
 
-                ijk = [0, 0, 0]
-                ijk[ax0] = i_ax0
-                ijk[ax1] = i_ax1
-                ijk[ax2] = i_ax2
 
-                yield tuple(ijk)
-    return
+def ijk_zigzag_generator(dims, axis_order=(0, 1, 2)):
+    """3D zig-zag scan pattern generator with arbitrary fast axis order"""
+    # computed one slow-axis slab at a time to stay lazy
+    for i_ax0 in range(dims[axis_order[0]]):
+        yield from map(tuple, _zigzag_slab(dims, axis_order, i_ax0).tolist())
@@ -1,15 +1,466 @@
 import time
 import traceback
 
+import h5py
 import numpy as np
 
+from ScopeFoundry.h5_io import GrowingH5Dataset
+
+from .adaptive_scan import (
+    ADAPTIVE_SAMPLE_DTYPE,
+    IMPORTANCE_MEASURES,
+    coarse_grid,
+    fill_unmeasured,
+    importance_map,
+    normalized,
+    refinement_points,
+)
 from .base_raster_scan import BaseRaster2DScan, BaseRaster3DScan
+from .checkpoint import (
+    ResumeH5Group,
+    arrays_hash,
+    begin_checkpoints,
+    read_checkpoint,
+    scan_trajectory_hash,
+    settings_hash,
+    write_checkpoint,
+)
+from .detector_reads import DetectorPool
+
+# pixels per block when restoring display_image_map of a resumed scan
+DISPLAY_CHUNK_SIZE = 65536
+
+
+class LineCollectionMixin:
+    """
+    Optional line-at-a-time acquisition for the slow scans.
+
+    A subclass that overrides *collect_line* acquires a whole line per call
+    (e.g. hardware-timed or buffered) instead of one *collect_pixel* per
+    pixel. The base class moves to the start of each line, and handles
+    display, progress and h5 writes per line.
+    """
+
+    def collect_line(self, line_index: int, h_positions, v_positions):
+        """
+        Override to acquire the pixels at *h_positions*, *v_positions*.
+
+        May return a dict {name: values} with one entry per pixel along the
+        first axis. These are saved to h5 datasets *name* of shape
+        scan_shape + values.shape[1:]; the first scalar one is displayed.
+        """
+        raise NotImplementedError
+
+    def uses_collect_line(self) -> bool:
+        return type(self).collect_line is not LineCollectionMixin.collect_line
+
+    def line_starts(self) -> np.ndarray:
+        if self.scan_trajectory is not None:
+            return self.scan_trajectory.line_starts()
+        return np.flatnonzero(self.scan_slow_move)
+
+    def move_to_line_start(self, pixel_i: int, h: float, v: float, dh, dv):
+        self.move_position_slow(h, v, dh, dv)
+
+    def checkpoint(self, pixels_done: int):
+        """called before every flush, all pixels before *pixels_done* are done"""
+        pass
+
+    @staticmethod
+    def write_line_h5(dset, index, values):
+        """writes *values* of the pixels at (k, j, i) *index* to *dset*"""
+        box = tuple(slice(x.min(), x.max() + 1) for x in index.T)
+        box_shape = tuple(b.stop - b.start for b in box)
+        if np.prod(box_shape) != len(index):
+            # line does not fill its bounding box, write pixel by pixel
+            for (k, j, i), val in zip(index, values):
+                dset[k, j, i] = val
+            return
+        # lines of the built-in patterns are full rows or columns
+        box_values = np.empty(box_shape + values.shape[1:], dtype=values.dtype)
+        box_values[tuple((index - [b.start for b in box]).T)] = values
+        dset[box] = box_values
+
+    def run_line_scan(self, first_pixel: int = 0):
+        save_h5 = self.settings["save_h5"]
+        self.line_data_h5 = {}
+        starts = self.line_starts()
+        stops = np.append(starts[1:], self.Npixels)
+
+        for line_i, (start, stop) in enumerate(zip(starts, stops)):
+            if self.interrupt_measurement_called:
+                break
+            if stop <= first_pixel:
+                continue
+            index = np.asarray(self.scan_index_array[start:stop])
+            h_positions = np.asarray(self.scan_h_positions[start:stop])
+            v_positions = np.asarray(self.scan_v_positions[start:stop])
+            self.pixel_i = start
+            self.current_scan_index = index[0]
+
+            if start == 0:
+                dh = dv = 0
+            else:
+                dh = h_positions[0] - self.scan_h_positions[start - 1]
+                dv = v_positions[0] - self.scan_v_positions[start - 1]
+            self.move_to_line_start(start, h_positions[0], v_positions[0], dh, dv)
+            self.pos = (h_positions[0], v_positions[0])
+
+            t0 = time.time()
+            line_data = self.collect_line(line_i, h_positions, v_positions) or {}
+            t1 = time.time()
+
+            kk, jj, ii = index.T
+            n = len(index)
+            self.pixel_time[kk, jj, ii] = t0 + (t1 - t0) * np.arange(n) / n
+            if save_h5:
+                self.write_line_h5(
+                    self.pixel_time_h5, index, self.pixel_time[kk, jj, ii]
+                )
+
+            displayed = False
+            for name, values in line_data.items():
+                values = np.asarray(values)
+                if not displayed and values.ndim == 1:
+                    self.display_image_map[kk, jj, ii] = values
+                    displayed = True
+                if not save_h5:
+                    continue
+                if name not in self.line_data_h5:
+                    self.line_data_h5[name] = self.h5_scan_dataset(
+                        name, self.scan_shape + values.shape[1:], values.dtype
+                    )
+                self.write_line_h5(self.line_data_h5[name], index, values)
+            self.incremental_display.mark(kk, jj)
+
+            if save_h5:
+                self.checkpoint(stop)
+                self.h5_file.flush()
+            self.set_progress(100.0 * stop / self.Npixels)
+
+
+class ConcurrentDetectorMixin:
+    """
+    Concurrent reads of several detectors per pixel for the slow scans.
+
+    Detectors registered with *add_detector* (e.g. in setup or
+    pre_scan_setup) are read all at once by *read_detectors*, which the
+    default *collect_pixel* calls. Values land in detector_data[name] and
+    h5 dataset *name* (scan_shape + shape), the read latencies in
+    detector_latency[name] and h5 dataset *name*_latency.
+    """
+
+    def add_detector(self, name: str, read, shape=(), dtype=float):
+        """registers detector *name*, *read*() returns the value of a pixel"""
+        if not hasattr(self, "detector_pool"):
+            self.detector_pool = DetectorPool()
+        self.detector_pool.add(name, read, shape, dtype)
+
+    def has_detectors(self) -> bool:
+        return len(getattr(self, "detector_pool", ())) > 0
+
+    def start_detectors(self):
+        self.detector_data = {}
+        self.detector_latency = {}
+        self.detector_data_h5 = {}
+        if not self.has_detectors():
+            return
+        save_h5 = self.settings["save_h5"]
+        for det in self.detector_pool:
+            shape = self.scan_shape + det.shape
+            self.detector_data[det.name] = np.zeros(shape, dtype=det.dtype)
+            self.detector_latency[det.name] = np.zeros(self.scan_shape)
+            if save_h5:
+                data_h5 = self.h5_scan_dataset(det.name, shape, det.dtype)
+                latency_h5 = self.h5_scan_dataset(
+                    f"{det.name}_latency", self.scan_shape, float
+                )
+                self.detector_data_h5[det.name] = (data_h5, latency_h5)
+                if self.resuming:
+                    self.detector_data[det.name][...] = data_h5[...]
+                    self.detector_latency[det.name][...] = latency_h5[...]
+        self.detector_pool.start()
+
+    def read_detectors(self, k: int, j: int, i: int) -> dict:
+        """reads all detectors concurrently and stores their values at (k, j, i)"""
+        values, latencies = self.detector_pool.read_all()
+        for name, value in values.items():
+            self.detector_data[name][k, j, i] = value
+            self.detector_latency[name][k, j, i] = latencies[name]
+            if name in self.detector_data_h5:
+                data_h5, latency_h5 = self.detector_data_h5[name]
+                data_h5[k, j, i] = value
+                latency_h5[k, j, i] = latencies[name]
+        return values
+
+    def stop_detectors(self):
+        if not self.has_detectors():
+            return
+        self.detector_pool.shutdown()
+        for name, latency in getattr(self, "detector_latency", {}).items():
+            acquired = latency > 0
+            if acquired.any():
+                self.log.info(
+                    f"detector {name} mean latency {latency[acquired].mean():.3g} s"
+                )
+
+    def collect_detector_pixel(self, k: int, j: int, i: int):
+        """default pixel acquisition: read detectors, display the first scalar one"""
+        values = self.read_detectors(k, j, i)
+        for det in self.detector_pool:
+            if det.shape == ():
+                self.display_image_map[k, j, i] = values[det.name]
+                break
+
+
+class CheckpointMixin:
+    """
+    Checkpointed resume for the slow scans.
+
+    Every flush records the number of completed pixels in the h5 file,
+    next to hashes of the checkpoint_settings and the trajectory. The
+    "resume" operation reopens resume_file, verifies that both hashes match
+    the current settings and continues from the last completed line into
+    the same datasets: while resuming, creating a dataset of the measurement
+    group returns the existing one. display_image_map is saved with every
+    checkpoint and restored on resume.
+    """
+
+    # settings that must match to resume, extend with acquisition settings
+    checkpoint_settings = (
+        "h0 h1 dh Nh v0 v1 dv Nv z0 z1 dz Nz scan_type adaptive_scan".split()
+    )
+
+    resuming = False
+
+    def setup_checkpoint_settings(self):
+        self.settings.New("resume_file", dtype="file", initial="")
+        self.add_operation(
+            "resume", self.resume, "continue the interrupted scan of resume_file"
+        )
+        self._resume_file = None
+
+    def resume(self, fname=None):
+        if fname is None:
+            fname = self.settings["resume_file"]
+        self._resume_file = fname
+        self.settings["save_h5"] = True
+        self.start()
+
+    def checkpoint_settings_hash(self) -> str:
+        names = [name for name in self.checkpoint_settings if name in self.settings]
+        return settings_hash(self.settings, names)
+
+    def trajectory_hash(self) -> str:
+        if self.scan_trajectory is not None:
+            return scan_trajectory_hash(self.scan_trajectory)
+        # custom scan generators fill the arrays
+        arrays = [self.scan_h_positions, self.scan_v_positions]
+        if hasattr(self, "scan_z_positions"):
+            arrays.append(self.scan_z_positions)
+        return arrays_hash(*arrays, self.scan_index_array)
+
+    def begin_checkpoints(self):
+        begin_checkpoints(
+            self.h5_meas_group, self.checkpoint_settings_hash(), self.trajectory_hash()
+        )
+
+    def checkpoint(self, pixels_done: int):
+        if self.settings["save_h5"]:
+            self.save_display_image_map(pixels_done)
+            write_checkpoint(
+                self.h5_meas_group, pixels_done, pixels_done >= self.Npixels
+            )
+
+    def open_resume_file(self, fname) -> int:
+        """
+        reopens the h5 file *fname* of an interrupted scan, returns the
+        first pixel to acquire
+        """
+        self.close_h5_file()
+        self.h5_file = h5py.File(fname, "r+")
+        self.h5_filename = self.h5_file.filename
+        H = self.h5_file["measurement/" + self.name]
+        self.h5_meas_group = H = ResumeH5Group(H.id)
+        checkpoint = read_checkpoint(H)
+        if checkpoint["settings_hash"] != self.checkpoint_settings_hash():
+            differing = [
+                name
+                for name in self.checkpoint_settings
+                if name in self.settings
+                and str(H["settings"].attrs.get(name))
+                != str(self.settings.get_lq(name).val)
+            ]
+            raise ValueError(f"can not resume {fname}, settings differ: {differing}")
+        if checkpoint["trajectory_hash"] != self.trajectory_hash():
+            raise ValueError(f"can not resume {fname}, scan trajectory differs")
+        if checkpoint["complete"]:
+            raise ValueError(f"can not resume {fname}, scan is complete")
+        return int(checkpoint["pixel"])
+
+    def h5_scan_dataset(self, name, shape, dtype=float, **kwargs):
+        """creates h5 dataset *name*, or returns the existing one when resuming"""
+        return self.h5_meas_group.create_dataset(
+            name, shape=shape, dtype=dtype, **kwargs
+        )
+
+    def setup_display_image_map_h5(self, first_pixel: int):
+        """creates the display_image_map dataset, restores it when resuming"""
+        self.display_image_map_h5 = self.h5_scan_dataset(
+            "display_image_map", self.scan_shape, float, fillvalue=np.nan
+        )
+        self._display_pixels_saved = first_pixel
+        if not self.resuming:
+            return
+        saved = self.display_image_map_h5[...]
+        for start in range(0, first_pixel, DISPLAY_CHUNK_SIZE):
+            stop = min(start + DISPLAY_CHUNK_SIZE, first_pixel)
+            kk, jj, ii = np.asarray(self.scan_index_array[start:stop]).T
+            self.display_image_map[kk, jj, ii] = saved[kk, jj, ii]
+            self.incremental_display.mark(kk, jj)
+
+    def save_display_image_map(self, pixels_done: int):
+        """writes display_image_map of the pixels completed since the last call"""
+        start = self._display_pixels_saved
+        if pixels_done <= start:
+            return
+        index = np.asarray(self.scan_index_array[start:pixels_done])
+        kk, jj, ii = index.T
+        self.write_line_h5(
+            self.display_image_map_h5, index, self.display_image_map[kk, jj, ii]
+        )
+        self._display_pixels_saved = pixels_done
+
+
+class AdaptiveScanMixin:
+    """
+    Optional coarse-to-fine acquisition for 2D slow scans (adaptive_scan).
+
+    Every adaptive_coarse_step-th pixel is collected first, then blocks whose
+    importance exceeds adaptive_threshold are refined at half the spacing
+    until single pixels. Importance (0..1) is derived from display_image_map
+    by its gradient, its intensity or *adaptive_importance*. Unvisited pixels
+    stay unset; every collected pixel is listed in the "adaptive_samples"
+    h5 dataset. *collect_pixel* receives the sample number as pixel_num.
+    """
+
+    def setup_adaptive_settings(self):
+        S = self.settings
+        S.New("adaptive_scan", dtype=bool, initial=False)
+        S.New("adaptive_coarse_step", dtype=int, initial=4, vmin=2)
+        S.New(
+            "adaptive_importance",
+            dtype=str,
+            initial="gradient",
+            choices=IMPORTANCE_MEASURES,
+        )
+        S.New("adaptive_threshold", dtype=float, initial=0.1, vmin=0, vmax=1)
+
+    def adaptive_importance(self, image: np.ndarray, measured: np.ndarray):
+        """
+        Override and set adaptive_importance to 'callback' to compute the
+        (Nv, Nh) importance map of *image*, whose unmeasured pixels are
+        filled with nearby measured values.
+        """
+        raise NotImplementedError
+
+    def compute_adaptive_importance(self, measured: np.ndarray) -> np.ndarray:
+        filled = fill_unmeasured(self.display_image_map[0], measured)
+        measure = self.settings["adaptive_importance"]
+        if measure == "callback":
+            return normalized(self.adaptive_importance(filled, measured))
+        return importance_map(filled, measure)
+
+    def run_adaptive_scan(self):
+        trajectory = self.scan_trajectory
+        if trajectory is None or trajectory.pattern not in ("raster", "serpentine"):
+            raise ValueError("adaptive scan needs a raster or serpentine scan_type")
+        S = self.settings
+        measured = np.zeros(self.scan_shape[1:], dtype=bool)
+        self.adaptive_samples_h5 = None
+        if S["save_h5"]:
+            self.adaptive_samples_h5 = GrowingH5Dataset(
+                self.h5_meas_group,
+                "adaptive_samples",
+                shape=(0,),
+                dtype=ADAPTIVE_SAMPLE_DTYPE,
+            )
+        self.pixel_i = 0
+        step = S["adaptive_coarse_step"]
+        points = coarse_grid(measured.shape, step)
+        level = 0
+        try:
+            while len(points) and not self.interrupt_measurement_called:
+                self.collect_adaptive_points(points, level, measured)
+                if S["save_h5"]:
+                    # refinement passes are not in scan order, write the image
+                    self.display_image_map_h5[...] = self.display_image_map
+                if step == 1:
+                    break
+                importance = self.compute_adaptive_importance(measured)
+                points = refinement_points(
+                    measured, importance, step, S["adaptive_threshold"]
+                )
+                step //= 2
+                level += 1
+        finally:
+            if self.adaptive_samples_h5 is not None:
+                self.adaptive_samples_h5.close()
+                self.h5_meas_group.attrs["adaptive_fraction"] = measured.mean()
+        self.log.info(
+            f"adaptive scan collected {measured.sum()} of {measured.size} pixels"
+        )
+
+    def collect_adaptive_points(self, points, level, measured):
+        save_h5 = self.settings["save_h5"]
+        h_array, v_array = self.h_array, self.v_array
+        h_prev, v_prev = self.pos if self.pixel_i else (h_array[0], v_array[0])
+        for n, (jj, ii) in enumerate(points):
+            if self.interrupt_measurement_called:
+                break
+            h, v = h_array[ii], v_array[jj]
+            dh, dv = h - h_prev, v - v_prev
+            if n == 0 or jj != points[n - 1][0]:
+                self.move_position_slow(h, v, dh, dv)
+                if save_h5:
+                    self.h5_file.flush()
+            else:
+                self.move_position_fast(h, v, dh, dv)
+            self.pos = (h, v)
+            h_prev, v_prev = h, v
+
+            self.current_scan_index = (0, jj, ii)
+            pixel_t0 = time.time()
+            self.pixel_time[0, jj, ii] = pixel_t0
+            if save_h5:
+                self.pixel_time_h5[0, jj, ii] = pixel_t0
+            self.collect_pixel(self.pixel_i, 0, jj, ii)
+            measured[jj, ii] = True
+            self.incremental_display.mark(0, jj)
+            if save_h5:
+                value = self.display_image_map[0, jj, ii]
+                self.adaptive_samples_h5.append(
+                    (self.pixel_i, level, jj, ii, h, v, pixel_t0, value)
+                )
+            self.pixel_i += 1
+            self.set_progress(100.0 * self.pixel_i / self.Npixels)
 
 
-class BaseRaster2DSlowScan(BaseRaster2DScan):
+class BaseRaster2DSlowScan(
+    CheckpointMixin,
+    ConcurrentDetectorMixin,
+    AdaptiveScanMixin,
+    LineCollectionMixin,
+    BaseRaster2DScan,
+):
 
     name = "base_raster_2Dslowscan"
 
+    def setup(self):
+        super().setup()
+        self.setup_adaptive_settings()
+        self.setup_checkpoint_settings()
+
     def run(self):
         S = self.settings
 
@@ -22,13 +473,19 @@ class BaseRaster2DSlowScan(BaseRaster2DScan):
         # this allows for pyqtgraph histogram to ignore unfilled data
         # pyqtgraph ImageItem also keeps unfilled data pixels transparent
         self.display_image_map = np.nan * np.zeros(self.scan_shape, dtype=float)
+        self.incremental_display.reset()
 
         while not self.interrupt_measurement_called:
             try:
                 # h5 data file setup
                 self.t0 = time.time()
 
-                if self.settings["save_h5"]:
+                resume_file, self._resume_file = self._resume_file, None
+                self.resuming = resume_file is not None
+                first_pixel = 0
+                if self.resuming:
+                    first_pixel = self.open_resume_file(resume_file)
+                elif self.settings["save_h5"]:
                     H = self.open_new_h5_file()
                     self.h5_filename = self.h5_file.filename
 
@@ -38,82 +495,104 @@ class BaseRaster2DSlowScan(BaseRaster2DScan):
                     H["range_extent"] = self.range_extent
                     H["corners"] = self.corners
                     H["imshow_extent"] = self.imshow_extent
-                    H["scan_h_positions"] = self.scan_h_positions
-                    H["scan_v_positions"] = self.scan_v_positions
-                    H["scan_slow_move"] = self.scan_slow_move
-                    H["scan_index_array"] = self.scan_index_array
+                    self.save_scan_arrays_h5(H)
+                    self.begin_checkpoints()
 
                 # start scan
-                self.pixel_i = 0
-                self.current_scan_index = self.scan_index_array[0]
+                self.pixel_i = first_pixel
+                self.current_scan_index = self.scan_index_array[first_pixel]
 
                 self.pixel_time = np.zeros(self.scan_shape, dtype=float)
                 if self.settings["save_h5"]:
-                    self.pixel_time_h5 = H.create_dataset(
-                        name="pixel_time", shape=self.scan_shape, dtype=float
+                    self.pixel_time_h5 = self.h5_scan_dataset(
+                        "pixel_time", self.scan_shape, float
                     )
+                    if self.resuming:
+                        self.pixel_time[...] = self.pixel_time_h5[...]
+                    self.setup_display_image_map_h5(first_pixel)
 
                 self.pre_scan_setup()
+                self.start_detectors()
 
                 self.move_position_start(
-                    self.scan_h_positions[0], self.scan_v_positions[0]
+                    self.scan_h_positions[first_pixel],
+                    self.scan_v_positions[first_pixel],
                 )
 
-                for self.pixel_i in range(self.Npixels):
-                    if self.interrupt_measurement_called:
-                        break
-
-                    i = self.pixel_i
-
-                    self.current_scan_index = self.scan_index_array[i]
-                    kk, jj, ii = self.current_scan_index
-
-                    h, v = self.scan_h_positions[i], self.scan_v_positions[i]
-
-                    if self.pixel_i == 0:
-                        dh = 0
-                        dv = 0
-                    else:
-                        dh = self.scan_h_positions[i] - self.scan_h_positions[i - 1]
-                        dv = self.scan_v_positions[i] - self.scan_v_positions[i - 1]
-
-                    if self.scan_slow_move[i]:
-                        if self.interrupt_measurement_called:
-                            break
-                        self.move_position_slow(h, v, dh, dv)
-                        if self.settings["save_h5"]:
-                            self.h5_file.flush()  # flush data to file every slow move
-                        # self.app.qtapp.ProcessEvents()
-                        time.sleep(0.01)
+                if self.settings["adaptive_scan"]:
+                    if self.resuming:
+                        raise ValueError("adaptive scans can not be resumed")
+                    self.run_adaptive_scan()
+                else:
+                    if self.uses_collect_line():
+                        self.run_line_scan(first_pixel)
                     else:
-                        self.move_position_fast(h, v, dh, dv)
-
-                    self.pos = (h, v)
-                    # each pixel:
-                    # acquire signal and save to data array
-                    pixel_t0 = time.time()
-                    self.pixel_time[kk, jj, ii] = pixel_t0
-                    if self.settings["save_h5"]:
-                        self.pixel_time_h5[kk, jj, ii] = pixel_t0
-                    self.collect_pixel(self.pixel_i, kk, jj, ii)
-                    self.set_progress(100.0 * self.pixel_i / (self.Npixels))
+                        self.run_pixel_scan(first_pixel)
+                    if not self.interrupt_measurement_called:
+                        self.checkpoint(self.Npixels)
+                    if not self.resuming:
+                        self.calibrate_timing(self.pixel_time, self.t0)
             except Exception as err:
                 self.last_err = err
                 self.log.error("Failed to Scan {}".format(repr(err)))
                 traceback.print_exc()
                 # raise(err)
             finally:
+                self.resuming = False
+                self.stop_detectors()
                 self.post_scan_cleanup()
                 if hasattr(self, "h5_file"):
                     print("h5_file", self.h5_file)
                     try:
-                        self.h5_file.close()
+                        self.close_h5_file()
                     except ValueError as err:
                         self.log.warning("failed to close h5_file: {}".format(err))
                 if not self.settings["continuous_scan"]:
                     break
         print(self.name, "done")
 
+    def run_pixel_scan(self, first_pixel: int = 0):
+        for self.pixel_i in range(first_pixel, self.Npixels):
+            if self.interrupt_measurement_called:
+                break
+
+            i = self.pixel_i
+
+            self.current_scan_index = self.scan_index_array[i]
+            kk, jj, ii = self.current_scan_index
+
+            h, v = self.scan_h_positions[i], self.scan_v_positions[i]
+
+            if self.pixel_i == 0:
+                dh = 0
+                dv = 0
+            else:
+                dh = self.scan_h_positions[i] - self.scan_h_positions[i - 1]
+                dv = self.scan_v_positions[i] - self.scan_v_positions[i - 1]
+
+            if self.scan_slow_move[i]:
+                if self.interrupt_measurement_called:
+                    break
+                self.move_position_slow(h, v, dh, dv)
+                if self.settings["save_h5"]:
+                    self.checkpoint(i)
+                    self.h5_file.flush()  # flush data to file every slow move
+                # self.app.qtapp.ProcessEvents()
+                time.sleep(0.01)
+            else:
+                self.move_position_fast(h, v, dh, dv)
+
+            self.pos = (h, v)
+            # each pixel:
+            # acquire signal and save to data array
+            pixel_t0 = time.time()
+            self.pixel_time[kk, jj, ii] = pixel_t0
+            if self.settings["save_h5"]:
+                self.pixel_time_h5[kk, jj, ii] = pixel_t0
+            self.collect_pixel(self.pixel_i, kk, jj, ii)
+            self.incremental_display.mark(kk, jj)
+            self.set_progress(100.0 * self.pixel_i / (self.Npixels))
+
     def new_pt_pos(self, x, y):
         self.move_position_start(x, y)
 
@@ -140,16 +619,24 @@ class BaseRaster2DSlowScan(BaseRaster2DScan):
     def collect_pixel(self, pixel_num: int, k: int, j: int, i: int):
         # collect data
         # store in arrays
+        if self.has_detectors():
+            return self.collect_detector_pixel(k, j, i)
         print(self.name, "collect_pixel", pixel_num, k, j, i, "not implemented")
 
     def post_scan_cleanup(self):
         print(self.name, "post_scan_cleanup not implemented")
 
 
-class BaseRaster3DSlowScan(BaseRaster3DScan):
+class BaseRaster3DSlowScan(
+    CheckpointMixin, ConcurrentDetectorMixin, LineCollectionMixin, BaseRaster3DScan
+):
 
     name = "base_raster_3Dslowscan"
 
+    def setup(self):
+        super().setup()
+        self.setup_checkpoint_settings()
+
     def run(self):
         S = self.settings
 
@@ -159,13 +646,19 @@ class BaseRaster3DSlowScan(BaseRaster3DScan):
         self.initial_scan_setup_plotting = True
 
         self.display_image_map = np.zeros(self.scan_shape, dtype=float)
+        self.incremental_display.reset()
 
         while not self.interrupt_measurement_called:
             try:
                 # h5 data file setup
                 self.t0 = time.time()
 
-                if self.settings["save_h5"]:
+                resume_file, self._resume_file = self._resume_file, None
+                self.resuming = resume_file is not None
+                first_pixel = 0
+                if self.resuming:
+                    first_pixel = self.open_resume_file(resume_file)
+                elif self.settings["save_h5"]:
                     H = self.open_new_h5_file()
                     self.h5_filename = self.h5_file.filename
 
@@ -176,97 +669,121 @@ class BaseRaster3DSlowScan(BaseRaster3DScan):
                     H["range_extent"] = self.range_extent
                     H["corners"] = self.corners
                     H["imshow_extent"] = self.imshow_extent
-                    H["scan_h_positions"] = self.scan_h_positions
-                    H["scan_v_positions"] = self.scan_v_positions
-                    H["scan_z_positions"] = self.scan_z_positions
-                    H["scan_slow_move"] = self.scan_slow_move
-                    H["scan_index_array"] = self.scan_index_array
+                    self.save_scan_arrays_h5(H)
+                    self.begin_checkpoints()
 
                 # start scan
-                self.pixel_i = 0
-                self.current_scan_index = self.scan_index_array[0]
+                self.pixel_i = first_pixel
+                self.current_scan_index = self.scan_index_array[first_pixel]
 
                 self.pixel_time = np.zeros(self.scan_shape, dtype=float)
                 if self.settings["save_h5"]:
-                    self.pixel_time_h5 = H.create_dataset(
-                        name="pixel_time", shape=self.scan_shape, dtype=float
+                    self.pixel_time_h5 = self.h5_scan_dataset(
+                        "pixel_time", self.scan_shape, float
                     )
+                    if self.resuming:
+                        self.pixel_time[...] = self.pixel_time_h5[...]
+                    self.setup_display_image_map_h5(first_pixel)
 
                 self.pre_scan_setup()
+                self.start_detectors()
 
                 self.move_position_start(
-                    self.scan_h_positions[0],
-                    self.scan_v_positions[0],
-                    self.scan_z_positions[0],
+                    self.scan_h_positions[first_pixel],
+                    self.scan_v_positions[first_pixel],
+                    self.scan_z_positions[first_pixel],
                 )
 
-                for self.pixel_i in range(self.Npixels):
-                    if self.interrupt_measurement_called:
-                        break
-
-                    i = self.pixel_i
-
-                    self.current_scan_index = self.scan_index_array[i]
-                    kk, jj, ii = self.current_scan_index
-
-                    h, v, z = (
-                        self.scan_h_positions[i],
-                        self.scan_v_positions[i],
-                        self.scan_z_positions[i],
+                if self.uses_collect_line():
+                    self.run_line_scan(first_pixel)
+                else:
+                    self.run_pixel_scan(first_pixel)
+                if not self.interrupt_measurement_called:
+                    self.checkpoint(self.Npixels)
+                if not self.resuming:
+                    self.calibrate_timing(
+                        self.pixel_time, self.t0, self.scan_start_move
                     )
-
-                    if self.pixel_i == 0:
-                        dh = 0
-                        dv = 0
-                    else:
-                        dh = self.scan_h_positions[i] - self.scan_h_positions[i - 1]
-                        dv = self.scan_v_positions[i] - self.scan_v_positions[i - 1]
-
-                    if self.scan_start_move[i]:
-                        if self.interrupt_measurement_called:
-                            break
-                        self.move_position_start(h, v, z)
-                        if self.settings["save_h5"]:
-                            self.h5_file.flush()  # flush data to file every slow move
-                        # self.app.qtapp.ProcessEvents()
-                        time.sleep(0.01)
-                    elif self.scan_slow_move[i]:
-                        if self.interrupt_measurement_called:
-                            break
-                        self.move_position_slow(h, v, dh, dv)
-                        if self.settings["save_h5"]:
-                            self.h5_file.flush()  # flush data to file every slow move
-                        # self.app.qtapp.ProcessEvents()
-                        time.sleep(0.01)
-                    else:
-                        self.move_position_fast(h, v, dh, dv)
-
-                    self.pos = (h, v)
-                    # each pixel:
-                    # acquire signal and save to data array
-                    pixel_t0 = time.time()
-                    self.pixel_time[kk, jj, ii] = pixel_t0
-                    if self.settings["save_h5"]:
-                        self.pixel_time_h5[kk, jj, ii] = pixel_t0
-                    self.collect_pixel(self.pixel_i, kk, jj, ii)
-                    self.set_progress(100.0 * self.pixel_i / (self.Npixels))
             except Exception as err:
                 self.last_err = err
                 self.log.error("Failed to Scan {}".format(repr(err)))
                 traceback.print_exc()
                 # raise(err)
             finally:
+                self.resuming = False
+                self.stop_detectors()
                 self.post_scan_cleanup()
                 if hasattr(self, "h5_file"):
                     print("h5_file", self.h5_file)
                     try:
-                        self.h5_file.close()
+                        self.close_h5_file()
                     except ValueError as err:
                         self.log.warning("failed to close h5_file: {}".format(err))
                 if not self.settings["continuous_scan"]:
                     break
         print(self.name, "done")
 
+    def run_pixel_scan(self, first_pixel: int = 0):
+        for self.pixel_i in range(first_pixel, self.Npixels):
+            if self.interrupt_measurement_called:
+                break
+
+            i = self.pixel_i
+
+            self.current_scan_index = self.scan_index_array[i]
+            kk, jj, ii = self.current_scan_index
+
+            h, v, z = (
+                self.scan_h_positions[i],
+                self.scan_v_positions[i],
+                self.scan_z_positions[i],
+            )
+
+            if self.pixel_i == 0:
+                dh = 0
+                dv = 0
+            else:
+                dh = self.scan_h_positions[i] - self.scan_h_positions[i - 1]
+                dv = self.scan_v_positions[i] - self.scan_v_positions[i - 1]
+
+            if self.scan_start_move[i]:
+                if self.interrupt_measurement_called:
+                    break
+                self.move_position_start(h, v, z)
+                if self.settings["save_h5"]:
+                    self.checkpoint(i)
+                    self.h5_file.flush()  # flush data to file every slow move
+                # self.app.qtapp.ProcessEvents()
+                time.sleep(0.01)
+            elif self.scan_slow_move[i]:
+                if self.interrupt_measurement_called:
+                    break
+                self.move_position_slow(h, v, dh, dv)
+                if self.settings["save_h5"]:
+                    self.checkpoint(i)
+                    self.h5_file.flush()  # flush data to file every slow move
+                # self.app.qtapp.ProcessEvents()
+                time.sleep(0.01)
+            else:
+                self.move_position_fast(h, v, dh, dv)
+
+            self.pos = (h, v)
+            # each pixel:
+            # acquire signal and save to data array
+            pixel_t0 = time.time()
+            self.pixel_time[kk, jj, ii] = pixel_t0
+            if self.settings["save_h5"]:
+                self.pixel_time_h5[kk, jj, ii] = pixel_t0
+            self.collect_pixel(self.pixel_i, kk, jj, ii)
+            self.incremental_display.mark(kk, jj)
+            self.set_progress(100.0 * self.pixel_i / (self.Npixels))
+
+    def move_to_line_start(self, pixel_i: int, h: float, v: float, dh, dv):
+        if self.scan_start_move[pixel_i]:
+            self.move_position_start(h, v, self.scan_z_positions[pixel_i])
+        else:
+            self.move_position_slow(h, v, dh, dv)
+
     def new_pt_pos(self, x, y):
         self.move_position_slow(x, y, 0, 0)
 
@@ -294,6 +811,8 @@ class BaseRaster3DSlowScan(BaseRaster3DScan):
     def collect_pixel(self, pixel_num: int, k: int, j: int, i: int):
         # collect data
         # store in arrays
+        if self.has_detectors():
+            return self.collect_detector_pixel(k, j, i)
         print(self.name, "collect_pixel", pixel_num, k, j, i, "not implemented")
 
     def post_scan_cleanup(self):
@@ -0,0 +1,82 @@
+"""
+Checkpoint metadata that allows continuing an interrupted scan in its h5 file.
+
+At the start of a scan the measurement group gets hashes of the scan
+defining settings and of the trajectory. Every flush records the number of
+pixels completed so far (all pixels before a line start), so after a crash
+the file can be reopened and the scan continued from that line.
+"""
+
+import hashlib
+import json
+
+import h5py
+import numpy as np
+
+
+def settings_hash(settings, names) -> str:
+    """hash of the values of settings *names* of LQCollection *settings*"""
+    values = {name: settings.get_lq(name).ini_string_value() for name in names}
+    return hashlib.sha256(json.dumps(values, sort_keys=True).encode()).hexdigest()
+
+
+def arrays_hash(*arrays) -> str:
+    h = hashlib.sha256()
+    for array in arrays:
+        array = np.ascontiguousarray(array)
+        h.update(str((array.dtype.str, array.shape)).encode())
+        h.update(array.tobytes())
+    return h.hexdigest()
+
+
+def scan_trajectory_hash(trajectory) -> str:
+    """hash of the compact description (pattern, scan_shape, axes) of a ScanTrajectory"""
+    description = [trajectory.pattern, [int(n) for n in trajectory.scan_shape]]
+    h = hashlib.sha256(json.dumps(description).encode())
+    h.update(arrays_hash(*trajectory.axes).encode())
+    return h.hexdigest()
+
+
+class ResumeH5Group(h5py.Group):
+    """
+    measurement group of a resumed scan: creating a dataset that exists
+    returns the existing one with the data of the interrupted scan
+    """
+
+    def create_dataset(self, name, shape=None, dtype=None, data=None, **kwds):
+        if name not in self:
+            return super().create_dataset(name, shape, dtype, data, **kwds)
+        dset = self[name]
+        if shape is None and data is not None:
+            shape = np.shape(data)
+        if shape is not None and dset.shape != tuple(shape):
+            raise ValueError(f"can not resume {name}, shape {dset.shape} differs")
+        return dset
+
+    def __setitem__(self, name, obj):
+        if name in self and isinstance(self[name], h5py.Dataset):
+            self.create_dataset(name, data=obj)
+            return
+        super().__setitem__(name, obj)
+
+
+def begin_checkpoints(h5_group: h5py.Group, settings_hash: str, trajectory_hash: str):
+    h5_group.attrs["checkpoint_settings_hash"] = settings_hash
+    h5_group.attrs["checkpoint_trajectory_hash"] = trajectory_hash
+    write_checkpoint(h5_group, 0, False)
+
+
+def write_checkpoint(h5_group: h5py.Group, pixels_done: int, complete: bool):
+    h5_group.attrs["checkpoint_pixel"] = pixels_done
+    h5_group.attrs["checkpoint_complete"] = complete
+
+
+def read_checkpoint(h5_group: h5py.Group) -> dict:
+    """checkpoint attrs of *h5_group*, raises ValueError if there are none"""
+    try:
+        return {
+            name: h5_group.attrs[f"checkpoint_{name}"]
+            for name in ("settings_hash", "trajectory_hash", "pixel", "complete")
+        }
+    except KeyError:
+        raise ValueError(f"{h5_group.name} has no checkpoint")
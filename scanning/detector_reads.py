@@ -0,0 +1,84 @@
+"""
+Concurrent reads of several detectors per scan pixel.
+
+Detectors are registered as read callables. DetectorPool.read_all calls all
+of them at once on a thread pool and waits for every result, so a pixel
+takes about as long as the slowest detector instead of the sum of all.
+Read callables that talk to hardware release the GIL while they wait.
+"""
+
+import time
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass
+from typing import Any, Callable, Dict, Tuple
+
+import numpy as np
+
+
+@dataclass
+class Detector:
+    name: str
+    read: Callable[[], Any]
+    shape: Tuple = ()
+    dtype: Any = float
+
+
+def _timed_read(read):
+    t0 = time.perf_counter()
+    value = read()
+    return value, time.perf_counter() - t0
+
+
+class DetectorPool:
+
+    def __init__(self):
+        self.detectors: Dict[str, Detector] = {}
+        self.executor = None
+
+    def add(self, name: str, read: Callable[[], Any], shape=(), dtype=float):
+        """registers (or replaces) detector *name* read by *read*()"""
+        self.detectors[name] = Detector(name, read, tuple(shape), dtype)
+
+    def remove(self, name: str):
+        self.detectors.pop(name)
+
+    def __len__(self):
+        return len(self.detectors)
+
+    def __iter__(self):
+        return iter(self.detectors.values())
+
+    def start(self):
+        if self.executor is None and len(self.detectors) > 1:
+            self.executor = ThreadPoolExecutor(
+                max_workers=len(self.detectors), thread_name_prefix="detector_read"
+            )
+
+    def read_all(self):
+        """
+        reads all detectors concurrently, returns dicts {name: value} and
+        {name: latency in s}. Exceptions of a read are raised after all
+        reads finished.
+        """
+        if self.executor is None:
+            # a single detector (or not started) is read in the calling thread
+            results = {d.name: _timed_read(d.read) for d in self}
+        else:
+            futures = {d.name: self.executor.submit(_timed_read, d.read) for d in self}
+            results = {}
+            errors = []
+            for name, future in futures.items():
+                try:
+                    results[name] = future.result()
+                except Exception as err:
+                    errors.append(err)
+            if errors:
+                raise errors[0]
+        values = {name: value for name, (value, _) in results.items()}
+        latencies = {name: latency for name, (_, latency) in results.items()}
+        return values, latencies
+
+    def shutdown(self):
+        if self.executor is not None:
+            self.executor.shutdown(wait=True)
+            self.executor = None
@@ -0,0 +1,260 @@
+"""
+Incremental display of raster scan images.
+
+The acquisition loop marks the (k, j) rows of display_image_map it writes in
+a DirtyRows record. On each display tick IncrementalDisplay feeds only those
+rows to RunningLevels and re-renders only the bands of an IncrementalImageItem
+that contain them, so redraw cost scales with the newly acquired pixels
+rather than with the image size.
+"""
+
+import threading
+
+import numpy as np
+import pyqtgraph as pg
+from qtpy import QtCore
+
+try:
+    # fast path of ImageItem.render, pyqtgraph >= 0.13
+    from pyqtgraph.functions_qimage import try_make_qimage
+except ImportError:
+    try_make_qimage = None
+
+LEVEL_PERCENTILES = {"min_max": None, "percentile": (1.0, 99.0)}
+
+
+class DirtyRows:
+    """thread-safe set of (k, j) rows written since the last *take*"""
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.rows = set()
+        # becomes True with the first mark, i.e. once the acquisition loop
+        # is known to report its writes
+        self.active = False
+
+    def mark(self, k, j):
+        """marks row(s) *j* of slice(s) *k*, scalars or arrays"""
+        if np.ndim(k) or np.ndim(j):
+            k, j = np.broadcast_arrays(k, j)
+            rows = zip(k.ravel().tolist(), j.ravel().tolist())
+        else:
+            rows = ((int(k), int(j)),)
+        with self.lock:
+            self.rows.update(rows)
+            self.active = True
+
+    def take(self) -> set:
+        with self.lock:
+            rows, self.rows = self.rows, set()
+        return rows
+
+    def reset(self):
+        with self.lock:
+            self.rows = set()
+            self.active = False
+
+
+class RunningLevels:
+    """
+    Display levels of all values seen so far, updated batch by batch.
+
+    Without *percentiles* the levels are the exact running min/max. With
+    *percentiles* = (low, high) they are estimated from a uniform reservoir
+    sample of at most *sample_size* values.
+    """
+
+    def __init__(self, percentiles=None, sample_size=65536, seed=0):
+        self.percentiles = percentiles
+        self.sample_size = sample_size
+        self.rng = np.random.default_rng(seed)
+        self.count = 0
+        self.vmin = np.inf
+        self.vmax = -np.inf
+        self.sample = np.empty(sample_size if percentiles else 0, dtype=float)
+
+    def update(self, values):
+        values = np.asarray(values, dtype=float).ravel()
+        values = values[np.isfinite(values)]
+        if not len(values):
+            return
+        self.vmin = min(self.vmin, values.min())
+        self.vmax = max(self.vmax, values.max())
+        if self.percentiles:
+            self._update_sample(values)
+        self.count += len(values)
+
+    def _update_sample(self, values):
+        # vectorized reservoir sampling (algorithm R)
+        n_free = max(0, self.sample_size - self.count)
+        head, tail = values[:n_free], values[n_free:]
+        self.sample[self.count : self.count + len(head)] = head
+        if len(tail):
+            seen = self.count + len(head) + np.arange(1, len(tail) + 1)
+            slots = (self.rng.random(len(tail)) * seen).astype(np.int64)
+            keep = slots < self.sample_size
+            self.sample[slots[keep]] = tail[keep]
+
+    @property
+    def levels(self):
+        """(low, high) or None before any finite value was seen"""
+        if not self.count:
+            return None
+        if self.percentiles:
+            n = min(self.count, self.sample_size)
+            low, high = np.percentile(self.sample[:n], self.percentiles)
+        else:
+            low, high = self.vmin, self.vmax
+        if low == high:
+            high = low + 1
+        return float(low), float(high)
+
+
+class IncrementalImageItem(pg.ImageItem):
+    """
+    ImageItem rendered in bands of *band_size* rows of the v (second) axis of
+    the scan image. *update_rows* re-renders only the bands containing the
+    given rows; changes of image, levels or lookup table re-render all bands.
+    """
+
+    def __init__(self, image=None, band_size=32, **kargs):
+        self.band_size = band_size
+        self._band_qimages = {}
+        self._dirty_bands = set()
+        kargs.setdefault("autoDownsample", False)
+        super().__init__(image, **kargs)
+
+    def update_rows(self, rows):
+        self._dirty_bands.update(int(j) // self.band_size for j in rows)
+        self.update()
+
+    def _n_rows(self):
+        return self.image.shape[1 if self.axisOrder == "col-major" else 0]
+
+    def _band_data(self, band):
+        rows = slice(band * self.band_size, (band + 1) * self.band_size)
+        if self.axisOrder == "col-major":
+            return self.image[:, rows].swapaxes(0, 1)
+        return self.image[rows]
+
+    def render_band(self, band, lut):
+        data = self._band_data(band)
+        if try_make_qimage is not None and (lut is None or lut.dtype == np.uint8):
+            nans = None
+            if data.dtype.kind == "f":
+                # float maps are nan-filled until acquired
+                nans = np.isnan(data).nonzero()
+            qimage = try_make_qimage(
+                data, levels=self.levels, lut=lut, transparentLocations=nans
+            )
+            if qimage is not None:
+                return qimage
+        argb, alpha = pg.functions.makeARGB(data, lut=lut, levels=self.levels)
+        return pg.functions.makeQImage(argb, alpha=True, transpose=False)
+
+    def paint(self, painter, *args):
+        if self.image is None or self.image.size == 0 or self.image.ndim != 2:
+            return super().paint(painter, *args)
+        if self._renderRequired:
+            # set by setImage, setLevels, setLookupTable
+            self._band_qimages = {}
+            self._renderRequired = False
+        lut = self.lut(self.image, 256) if callable(self.lut) else self.lut
+
+        n_rows = self._n_rows()
+        n_bands = -(-n_rows // self.band_size)
+        for band in range(n_bands):
+            if band in self._dirty_bands or band not in self._band_qimages:
+                self._band_qimages[band] = self.render_band(band, lut)
+        self._dirty_bands = set()
+
+        if self.paintMode is not None:
+            painter.setCompositionMode(self.paintMode)
+        n_cols = self.image.size // n_rows
+        for band, qimage in self._band_qimages.items():
+            y0 = band * self.band_size
+            height = min(self.band_size, n_rows - y0)
+            painter.drawImage(QtCore.QRectF(0, y0, n_cols, height), qimage)
+        if self.border is not None:
+            painter.setPen(self.border)
+            painter.drawRect(self.boundingRect())
+
+
+class IncrementalDisplay:
+    """
+    Dirty-row bookkeeping and running levels of a raster scan display.
+
+    The acquisition thread calls *mark* for every pixel or line written to
+    display_image_map, the GUI thread calls *update_image* every display tick.
+    Levels are pushed to the image item (re-rendering all bands) only when
+    they move by more than *level_tolerance* of the displayed range.
+    """
+
+    def __init__(self, level_mode="min_max", level_tolerance=0.02):
+        self.dirty_rows = DirtyRows()
+        self.level_mode = level_mode
+        self.level_tolerance = level_tolerance
+        self.levels = RunningLevels(LEVEL_PERCENTILES[level_mode])
+        self.img_item = None
+        self.image_map = None
+        self.k = None
+        self.displayed_levels = None
+        self._refeed_levels = False
+
+    @property
+    def active(self) -> bool:
+        return self.dirty_rows.active
+
+    def mark(self, k, j):
+        self.dirty_rows.mark(k, j)
+
+    def reset(self):
+        """new scan: forget dirty rows, levels and the displayed slice"""
+        self.dirty_rows.reset()
+        self.levels = RunningLevels(LEVEL_PERCENTILES[self.level_mode])
+        self.k = None
+        self.displayed_levels = None
+
+    def set_level_mode(self, level_mode):
+        self.level_mode = level_mode
+        self.levels = RunningLevels(LEVEL_PERCENTILES[level_mode])
+        self._refeed_levels = True
+
+    def update_image(self, img_item: IncrementalImageItem, image_map, k):
+        """displays slice *k* of *image_map* (k, v, h) on *img_item*"""
+        rows = self.dirty_rows.take()
+        levels = self.levels
+        if self._refeed_levels:
+            self._refeed_levels = False
+            levels.update(image_map)
+        elif rows:
+            kk, jj = np.array(sorted(rows)).T
+            levels.update(image_map[kk, jj, :])
+
+        new_levels = levels.levels
+        if (
+            img_item is not self.img_item
+            or image_map is not self.image_map
+            or k != self.k
+        ):
+            # new item, slice or reallocated map: full render
+            self.img_item, self.image_map, self.k = img_item, image_map, k
+            self.displayed_levels = new_levels
+            img_item.setImage(
+                image_map[k, :, :].T, autoLevels=False, levels=new_levels or (0, 1)
+            )
+            return
+        if new_levels is not None and self._levels_moved(new_levels):
+            self.displayed_levels = new_levels
+            img_item.setLevels(new_levels)
+        img_item.update_rows(j for kk, j in rows if kk == k)
+
+    def _levels_moved(self, new_levels) -> bool:
+        if self.displayed_levels is None:
+            return True
+        low, high = self.displayed_levels
+        tolerance = self.level_tolerance * (high - low)
+        return (
+            abs(new_levels[0] - low) > tolerance
+            or abs(new_levels[1] - high) > tolerance
+        )
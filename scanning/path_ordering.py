@@ -0,0 +1,192 @@
+"""
+Travel-optimized ordering of arbitrary scan points.
+
+A greedy nearest-neighbour tour is improved with 2-opt moves, both evaluated
+with a MoveTimeModel of per-axis velocities and settle times. Nearest
+neighbours are looked up in a scipy KD-tree if scipy is installed: in
+velocity-scaled coordinates the travel time max(|dh|/vh, |dv|/vv) is the
+Chebyshev distance. 2-opt only tries moves to the nearest neighbours of
+each point, so a pass costs O(n) vectorized steps.
+"""
+
+from dataclasses import dataclass
+from typing import Sequence
+
+import numpy as np
+
+# above this number of nearest neighbours, fall back to a brute force search
+# over the remaining unvisited points
+MAX_KD_NEIGHBOURS = 256
+
+
+@dataclass
+class MoveTimeModel:
+    """
+    time of a point-to-point move: axes move simultaneously at constant
+    *velocity*, each axis that moves has to settle for *settle_time*
+    """
+
+    velocity: Sequence[float] = (1.0, 1.0)
+    settle_time: Sequence[float] = (0.0, 0.0)
+
+    def __post_init__(self):
+        self.velocity = np.asarray(self.velocity, dtype=float)
+        self.settle_time = np.asarray(self.settle_time, dtype=float)
+
+    def move_times(self, start, stop) -> np.ndarray:
+        """times of the moves from *start* to *stop* points (..., n_axes)"""
+        delta = np.abs(np.asarray(stop, dtype=float) - start)
+        travel = (delta / self.velocity).max(axis=-1)
+        settle = np.where(delta > 0, self.settle_time, 0.0).max(axis=-1)
+        return travel + settle
+
+    def path_time(self, points, order=None) -> float:
+        """total time to visit *points* in *order*"""
+        points = np.asarray(points, dtype=float)
+        if order is not None:
+            points = points[order]
+        return float(self.move_times(points[:-1], points[1:]).sum())
+
+
+@dataclass
+class PathOrder:
+    """result of *optimize_order*, points[order] is the visiting sequence"""
+
+    order: np.ndarray
+    baseline_time: float
+    travel_time: float
+
+    @property
+    def speedup(self) -> float:
+        if self.travel_time == 0:
+            return 1.0
+        return self.baseline_time / self.travel_time
+
+
+def _kd_tree(scaled_points):
+    try:
+        from scipy.spatial import cKDTree
+    except ImportError:
+        return None
+    return cKDTree(scaled_points)
+
+
+def nearest_neighbour_order(points, model: MoveTimeModel, start: int = 0):
+    """greedy tour starting at point *start*"""
+    points = np.asarray(points, dtype=float)
+    n = len(points)
+    order = np.empty(n, dtype=np.int64)
+    visited = np.zeros(n, dtype=bool)
+    scaled = points / model.velocity
+    tree = _kd_tree(scaled) if n > MAX_KD_NEIGHBOURS else None
+
+    current = start
+    for step in range(n):
+        order[step] = current
+        visited[current] = True
+        if step == n - 1:
+            break
+        nearest = None
+        k = 8
+        while tree is not None and nearest is None and k <= MAX_KD_NEIGHBOURS:
+            _, idx = tree.query(scaled[current], k=k, p=np.inf)
+            unvisited = idx[~visited[idx]]
+            if len(unvisited):
+                nearest = unvisited[0]
+            k *= 4
+        if nearest is None:
+            candidates = np.flatnonzero(~visited)
+            times = model.move_times(points[current], points[candidates])
+            nearest = candidates[np.argmin(times)]
+        current = nearest
+    return order
+
+
+def neighbour_lists(points, model: MoveTimeModel, k: int = 10) -> np.ndarray:
+    """(n, k) indices of the nearest other points in travel time"""
+    scaled = np.asarray(points, dtype=float) / model.velocity
+    n = len(scaled)
+    k = min(k, n - 1)
+    tree = _kd_tree(scaled)
+    if tree is not None:
+        _, idx = tree.query(scaled, k=k + 1, p=np.inf)
+        return idx[:, 1:]
+    neighbours = np.empty((n, k), dtype=np.int64)
+    for start in range(0, n, 1024):
+        rows = slice(start, min(start + 1024, n))
+        dist = np.abs(scaled[rows, None, :] - scaled[None, :, :]).max(axis=-1)
+        dist[np.arange(dist.shape[0]), np.arange(rows.start, rows.stop)] = np.inf
+        idx = np.argpartition(dist, k - 1, axis=1)[:, :k]
+        sorting = np.argsort(np.take_along_axis(dist, idx, axis=1), axis=1)
+        neighbours[rows] = np.take_along_axis(idx, sorting, axis=1)
+    return neighbours
+
+
+def two_opt(
+    points,
+    order,
+    model: MoveTimeModel,
+    max_passes: int = 10,
+    n_neighbours: int = 10,
+):
+    """
+    improves the open path *order* (first point fixed) by reversing
+    segments while that shortens it. Only moves that connect a point to one
+    of its *n_neighbours* nearest points are tried, all at once per point.
+    """
+    points = np.asarray(points, dtype=float)
+    order = np.array(order, dtype=np.int64)
+    n = len(order)
+    if n < 4:
+        return order
+    neighbours = neighbour_lists(points, model, n_neighbours)
+    path = points[order]
+    position = np.empty(n, dtype=np.int64)
+    position[order] = np.arange(n)
+    for _ in range(max_passes):
+        improved = False
+        for i in range(n - 2):
+            j = position[neighbours[order[i]]]
+            j = j[j > i + 1]
+            if not len(j):
+                continue
+            a, b, c = path[i], path[i + 1], path[j]
+            last = j == n - 1
+            d = path[np.minimum(j + 1, n - 1)]
+            old = model.move_times(a, b) + np.where(last, 0.0, model.move_times(c, d))
+            new = model.move_times(a, c) + np.where(last, 0.0, model.move_times(b, d))
+            gain = old - new
+            best = np.argmax(gain)
+            if gain[best] > 1e-12 * old[best]:
+                segment = slice(i + 1, j[best] + 1)
+                order[segment] = order[segment][::-1]
+                path[segment] = path[segment][::-1]
+                position[order[segment]] = np.arange(segment.start, segment.stop)
+                improved = True
+        if not improved:
+            break
+    return order
+
+
+def optimize_order(
+    points,
+    model: MoveTimeModel = None,
+    use_two_opt: bool = True,
+    max_passes: int = 10,
+) -> PathOrder:
+    """travel-optimized visiting order of *points* (n, n_axes), starting at points[0]"""
+    if model is None:
+        model = MoveTimeModel()
+    points = np.asarray(points, dtype=float)
+    baseline_time = model.path_time(points)
+    if len(points) < 3:
+        return PathOrder(np.arange(len(points)), baseline_time, baseline_time)
+
+    order = nearest_neighbour_order(points, model)
+    if use_two_opt:
+        order = two_opt(points, order, model, max_passes=max_passes)
+    travel_time = model.path_time(points, order)
+    if travel_time >= baseline_time:
+        # given order already better
+        return PathOrder(np.arange(len(points)), baseline_time, baseline_time)
+    return PathOrder(order, baseline_time, travel_time)
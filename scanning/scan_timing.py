@@ -0,0 +1,210 @@
+"""
+Scan duration model calibrated from recorded pixel timings.
+
+The time of a scan is modelled as
+
+    frame_cost * n_frames + line_cost * n_lines + pixel_cost * n_pixels
+
+where line_cost is the extra time of a pixel that starts a line (slow move,
+flyback) and frame_cost the extra time of a pixel that starts a frame (start
+move, pre-scan setup). The costs are fitted by least squares to the
+intervals between the pixel_time stamps of a previous scan.
+
+The fitted costs include the dwell time, so a model only applies to scans
+with the pixel_time and scan pattern it was calibrated with (the
+timing_conditions setting). Changing them starts a new calibration.
+"""
+
+import json
+from dataclasses import dataclass
+
+import numpy as np
+
+from .scan_trajectory import DEFAULT_CHUNK_SIZE
+
+TIMING_COSTS = ("pixel_cost", "line_cost", "frame_cost")
+
+
+@dataclass
+class ScanTimingModel:
+
+    pixel_cost: float = 0.0
+    line_cost: float = 0.0
+    frame_cost: float = 0.0
+
+    def predict(self, n_pixels, n_lines, n_frames) -> float:
+        """duration of *n_pixels* pixels of which *n_lines* start lines and
+        *n_frames* start frames"""
+        return (
+            self.pixel_cost * n_pixels
+            + self.line_cost * n_lines
+            + self.frame_cost * n_frames
+        )
+
+    def blend(self, other: "ScanTimingModel", weight: float) -> "ScanTimingModel":
+        """weighted average, *weight* of *other*"""
+        return ScanTimingModel(
+            *(
+                (1 - weight) * getattr(self, name) + weight * getattr(other, name)
+                for name in TIMING_COSTS
+            )
+        )
+
+
+def fit_timing_model(
+    pixel_times, line_starts, frame_starts=None, t_start=None
+) -> ScanTimingModel:
+    """
+    fits a ScanTimingModel to the time stamps *pixel_times* of the pixels
+    in acquisition order. *line_starts* and *frame_starts* flag the pixels
+    that start a line or frame (default: the first pixel). If given,
+    *t_start* (the start of the scan) makes the first pixel an interval too.
+    Returns None with fewer than two intervals.
+    """
+    pixel_times = np.asarray(pixel_times, dtype=float)
+    n = len(pixel_times)
+    line_starts = np.asarray(line_starts[:n], dtype=bool)
+    if frame_starts is None:
+        frame_starts = np.arange(n) == 0
+    frame_starts = np.asarray(frame_starts[:n], dtype=bool)
+    # interval i is the time taken to reach pixel i
+    if t_start is not None:
+        intervals = np.diff(pixel_times, prepend=t_start)
+        first = 0
+    else:
+        intervals = np.diff(pixel_times)
+        first = 1
+    if len(intervals) < 2:
+        return None
+    A = np.stack(
+        [
+            np.ones(n - first),
+            line_starts[first:] | frame_starts[first:],
+            frame_starts[first:],
+        ],
+        axis=1,
+    )
+    # drop cost columns without samples, they stay 0
+    used = A.any(axis=0)
+    costs = np.zeros(3)
+    costs[used] = np.linalg.lstsq(A[:, used], intervals, rcond=None)[0]
+    pixel_cost = max(costs[0], 0.0)
+    # line and frame costs are extra times on top of the pixel cost, a
+    # frame start also counts as a line start
+    return ScanTimingModel(pixel_cost, max(costs[1], 0.0), max(costs[2], 0.0))
+
+
+class ScanTimingMixin:
+    """
+    Measurement mixin that keeps a ScanTimingModel in settings (so it is
+    saved with every data file and in ini files) and uses it for the
+    expected scan duration and the progress ETA once calibrated.
+
+    The model is only used while the settings named in
+    *timing_condition_names* are as they were at the calibration.
+    """
+
+    timing_condition_names = ("pixel_time", "scan_type")
+
+    def setup_timing_settings(self):
+        S = self.settings
+        S.New("use_timing_model", dtype=bool, initial=True)
+        for name in TIMING_COSTS:
+            S.New(f"timing_{name}", dtype=float, initial=0.0, si=True, unit="s")
+        S.New("timing_runs", dtype=int, initial=0, vmin=0)
+        S.New("timing_weight", dtype=float, initial=0.5, vmin=0.01, vmax=1)
+        S.New("timing_conditions", dtype=str, initial="", ro=True)
+        names = ("use_timing_model", "timing_runs", "timing_conditions")
+        names += tuple(f"timing_{name}" for name in TIMING_COSTS)
+        names += tuple(name for name in self.timing_condition_names if name in S)
+        for name in names:
+            S.get_lq(name).add_listener(self.compute_times)
+
+    @property
+    def timing_model(self) -> ScanTimingModel:
+        return ScanTimingModel(
+            *(self.settings[f"timing_{name}"] for name in TIMING_COSTS)
+        )
+
+    def current_timing_conditions(self) -> str:
+        S = self.settings
+        return json.dumps(
+            {name: S[name] for name in self.timing_condition_names if name in S}
+        )
+
+    def calibrated_runs(self) -> int:
+        """timing_runs, 0 if the model was calibrated under other conditions"""
+        S = self.settings
+        if "timing_runs" not in S:
+            return 0
+        if S["timing_conditions"] != self.current_timing_conditions():
+            return 0
+        return S["timing_runs"]
+
+    def timing_model_active(self) -> bool:
+        return self.calibrated_runs() > 0 and self.settings["use_timing_model"]
+
+    def update_timing_model(
+        self, pixel_times, line_starts, frame_starts=None, t_start=None
+    ):
+        """fits the recorded *pixel_times* and blends the result into the settings"""
+        fitted = fit_timing_model(pixel_times, line_starts, frame_starts, t_start)
+        if fitted is None:
+            return None
+        S = self.settings
+        runs = self.calibrated_runs()
+        if runs > 0:
+            fitted = self.timing_model.blend(fitted, S["timing_weight"])
+        S["timing_conditions"] = self.current_timing_conditions()
+        for name in TIMING_COSTS:
+            S[f"timing_{name}"] = getattr(fitted, name)
+        S["timing_runs"] = runs + 1
+        return fitted
+
+    def acquired_pixel_times(self, pixel_time) -> np.ndarray:
+        """
+        time stamps of the *pixel_time* map in acquisition order, up to the
+        first pixel not acquired
+        """
+        pixel_time = np.asarray(pixel_time)
+        n_pixels = len(self.scan_index_array)
+        chunks = [np.zeros(0)]
+        for start in range(0, n_pixels, DEFAULT_CHUNK_SIZE):
+            index = self.scan_index_array[start : start + DEFAULT_CHUNK_SIZE]
+            times = pixel_time[tuple(np.asarray(index).T)]
+            acquired = times > 0
+            if not acquired.all():
+                chunks.append(times[: np.argmin(acquired)])
+                break
+            chunks.append(times)
+        return np.concatenate(chunks)
+
+    def calibrate_timing(self, pixel_time, t_start, frame_starts=None):
+        """
+        updates the timing model from the *pixel_time* map of a scan
+        started at *t_start*, using the pixels acquired before an interrupt
+        """
+        times = self.acquired_pixel_times(pixel_time)
+        n = len(times)
+        if frame_starts is not None:
+            frame_starts = frame_starts[:n]
+        return self.update_timing_model(
+            times, self.scan_slow_move[:n], frame_starts, t_start
+        )
+
+    def scan_counts(self):
+        """(n_pixels, n_lines, n_frames) of a frame"""
+        raise NotImplementedError
+
+    def progress_counts(self):
+        """(n_pixels, n_lines, n_frames) that progress runs over"""
+        return self.scan_counts()
+
+    def remaining_time(self, pct):
+        if not self.timing_model_active() or not pct:
+            return super().remaining_time(pct)
+        n_pixels, n_lines, n_frames = self.progress_counts()
+        left = 1 - pct / 100.0
+        return self.timing_model.predict(
+            n_pixels * left, n_lines * left, n_frames * left
+        )
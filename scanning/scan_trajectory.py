@@ -0,0 +1,240 @@
+"""
+Lazy raster scan trajectories.
+
+A ScanTrajectory computes indices, positions and move flags of any range of
+pixels from the pixel number, so nothing of size Npixels is allocated until
+asked for. The former per-pixel arrays (scan_h_positions, scan_index_array,
+...) are provided as read-only TrajectoryView objects.
+"""
+
+from typing import Iterator, Sequence, Tuple
+
+import numpy as np
+
+# number of sub-frames (first axis of scan_shape) of the 2D patterns
+PATTERN_SUBFRAMES = {
+    "raster": 1,
+    "serpentine": 1,
+    "trace_retrace": 2,
+    "ortho_raster": 2,
+    "ortho_trace_retrace": 4,
+}
+DEFAULT_CHUNK_SIZE = 65536
+
+
+def compact_int_dtype(max_value: int) -> np.dtype:
+    for dtype in (np.int16, np.int32):
+        if max_value <= np.iinfo(dtype).max:
+            return np.dtype(dtype)
+    return np.dtype(np.int64)
+
+
+class ScanTrajectory:
+    """
+    Scan path through *axes* = (h_array, v_array) or (h_array, v_array, z_array).
+
+    *pattern* is one of PATTERN_SUBFRAMES. 3D trajectories support raster and
+    serpentine, the z index takes the place of the sub-frame index k.
+    """
+
+    def __init__(
+        self,
+        pattern: str,
+        axes: Sequence[np.ndarray],
+        chunk_size: int = DEFAULT_CHUNK_SIZE,
+    ):
+        if pattern not in PATTERN_SUBFRAMES:
+            raise ValueError(f"unknown scan pattern {pattern}")
+        if len(axes) == 3 and PATTERN_SUBFRAMES[pattern] != 1:
+            raise ValueError(f"{pattern} is not available for 3D scans")
+        self.pattern = pattern
+        self.axes = tuple(np.asarray(a) for a in axes)
+        self.chunk_size = chunk_size
+
+        self.Nh, self.Nv = len(self.axes[0]), len(self.axes[1])
+        if len(self.axes) == 3:
+            Nk = len(self.axes[2])
+        else:
+            Nk = PATTERN_SUBFRAMES[pattern]
+        self.scan_shape = (Nk, self.Nv, self.Nh)
+        self.Npixels = Nk * self.Nv * self.Nh
+        self.index_dtype = compact_int_dtype(max(self.scan_shape))
+
+    def __len__(self) -> int:
+        return self.Npixels
+
+    def indices(self, start: int = 0, stop: int = None) -> np.ndarray:
+        """(stop - start, 3) array of (k, j, i) indices"""
+        p = self._pixels(start, stop)
+        Nh, Nv = self.Nh, self.Nv
+        N = Nh * Nv
+        pattern = self.pattern
+
+        if pattern in ("raster", "serpentine"):
+            k, r = np.divmod(p, N)
+            j, i = np.divmod(r, Nh)
+            if pattern == "serpentine":
+                i = np.where(j % 2 == 1, Nh - 1 - i, i)
+        elif pattern == "trace_retrace":
+            j, k, i = self._trace_retrace(p, Nh)
+        elif pattern == "ortho_raster":
+            # along h, then along v
+            second = p >= N
+            j1, i1 = np.divmod(p, Nh)
+            i2, j2 = np.divmod(p - N, Nv)
+            k = second.astype(p.dtype)
+            j = np.where(second, j2, j1)
+            i = np.where(second, i2, i1)
+        else:  # ortho_trace_retrace
+            second = p >= 2 * N
+            j1, k1, i1 = self._trace_retrace(p, Nh)
+            i2, k2, j2 = self._trace_retrace(p - 2 * N, Nv)
+            k = np.where(second, k2 + 2, k1)
+            j = np.where(second, j2, j1)
+            i = np.where(second, i2, i1)
+
+        index_array = np.empty((len(p), 3), dtype=self.index_dtype)
+        index_array[:, 0] = k
+        index_array[:, 1] = j
+        index_array[:, 2] = i
+        return index_array
+
+    @staticmethod
+    def _trace_retrace(p, n):
+        # (line, trace=0/retrace=1, position along line)
+        line, r = np.divmod(p, 2 * n)
+        retrace, q = np.divmod(r, n)
+        return line, retrace, np.where(retrace == 1, n - 1 - q, q)
+
+    def slow_move(self, start: int = 0, stop: int = None) -> np.ndarray:
+        """True at the first pixel of each line"""
+        p = self._pixels(start, stop)
+        Nh, Nv = self.Nh, self.Nv
+        N = Nh * Nv
+        if self.pattern in ("raster", "serpentine"):
+            return p % Nh == 0
+        if self.pattern == "trace_retrace":
+            return p % (2 * Nh) == 0
+        if self.pattern == "ortho_raster":
+            return np.where(p < N, p % Nh == 0, (p - N) % Nv == 0)
+        return np.where(p < 2 * N, p % (2 * Nh) == 0, (p - 2 * N) % (2 * Nv) == 0)
+
+    def line_starts(self) -> np.ndarray:
+        """pixel numbers at which a slow move starts a new line"""
+        starts = [np.zeros(0, dtype=np.int64)]
+        for start, stop in self.iter_chunks():
+            starts.append(start + np.flatnonzero(self.slow_move(start, stop)))
+        return np.concatenate(starts)
+
+    def start_move(self, start: int = 0, stop: int = None) -> np.ndarray:
+        """True at the first pixel of each frame"""
+        return self._pixels(start, stop) % (self.Nh * self.Nv) == 0
+
+    def positions(self, axis: int, start: int = 0, stop: int = None) -> np.ndarray:
+        """positions along *axis* (0: h, 1: v, 2: z)"""
+        column = (2, 1, 0)[axis]
+        return self.axes[axis][self.indices(start, stop)[:, column]]
+
+    def _pixels(self, start, stop) -> np.ndarray:
+        if stop is None:
+            stop = self.Npixels
+        return np.arange(start, min(stop, self.Npixels), dtype=np.int64)
+
+    def iter_chunks(self) -> Iterator[Tuple[int, int]]:
+        for start in range(0, self.Npixels, self.chunk_size):
+            yield start, min(start + self.chunk_size, self.Npixels)
+
+    def views(self) -> dict:
+        """TrajectoryViews named like the former scan arrays"""
+        views = dict(
+            scan_h_positions=TrajectoryView(
+                lambda a, b: self.positions(0, a, b), self, self.axes[0].dtype
+            ),
+            scan_v_positions=TrajectoryView(
+                lambda a, b: self.positions(1, a, b), self, self.axes[1].dtype
+            ),
+            scan_slow_move=TrajectoryView(self.slow_move, self, bool),
+            scan_start_move=TrajectoryView(self.start_move, self, bool),
+            scan_index_array=TrajectoryView(self.indices, self, int, (3,)),
+        )
+        if len(self.axes) == 3:
+            views["scan_z_positions"] = TrajectoryView(
+                lambda a, b: self.positions(2, a, b), self, self.axes[2].dtype
+            )
+        return views
+
+    def write_h5(self, h5group, name: str = "scan_trajectory"):
+        """stores the compact description, see *from_h5*"""
+        group = h5group.create_group(name)
+        group.attrs["pattern"] = self.pattern
+        group.attrs["scan_shape"] = self.scan_shape
+        group.attrs["Npixels"] = self.Npixels
+        for axis_name, axis in zip(("h_array", "v_array", "z_array"), self.axes):
+            group[axis_name] = axis
+        return group
+
+    @classmethod
+    def from_h5(cls, group) -> "ScanTrajectory":
+        axes = [
+            group[axis_name][:]
+            for axis_name in ("h_array", "v_array", "z_array")
+            if axis_name in group
+        ]
+        return cls(group.attrs["pattern"], axes)
+
+
+class TrajectoryView:
+    """
+    Read-only array-like over a ScanTrajectory. Integer access is served from
+    a cached chunk so iterating pixel by pixel stays cheap.
+    """
+
+    def __init__(self, func, trajectory: ScanTrajectory, dtype, row_shape=()):
+        self.func = func
+        self.trajectory = trajectory
+        self.dtype = np.dtype(dtype)
+        self.shape = (trajectory.Npixels,) + tuple(row_shape)
+        self.ndim = len(self.shape)
+        self._chunk_start = -1
+        self._chunk = None
+
+    def __len__(self) -> int:
+        return self.shape[0]
+
+    def _compute(self, start, stop) -> np.ndarray:
+        return self.func(start, stop).astype(self.dtype, copy=False)
+
+    def __getitem__(self, key):
+        if isinstance(key, tuple):
+            first, rest = key[0], key[1:]
+            if isinstance(first, (int, np.integer)):
+                return self[first][rest]
+            return self[first][(slice(None),) + rest]
+        if isinstance(key, (int, np.integer)):
+            n = len(self)
+            if key < 0:
+                key += n
+            if not 0 <= key < n:
+                raise IndexError(f"index {key} out of range for {n} pixels")
+            chunk_size = self.trajectory.chunk_size
+            start = key - key % chunk_size
+            if start != self._chunk_start:
+                self._chunk = self._compute(start, start + chunk_size)
+                self._chunk_start = start
+            return self._chunk[key - start]
+        if isinstance(key, slice):
+            start, stop, step = key.indices(len(self))
+            if step > 0:
+                return self._compute(start, max(start, stop))[::step]
+        return np.asarray(self)[key]
+
+    def __iter__(self):
+        for start, stop in self.trajectory.iter_chunks():
+            yield from self._compute(start, stop)
+
+    def __array__(self, dtype=None, copy=None):
+        array = self._compute(0, len(self))
+        return array if dtype is None else array.astype(dtype)
+
+    def __repr__(self) -> str:
+        return f"TrajectoryView(shape={self.shape}, dtype={self.dtype})"
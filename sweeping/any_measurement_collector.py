@@ -21,6 +21,13 @@ class AnyMeasurementCollector(Collector):
     ):
         self.host_measurement = host_measurement
         self.measure_lq = self.host_measurement.settings.New(name, str, choices=[])
+        self.in_thread_lq = self.host_measurement.settings.New(
+            f"{name}_in_thread",
+            bool,
+            initial=False,
+            description="run the measurement on the sweep thread, "
+            "skips its pre_run and post_run",
+        )
 
         super().__init__(
             host_measurement.app,
@@ -44,9 +51,18 @@ class AnyMeasurementCollector(Collector):
         m_name = self.measure_lq.value
         measurement = self.app.measurements[m_name]
 
-        host_measurement.start_nested_measure_and_wait(
-            measurement, False, polling_func, polling_time
-        )
+        if host_measurement.settings["container_mode"]:
+            scan_data = host_measurement.scan_data
+            measurement.h5_container = scan_data.point_h5_group(index)
+        try:
+            if self.in_thread_lq.val:
+                host_measurement.run_nested_in_thread(measurement, False)
+            else:
+                host_measurement.start_nested_measure_and_wait(
+                    measurement, False, polling_func, polling_time
+                )
+        finally:
+            measurement.h5_container = None
         if hasattr(measurement, "data") and type(measurement.data) is dict:
             self.data = measurement.data
         else:
@@ -4,7 +4,8 @@ Created on Feb 18, 2025
 @author: Benedikt Ursprung
 """
 
-from typing import Callable, Tuple
+import time
+from typing import Callable, Dict, Tuple
 
 from ScopeFoundry.base_app.base_microscope_app import BaseMicroscopeApp
 from ScopeFoundry.logged_quantity.logged_quantity import LoggedQuantity
@@ -12,7 +13,20 @@ from ScopeFoundry.measurement import Measurement
 
 
 class Collector:
-    """triggers measuements and collects data"""
+    """
+    triggers measuements and collects data
+
+    Synchronous collectors override run. Collectors that override trigger,
+    is_ready and fetch are asynchronous: sweeps trigger them, wait until
+    they are ready and fetch the data of the last repetition while the
+    actuators already move to the next point.
+
+    With run_in_thread the default run calls the run method of the target
+    measurement directly on the sweep thread (see
+    Measurement.run_nested_in_thread) instead of starting it in its own
+    thread. This saves the thread start and GUI round trip at every point,
+    but skips the pre_run and post_run of the target measurement and polling_func.
+    """
 
     name: str
     repeated_dset_names: Tuple[str] = ()  # datasets collected at every scan poin
@@ -23,6 +37,8 @@ class Collector:
     color: Tuple[int] = (255, 0, 0)  # currently not used
     to_sec_multiplier: float = 1.0
     description: str = ""  # description of the collector displayed in the GUI
+    keep_raw: bool = True  # store every repetition, not only their statistics
+    run_in_thread: bool = False  # run target_measure on the sweep thread
 
     def __init__(
         self,
@@ -33,6 +49,8 @@ class Collector:
         color: Tuple[int] = None,
         to_sec_multiplier: float = None,
         description: str = None,
+        keep_raw: bool = None,
+        run_in_thread: bool = None,
     ):
         self.app = app
         self.to_sec_multiplier = to_sec_multiplier
@@ -49,6 +67,10 @@ class Collector:
             self.to_sec_multiplier = to_sec_multiplier
         if description is not None:
             self.description = description
+        if keep_raw is not None:
+            self.keep_raw = keep_raw
+        if run_in_thread is not None:
+            self.run_in_thread = run_in_thread
 
         if self.target_measure_name in app.measurements:
             self.target_measure = app.measurements[self.target_measure_name]
@@ -86,14 +108,49 @@ class Collector:
         - the values of the data dict should not through an error if past
         - not all arguments need to be used.
         """
-        host_measurement.start_nested_measure_and_wait(
-            self.target_measure,
-            nested_interrupt=False,
-            polling_func=polling_func,
-            polling_time=polling_time,
-        )
+        if self.run_in_thread:
+            host_measurement.run_nested_in_thread(
+                self.target_measure, nested_interrupt=False
+            )
+        else:
+            host_measurement.start_nested_measure_and_wait(
+                self.target_measure,
+                nested_interrupt=False,
+                polling_func=polling_func,
+                polling_time=polling_time,
+            )
         self.data = self.target_measure.data
 
+    def trigger(self, index: int, host_measurement: Measurement) -> None:
+        """override me (async)! start an acquisition and return immediately"""
+        raise NotImplementedError
+
+    def is_ready(self) -> bool:
+        """override me (async)! True once the triggered acquisition is complete"""
+        raise NotImplementedError
+
+    def fetch(self) -> Dict:
+        """override me (async)! read out the acquisition, populate and return self.data"""
+        raise NotImplementedError
+
+    @property
+    def is_async(self) -> bool:
+        return type(self).trigger is not Collector.trigger
+
+    def acquire(
+        self, index: int, host_measurement: Measurement, polling_time: float = 0.001
+    ) -> bool:
+        """
+        triggers and waits until ready. Returns False if the host was
+        interrupted before, then there is nothing to fetch
+        """
+        self.trigger(index, host_measurement)
+        while not self.is_ready():
+            if host_measurement.interrupt_measurement_called:
+                return False
+            time.sleep(polling_time)
+        return True
+
     def release(self, host_measurement: Measurement, *args, **kwargs) -> None:
         """override me! clean up after acquisition or undo prepare"""
         pass
@@ -80,9 +80,12 @@ class Map2D(Sweep2D):
         if not self.display_ready or not self.settings["plot_option"]:
             return
 
-        dset = np.array(self.scan_data.data[self.settings["plot_option"]])
-        img = dset.reshape(*(*self.scan_data.base_shape, -1)).mean(axis=-1)
-        self.img_item.setImage(img, rect=self.calc_rect())
+        name = self.settings["plot_option"]
+        if not self.has_new_display_data(name):
+            return
+        with self.timing_phase("display"):
+            img = self.scan_data.point_means(name)
+            self.img_item.setImage(img, rect=self.calc_rect())
 
     def get_ranges(self):
         r1 = self.settings.ranges["range_1"]
@@ -3,42 +3,308 @@ from typing import Tuple, Dict
 import numpy as np
 
 from ScopeFoundry import Measurement
+from ScopeFoundry.h5_io import AsyncH5Writer, GrowingH5Dataset
+from ScopeFoundry.running_stats import RunningStats
 from .collector import Collector
+from .settings_reader import SettingsReader
+
+# "memory": repeated datasets are kept in memory and written to the h5 file
+# "h5": the h5 file is the only store, written asynchronously, the display
+#       reads from a bounded window of recent points
+STORAGE_MODES = ("memory", "h5")
+
+# points per block of the positions, read_positions, indices, ... datasets,
+# flush_h5 writes the points buffered so far
+POINT_BUFFER_SIZE = 64
 
 
 def to_dstname(name: str) -> str:
     return name.replace("/", "__")
 
 
+class DecimatedTrace:
+    """
+    min/max decimated plot buffer of a growing series: at most *max_bins*
+    bins of bin_size samples. When full, neighbouring bins are merged and
+    bin_size doubles, so adding is O(1) and the plot size is bounded.
+    """
+
+    def __init__(self, max_bins=4096):
+        self.max_bins = max_bins
+        self.bin_size = 1
+        self.mins = np.zeros(max_bins)
+        self.maxs = np.zeros(max_bins)
+        self.n = 0
+
+    def add(self, value):
+        i = self.n // self.bin_size
+        if i == self.max_bins:
+            half = self.max_bins // 2
+            self.mins[:half] = np.minimum(self.mins[0::2], self.mins[1::2])
+            self.maxs[:half] = np.maximum(self.maxs[0::2], self.maxs[1::2])
+            self.bin_size *= 2
+            i = half
+        if self.n % self.bin_size == 0:
+            self.mins[i] = self.maxs[i] = value
+        else:
+            self.mins[i] = min(self.mins[i], value)
+            self.maxs[i] = max(self.maxs[i], value)
+        self.n += 1
+
+    def xy(self) -> Tuple[np.ndarray, np.ndarray]:
+        """sample numbers and values, the min and max of every bin"""
+        if self.bin_size == 1:
+            return np.arange(self.n), self.mins[: self.n].copy()
+        n_bins = -(-self.n // self.bin_size)
+        x = np.repeat(np.arange(n_bins) * self.bin_size, 2)
+        y = np.stack([self.mins[:n_bins], self.maxs[:n_bins]], axis=1).ravel()
+        return x, y
+
+
+class PointPreview:
+    """
+    bounded display data of a repeated dataset, updated as repetitions
+    arrive: the repetition averages of the most recent points, the mean of
+    every point and a decimated trace of the point means in acquisition
+    order. *version* counts the updates.
+    """
+
+    def __init__(self, base_shape, point_shape, window_values=100_000):
+        self.point_shape = tuple(point_shape)
+        point_size = max(int(np.prod(self.point_shape)), 1)
+        self.n_window = max(1, window_values // point_size)
+        self.window = np.zeros((self.n_window,) + self.point_shape)
+        self.n_points = 0
+        self.point_sum = np.zeros(base_shape)
+        self.point_count = np.zeros(base_shape, dtype=int)
+        self.current = None
+        self.rep_sum = np.zeros(self.point_shape)
+        self.rep_count = 0
+        self.trace = DecimatedTrace()
+        self.version = 0
+
+    def add(self, base_indices, value):
+        if base_indices != self.current:
+            if self.current is not None:
+                self.trace.add(np.mean(self.rep_sum) / self.rep_count)
+            self.current = base_indices
+            self.rep_sum[...] = 0
+            self.rep_count = 0
+            self.n_points += 1
+        self.rep_sum += value
+        self.rep_count += 1
+        self.window[(self.n_points - 1) % self.n_window] = self.rep_sum / self.rep_count
+        self.point_sum[base_indices] += np.mean(value)
+        self.point_count[base_indices] += 1
+        self.version += 1
+
+    def recent_values(self, n_points):
+        n = min(n_points, self.n_points, self.n_window)
+        slots = np.arange(self.n_points - n, self.n_points) % self.n_window
+        return self.window[slots].ravel()
+
+    def point_means(self):
+        count = np.maximum(self.point_count, 1)
+        return self.point_sum / count
+
+    def trace_xy(self):
+        """decimated trace of the point means, including the current point"""
+        x, y = self.trace.xy()
+        if self.rep_count:
+            x = np.append(x, self.trace.n)
+            y = np.append(y, np.mean(self.rep_sum) / self.rep_count)
+        return x, y
+
+
+# statistics over the repetitions of every point
+REPEAT_STATS = ("mean", "std", "min", "max", "count")
+
+
+class RepeatStats:
+    """
+    streaming statistics of a repeated dataset, written to the h5 datasets
+    *prefix* (mean), *prefix*_std, _min, _max and _count once the last of
+    the *reps* repetitions of a point came in. The repetitions of a point
+    are collected one after another, so only the statistics of the current
+    point are kept in memory.
+    """
+
+    def __init__(self, h5_group, prefix, base_shape, point_shape, reps):
+        self.stats = RunningStats(point_shape)
+        self.reps = reps
+        self.current = None
+        # repetitions of the current point, not written if pending
+        self.n = 0
+        self.pending = False
+        self.dsets = {}
+        for stat in REPEAT_STATS:
+            name = prefix if stat == "mean" else f"{prefix}_{stat}"
+            if stat == "count":
+                dset = h5_group.create_dataset(name, base_shape, dtype=int)
+            else:
+                dset = h5_group.create_dataset(
+                    name, base_shape + point_shape, dtype=float
+                )
+            self.dsets[stat] = dset
+
+    def add(self, base_indices, value, write):
+        """adds a repetition at *base_indices*, stores with write(dset, index, value)"""
+        if base_indices != self.current:
+            self.write(write)
+            self.current = base_indices
+            self.stats.reset()
+            self.n = 0
+        self.stats.add_all(value)
+        self.n += 1
+        self.pending = True
+        if self.n >= self.reps:
+            self.write(write)
+
+    def write(self, write):
+        """stores the statistics of the current point, e.g. of an interrupted point"""
+        if not self.pending:
+            return
+        self.pending = False
+        s = self.stats
+        values = {
+            "mean": s.mean,
+            "std": s.std,
+            "min": s.min,
+            "max": s.max,
+            "count": s.count.max(initial=0),
+        }
+        for stat, dset in self.dsets.items():
+            write(dset, self.current, values[stat])
+
+
+class SettingsLineBuffer:
+    """
+    settings records of the points of the current line, the pass of the
+    innermost loop along *line_axis* of the base_shape. Written to *dset*
+    at the end of the line, or in blocks of POINT_BUFFER_SIZE points.
+    """
+
+    def __init__(self, dset, line_axis, reps, dtype):
+        self.dset = dset
+        self.line_axis = line_axis
+        self.records = np.zeros((POINT_BUFFER_SIZE, reps), dtype=dtype)
+        self.line = None
+        # positions along line_axis of the buffered points, consecutive
+        self.positions = []
+
+    def add(self, base_indices, rep, record, write):
+        """buffers *record* of repetition *rep*, writes the block before if it ends"""
+        ax = self.line_axis
+        line = base_indices[:ax] + base_indices[ax + 1 :]
+        position = base_indices[ax]
+        if not self.positions or position != self.positions[-1]:
+            if line != self.line or not self.continues(position):
+                self.write(write)
+            self.line = line
+            self.positions.append(position)
+        self.records[len(self.positions) - 1, rep] = record
+
+    def continues(self, position) -> bool:
+        """True if the point at *position* fits in the block of the buffered points"""
+        n = len(self.positions)
+        if n == 0:
+            return True
+        if n == POINT_BUFFER_SIZE:
+            return False
+        step = position - self.positions[-1]
+        if n == 1:
+            return abs(step) == 1
+        return step == self.positions[-1] - self.positions[-2]
+
+    def write(self, write):
+        """writes the buffered points with write(dset, index, value)"""
+        n = len(self.positions)
+        if not n:
+            return
+        records, self.records = self.records[:n], np.zeros_like(self.records)
+        first, last = self.positions[0], self.positions[-1]
+        if last < first:
+            first, last = last, first
+            records = records[::-1]
+        ax = self.line_axis
+        index = self.line[:ax] + (slice(first, last + 1),) + self.line[ax:]
+        write(self.dset, index, records)
+        self.positions = []
+
+
 class NDScanData:
 
     def __init__(
         self,
         base_shape: Tuple[int],
         measurement: Measurement,
+        storage: str = "memory",
+        line_axis: int = -1,
     ):
+        """
+        *line_axis* is the axis of *base_shape* along which the innermost
+        loop of the sweep runs, see flush_h5
+        """
+        assert storage in STORAGE_MODES
         self.data: Dict[str, np.ndarray] = {}
         self.base_shape = base_shape
+        self.storage = storage
+        self.line_axis = line_axis % len(base_shape)
+        self.previews: Dict[str, PointPreview] = {}
+        self.repeat_stats: Dict[str, RepeatStats] = {}
+        self.settings_readers: Dict[str, SettingsReader] = {}
+        self.settings_lines: Dict[str, SettingsLineBuffer] = {}
+        self.h5_writer = AsyncH5Writer() if storage == "h5" else None
 
         self.measurement = measurement
         self.app = measurement.app
 
-        self.positions = []
-        self.read_positions = []
-        self.indices = []
+        # extendable datasets of the values of every point, created with the
+        # first point and written in blocks, see append_point
+        self.point_dsets: Dict[str, GrowingH5Dataset] = {}
+        self.n_points = 0
+        self.overlap_total = 0.0
 
         self.h5_meas_group = measurement.open_new_h5_file()
         self.h5_file = measurement.h5_file
         self.metadata = measurement.dataset_metadata
 
+    def append_point(self, name: str, values, dtype):
+        """
+        appends the *values* of a point to the dataset *name*. Blocks of
+        POINT_BUFFER_SIZE points go through the same writer as the data,
+        flush_h5 writes the rest and trims the dataset to the points written
+        """
+        if name not in self.point_dsets:
+            self.point_dsets[name] = GrowingH5Dataset(
+                self.h5_meas_group,
+                name,
+                (0,) + np.shape(values),
+                dtype=dtype,
+                initial_capacity=POINT_BUFFER_SIZE,
+                buffer_size=POINT_BUFFER_SIZE,
+                write=self.h5_writer.write if self.h5_writer else None,
+            )
+        self.point_dsets[name].append(values)
+
     def add_position(self, positions: Tuple[float]):
-        self.positions.append(positions)
+        self.append_point("positions", positions, float)
 
     def add_read_positions(self, positions: Tuple[float]):
-        self.read_positions.append(positions)
+        self.append_point("read_positions", positions, float)
 
     def add_indices(self, indices: Tuple[int]):
-        self.indices.append(indices)
+        self.append_point("indices", indices, int)
+        self.n_points += 1
+
+    def add_settle_times(self, settle_times: Tuple[float], settled: Tuple[bool]):
+        self.append_point("settle_times", settle_times, float)
+        self.append_point("settled", settled, bool)
+
+    def add_overlap(self, overlap: float):
+        """time the readout of a point overlapped with the move to the next"""
+        self.append_point("pipeline_overlap", overlap, float)
+        self.overlap_total += overlap
 
     def init_dsets(self, collector: Collector):
         collector.repeats = []
@@ -52,40 +318,153 @@ class NDScanData:
                     )
                     print(err)
             if name in collector.repeated_dset_names:
+                stats_name = to_dstname(f"{collector.name}_{name}")
+                self.repeat_stats[stats_name] = RepeatStats(
+                    self.h5_meas_group,
+                    stats_name,
+                    self.base_shape,
+                    d.shape,
+                    collector.reps,
+                )
+                if not collector.keep_raw:
+                    # display the repetition means
+                    collector.repeats.append((name, stats_name))
+                    self.data[stats_name] = self.repeat_stats[stats_name].dsets["mean"]
+                    self.previews[stats_name] = PointPreview(self.base_shape, d.shape)
+                    print("init", stats_name, d.shape, "statistics only")
+                    continue
                 global_name = to_dstname(f"{collector.name}_{name}_raw")
                 shape = self.base_shape + (collector.reps,) + d.shape
-                self.data[global_name] = np.zeros(shape, dtype=d.dtype)
                 collector.repeats.append((name, global_name))
-                self.h5_meas_group.create_dataset(global_name, shape, dtype=d.dtype)
+                dset = self.h5_meas_group.create_dataset(
+                    global_name, shape, dtype=d.dtype
+                )
+                self.previews[global_name] = PointPreview(self.base_shape, d.shape)
+                if self.storage == "h5":
+                    self.data[global_name] = dset
+                else:
+                    self.data[global_name] = np.zeros(shape, dtype=d.dtype)
                 print("init", global_name, shape, d.dtype)
             else:
                 global_name = to_dstname(f"{collector.name}_{name}")
                 self.data[global_name] = d
                 self.h5_meas_group.create_dataset(global_name, data=d)
 
-        for lq_path in collector.settings_to_collect:
-            self.h5_meas_group.create_dataset(to_dstname(lq_path), shape)
+        if collector.settings_to_collect:
+            # one record of all settings per repetition
+            reader = SettingsReader(self.app, collector.settings_to_collect)
+            reader.start()
+            name = to_dstname(f"{collector.name}_settings")
+            shape = self.base_shape + (collector.reps,)
+            self.settings_readers[collector.name] = reader
+            dset = self.h5_meas_group.create_dataset(name, shape, dtype=reader.dtype)
+            self.settings_lines[collector.name] = SettingsLineBuffer(
+                dset, self.line_axis, collector.reps, reader.dtype
+            )
 
     def incorporate(self, collector: Collector, *indices):
         """collects data from collectors and writes it to the h5 file"""
 
+        write = self.h5_writer.write if self.h5_writer else self.write_h5
+        base_indices = indices[:-1]
         for name, global_name in collector.repeats:
-            self.data[global_name][indices] = collector.data[name]
-            self.h5_meas_group[global_name][indices] = collector.data[name]
-        for lq_path in collector.settings_to_collect:
-            val = self.app.get_lq(lq_path).read_from_hardware()
-            self.h5_meas_group[to_dstname(lq_path)][indices] = val
+            value = collector.data[name]
+            stats_name = to_dstname(f"{collector.name}_{name}")
+            self.repeat_stats[stats_name].add(base_indices, value, write)
+            if global_name in self.previews:
+                self.previews[global_name].add(base_indices, value)
+            if global_name == stats_name:
+                # keep_raw is off
+                continue
+            if self.storage == "h5":
+                write(self.data[global_name], indices, value)
+                continue
+            self.data[global_name][indices] = value
+            self.h5_meas_group[global_name][indices] = value
+        if collector.name in self.settings_readers:
+            record = self.settings_readers[collector.name].read()
+            self.settings_lines[collector.name].add(
+                base_indices, indices[-1], record, write
+            )
+
+    def write_settings_lines(self):
+        """writes the settings collected on the current line"""
+        write = self.h5_writer.write if self.h5_writer else self.write_h5
+        for line in self.settings_lines.values():
+            line.write(write)
+
+    def write_repeat_stats(self):
+        """writes the statistics of points with missing repetitions"""
+        write = self.h5_writer.write if self.h5_writer else self.write_h5
+        for stats in self.repeat_stats.values():
+            stats.write(write)
 
     def average_repeats(self, collector: Collector):
-        for name, d in collector.data.items():
-            if name in collector.repeated_dset_names:
-                avg_name = to_dstname(f"{collector.name}_{name}")
-                global_name = to_dstname(f"{collector.name}_{name}_raw")
-                d = self.data[global_name].mean(axis=len(self.base_shape))
-                self.h5_meas_group.create_dataset(avg_name, data=d)
-                print("saved", avg_name, d.shape, d.dtype)
+        """
+        repetition statistics are written as the points are completed, this
+        writes those of an interrupted point and makes sure they are in the
+        file
+        """
+        write = self.h5_writer.write if self.h5_writer else self.write_h5
+        for name, _ in collector.repeats:
+            self.repeat_stats[to_dstname(f"{collector.name}_{name}")].write(write)
+        if collector.name in self.settings_lines:
+            self.settings_lines[collector.name].write(write)
+        if self.h5_writer is not None:
+            self.h5_writer.flush()
+
+    @staticmethod
+    def write_h5(dset, index, value):
+        dset[index] = value
+
+    def point_shape(self, name: str) -> Tuple[int]:
+        """shape of the data of *name* collected at each point"""
+        if name in self.previews:
+            return self.previews[name].point_shape
+        return self.data[name].shape[len(self.base_shape) + 1 :]
+
+    def point_means(self, name: str) -> np.ndarray:
+        """base_shape array of *name* averaged over repetitions and data axes"""
+        if name in self.previews:
+            return self.previews[name].point_means()
+        d = np.asarray(self.data[name])
+        return d.reshape(*self.base_shape, -1).mean(axis=-1)
+
+    def version(self, name: str) -> int:
+        """changes whenever display data of *name* changes"""
+        if name in self.previews:
+            return self.previews[name].version
+        return 0
+
+    def point_trace(self, name: str) -> Tuple[np.ndarray, np.ndarray]:
+        """point numbers and (decimated) point means of *name* in acquisition order"""
+        if name in self.previews:
+            return self.previews[name].trace_xy()
+        y = np.ravel(self.data[name])
+        return np.arange(len(y)), y
+
+    def recent_values(self, name: str, n_points: int) -> np.ndarray:
+        """repetition averaged data of *name* of the last *n_points* points, raveled"""
+        if name in self.previews:
+            return self.previews[name].recent_values(n_points)
+        d = np.asarray(self.data[name]).mean(axis=len(self.base_shape))
+        dlen = int(np.prod(d.shape[len(self.base_shape) :]))
+        curr = self.n_points * dlen
+        return d.ravel()[max(0, curr - n_points * dlen) : curr]
+
+    def point_h5_group(self, index: int):
+        """group in which nested measurements of point *index* store their data"""
+        return self.h5_file.require_group(f"points/{index}")
 
     def flush_h5(self):
+        """call at the end of every line of the innermost loop"""
+        self.write_settings_lines()
+        # the spare capacity is kept, logical_length tells the points
+        # written, close_h5 trims
+        for dset in self.point_dsets.values():
+            dset.flush()
+        if self.h5_writer is not None:
+            self.h5_writer.flush()
         self.h5_file.flush()
 
     def create_dataset(self, name, shape=None, dtype=None, data=None, **kwds):
@@ -93,8 +472,18 @@ class NDScanData:
 
 
     def close_h5(self):
-        self.h5_meas_group.create_dataset("positions", data=self.positions)
-        self.h5_meas_group.create_dataset("read_positions", data=self.read_positions)
-        self.h5_meas_group.create_dataset("indices", data=self.indices)
+        self.write_repeat_stats()
+        self.write_settings_lines()
+        for reader in self.settings_readers.values():
+            reader.shutdown()
+        for dset in self.point_dsets.values():
+            dset.flush()
+        if self.h5_writer is not None:
+            self.h5_writer.close()
+        # trims to the number of points, e.g. of an interrupted sweep
+        for dset in self.point_dsets.values():
+            dset.close()
+        if "pipeline_overlap" in self.point_dsets:
+            self.h5_meas_group["pipeline_overlap"].attrs["total"] = self.overlap_total
         self.h5_file.flush()
-        self.h5_file.close()
+        self.measurement.close_h5_file()
@@ -0,0 +1,75 @@
+"""
+Readout of the settings a Collector monitors at every sweep point.
+
+The LoggedQuantities of settings_to_collect are looked up once per sweep and
+grouped by their owner (hw/<name>, mm/<name>, app). The settings of one owner
+are read one after another, as the hardware connection of a component is
+usually not thread safe, different owners are read concurrently. A read
+returns one record of a structured dtype with a field per setting path.
+"""
+
+from collections import defaultdict
+from functools import partial
+from typing import Dict, List, Sequence
+
+import h5py
+import numpy as np
+
+from ScopeFoundry.logged_quantity.logged_quantity import LoggedQuantity
+from ScopeFoundry.scanning.detector_reads import DetectorPool
+
+
+def owner_path(lq_path: str) -> str:
+    """path of the component that owns the setting *lq_path*"""
+    parts = lq_path.split("/")
+    return "/".join(parts[:2]) if parts[0] in ("hw", "mm") else parts[0]
+
+
+def field_dtype(lq: LoggedQuantity):
+    if lq.dtype == str:
+        return (h5py.string_dtype(),)
+    value = np.asarray(lq.val)
+    return (value.dtype, value.shape)
+
+
+def read_lqs(lqs: Sequence[LoggedQuantity]) -> List:
+    return [
+        lq.read_from_hardware(send_signal=False) if lq.has_hardware_read() else lq.val
+        for lq in lqs
+    ]
+
+
+class SettingsReader:
+
+    def __init__(self, app, lq_paths: Sequence[str]):
+        self.lq_paths = list(lq_paths)
+        lqs = {}
+        for path in self.lq_paths:
+            lq = app.get_lq(path)
+            if lq is None:
+                raise ValueError(f"setting to collect {path} does not exist")
+            lqs[path] = lq
+        self.groups: Dict[str, List[str]] = defaultdict(list)
+        for path in self.lq_paths:
+            self.groups[owner_path(path)].append(path)
+        self.pool = DetectorPool()
+        for owner, paths in self.groups.items():
+            self.pool.add(owner, partial(read_lqs, [lqs[p] for p in paths]))
+        self.dtype = np.dtype(
+            [(path, *field_dtype(lqs[path])) for path in self.lq_paths]
+        )
+
+    def start(self):
+        self.pool.start()
+
+    def read(self) -> np.ndarray:
+        """reads all settings, returns them as a record of self.dtype"""
+        values, _ = self.pool.read_all()
+        record = np.zeros((), dtype=self.dtype)
+        for owner, paths in self.groups.items():
+            for path, value in zip(paths, values[owner]):
+                record[path] = value
+        return record
+
+    def shutdown(self):
+        self.pool.shutdown()
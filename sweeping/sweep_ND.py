@@ -0,0 +1,599 @@
+import time
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import contextmanager
+from copy import copy
+from typing import Dict, Sequence, Tuple, Union
+
+import numpy as np
+import pyqtgraph as pg
+from qtpy import QtWidgets
+
+from ScopeFoundry import BaseMicroscopeApp, Measurement
+from ScopeFoundry.scanning.actuators import (
+    ActuatorDefinitions,
+    actuator_owner,
+    add_all_possible_actuators_and_parse_definitions,
+    get_actuator_funcs,
+)
+
+from .any_measurement_collector import AnyMeasurementCollector
+from .any_setting_collector import AnySettingCollector
+from .collector import Collector
+from .collector_ui_list import InteractiveCollectorList
+from .nd_scan_data import STORAGE_MODES, NDScanData
+from .sweep_modes import (
+    SweepMode,
+    mk_data_shape,
+    mk_line_ends,
+    mk_ranges_consistent,
+    mk_trajectory,
+    modes_description,
+    std_sweep_modes,
+)
+from .utils import (
+    filtered_lq_paths,
+    mk_actuator_mover,
+    mk_new_dir,
+    setup_settle_settings,
+)
+
+# wall time of the sweep thread (display: GUI thread) spent in each phase
+SWEEP_PHASES = ("move", "settle", "collect", "write", "display")
+
+
+def timed(func, *args):
+    """returns func(*args) and its (start, end) time"""
+    t0 = time.perf_counter()
+    result = func(*args)
+    return result, (t0, time.perf_counter())
+
+
+def overlap(interval_1, interval_2) -> float:
+    return max(
+        0.0, min(interval_1[1], interval_2[1]) - max(interval_1[0], interval_2[0])
+    )
+
+
+class SweepND(Measurement):
+    """
+    Sweeps any number of actuators and runs the collectors at every point.
+
+    Subclasses set the default *actuator_names* and the scan modes
+    *sweep_modes* ({name: SweepMode}, the first is the initial one, default
+    std_sweep_modes of the number of actuators) with their
+    *scan_modes_description*.
+    """
+
+    name = "sweep_nd"
+
+    actuator_names: Sequence[str] = "123"
+    sweep_modes: Union[Dict[str, SweepMode], None] = None
+    scan_modes_description: Union[str, None] = None
+
+    def run(self):
+        s = self.settings
+
+        s.get_lq("plot_option").change_choice_list([])
+        self.display_ready = False
+        self.displayed = None
+        self.phase_times = dict.fromkeys(SWEEP_PHASES, 0.0)
+
+        mode = self.sweep_modes[s["scan_mode"]]
+        mk_ranges_consistent(s, self.actuator_names, mode)
+
+        collectors = self.collector_list_widget.get_collectors()
+        if not collectors:
+            self.set_status("set a collector repetitions to non-zero", "r")
+            print("set a collector repetitions to non-zero")
+            return
+
+        actuators = self.current_actuator_funcs
+
+        if not actuators:
+            self.set_status("no actuators selected", "r")
+            print("no actuators selected")
+            return
+
+        if not s["container_mode"] and "any_measurement" in (
+            col.name for col in collectors
+        ):
+            self.pre_res_in_new_dir = s["res_in_new_dir"]
+            s["res_in_new_dir"] = True
+
+        if s["res_in_new_dir"]:
+            self.root = self.app.settings["save_dir"]
+            self.app.settings["save_dir"] = mk_new_dir(self.root, self.name)
+
+        arrays = tuple([r.sweep_array for r in self.scan_ranges])
+        trajectory_positions, trajectory_indices = mk_trajectory(arrays, mode)
+        line_ends = mk_line_ends(trajectory_indices, mode)
+
+        self.scan_data = scan_data = NDScanData(
+            base_shape=mk_data_shape([len(a) for a in arrays], mode),
+            measurement=self,
+            storage=s["data_storage"],
+            line_axis=mode.groups[-1][-1],
+        )
+
+        mover = move_ahead = None
+        try:
+            for array, name in zip(arrays, self.actuator_names):
+                self.scan_data.create_dataset(f"range_{name}", data=array)
+
+            N = len(trajectory_positions)
+            self.index = 0
+
+            owners = [actuator_owner(d[1]) for d in self.current_actuators_defs]
+            mover = mk_actuator_mover(s, self.actuator_names, actuators, owners)
+            points = list(
+                zip(
+                    map(tuple, trajectory_positions.tolist()),
+                    map(tuple, trajectory_indices.tolist()),
+                )
+            )
+
+            # with async collectors the move to the next point starts as soon as
+            # all acquisitions of a point are complete, their last repetitions
+            # are fetched and stored while moving
+            pipeline = s["pipeline_collectors"] and any(c.is_async for c in collectors)
+            if pipeline:
+                move_ahead = ThreadPoolExecutor(1, "move_ahead")
+            next_move = None
+            store_time = None
+
+            for i, (positions, base_indices) in enumerate(points):
+
+                # set positions and wait
+                pretty_pos = ", ".join([f"{p:.1f}" for p in positions])
+                self.set_status(f"setting {pretty_pos} and wait ", "g")
+                if next_move is None:
+                    (settle_times, settled), (t0, t1) = timed(mover.move, positions)
+                    self.phase_times["move"] += mover.write_time
+                    self.phase_times["settle"] += t1 - t0 - mover.write_time
+                else:
+                    with self.timing_phase("move"):
+                        (settle_times, settled), move_time = next_move.result()
+                    scan_data.add_overlap(overlap(store_time, move_time))
+                    next_move = None
+                read_positions = tuple([read() for read, _ in actuators])
+
+                self.prepare_at_position(positions, base_indices)
+
+                pending = []
+                for collector in collectors:
+                    self.set_status(f"collecting {collector.name} on {pretty_pos}", "g")
+                    self.prepare_collector_at_position(
+                        collector, positions, base_indices
+                    )
+                    deferred = pipeline and collector.is_async
+                    acquired = True
+                    for r in range(collector.reps):
+                        with self.timing_phase("collect"):
+                            if not collector.is_async:
+                                collector.run(self.index, self)
+                            else:
+                                acquired = collector.acquire(self.index, self)
+                                if not acquired:
+                                    # interrupted, there is nothing to fetch
+                                    break
+                                if deferred and r == collector.reps - 1:
+                                    pending.append((collector, r))
+                                    continue
+                                collector.fetch()
+                        self.incorporate(collector, base_indices, r)
+                    if not deferred or not acquired:
+                        self.release_collector(collector, positions, base_indices)
+
+                if pipeline and i + 1 < len(points):
+                    if not self.interrupt_measurement_called:
+                        next_move = move_ahead.submit(
+                            timed, mover.move, points[i + 1][0]
+                        )
+                t0 = time.perf_counter()
+                for collector, r in pending:
+                    with self.timing_phase("collect"):
+                        collector.fetch()
+                    self.incorporate(collector, base_indices, r)
+                    self.release_collector(collector, positions, base_indices)
+                store_time = (t0, time.perf_counter())
+
+                with self.timing_phase("write"):
+                    scan_data.add_position(positions)
+                    scan_data.add_read_positions(read_positions)
+                    scan_data.add_indices(base_indices)
+                    scan_data.add_settle_times(settle_times, settled)
+                    if line_ends[i]:
+                        # the points of the line are in the file with their data
+                        scan_data.flush_h5()
+
+                self.index += 1
+                self.set_progress(100 * (self.index + 1) / N)
+
+                if self.interrupt_measurement_called:
+                    break
+
+            if next_move is not None:
+                next_move.result()
+            self.post_scan()
+
+            for collector in collectors:
+                scan_data.average_repeats(collector)
+            overlap_time = scan_data.overlap_total
+            for phase, t in self.phase_times.items():
+                scan_data.h5_meas_group.attrs[f"{phase}_time"] = t
+            # with h5 storage the data are datasets of the file closed below
+            shapes = {k: np.shape(v) for k, v in scan_data.data.items()}
+
+        finally:
+            # also when a move, collector or write failed
+            if move_ahead is not None:
+                move_ahead.shutdown()
+            if mover is not None:
+                mover.shutdown()
+            scan_data.close_h5()
+            if s["res_in_new_dir"]:
+                s["res_in_new_dir"] = self.pre_res_in_new_dir
+                self.app.settings["save_dir"] = self.root
+
+        self.set_status(f"{self.name} finished", "g")
+        if pipeline:
+            print(f"readout overlapped with motion for {overlap_time:.3g} s")
+        print("finished - data collected:")
+        for k, shape in shapes.items():
+            print(k, shape)
+
+    def incorporate(self, collector: Collector, base_indices: Tuple[int], r: int):
+        """stores the data of repetition *r* of *collector*"""
+        scan_data = self.scan_data
+        with self.timing_phase("write"):
+            if self.index == 0 and r == 0:
+                scan_data.init_dsets(collector)
+                self.settings.get_lq("plot_option").add_choices(
+                    list(scan_data.data.keys())
+                )
+                self.display_ready = True
+            scan_data.incorporate(collector, *base_indices, r)
+
+    @contextmanager
+    def timing_phase(self, phase: str):
+        """adds the time spent in the with block to phase_times[*phase*]"""
+        t0 = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.phase_times[phase] += time.perf_counter() - t0
+
+    def prepare_at_position(
+        self, positions: Tuple[float], base_indices: Tuple[int]
+    ) -> None:
+        """Optional override.
+
+        Intended for setting up detectors.
+        Gets called after position is set, But before data collection.
+
+        - positions: tuple of positions
+        - base_indices: tuple of indices of the current position in the scan data
+
+        Note, that data handling is defined in respective collectors and not here.
+        """
+        pass
+
+    def prepare_collector_at_position(
+        self, collector: Collector, positions: Tuple[float], base_indices: Tuple[int]
+    ) -> None:
+        """Optional override.
+
+        Intended for setting up a specific collector.
+        This method is called for each collector before data collection.
+
+        Note that the default behavior is to call the collector's prepare method.
+
+        Arguments:
+        - positions: tuple of positions
+        - base_indices: tuple of indices of the current position in the scan data
+
+        Note, that data handling is defined in respective collectors and not here.
+        """
+        collector.prepare(self, positions)
+
+    def release_collector(
+        self, collector: Collector, positions: Tuple[float], base_indices: Tuple[int]
+    ) -> None:
+        """Optional override.
+        Intended to 'undo' the prepare_collector_at_position method if needed.
+        """
+        collector.release(self, positions)
+
+    def post_scan(self):
+        """Optional override.
+        Gets called after data collection is finished - before file is closed.
+        """
+        pass
+
+    def __init__(
+        self,
+        app: BaseMicroscopeApp,
+        name: Union[str, None] = None,
+        collectors: Sequence[Collector] = (),
+        actuators: Sequence[ActuatorDefinitions] = (),
+        actuator_names: Union[Sequence[str], None] = None,
+        range_n_intervals: Union[Sequence[int], None] = None,
+        n_read_any_settings: int = 2,
+        n_any_measurements: int = 2,
+    ):
+        self.collectors = [copy(x) for x in collectors]
+        self.user_defined_actuators = list(actuators)
+        if actuator_names is not None:
+            self.actuator_names = actuator_names
+        self.ndim = len(self.actuator_names)
+        if range_n_intervals is None:
+            range_n_intervals = (1,) * self.ndim
+        self.range_n_intervals = range_n_intervals
+        if self.sweep_modes is None:
+            self.sweep_modes = std_sweep_modes(self.ndim)
+        if self.scan_modes_description is None:
+            self.scan_modes_description = modes_description(
+                self.sweep_modes, self.actuator_names
+            )
+        self.n_read_any_settings = n_read_any_settings
+        self.phase_times = dict.fromkeys(SWEEP_PHASES, 0.0)
+        self.n_any_measurements = n_any_measurements
+        super().__init__(app, name)
+
+    def setup(self):
+        s = self.settings
+        s.New(
+            name="scan_mode",
+            dtype=str,
+            initial=next(iter(self.sweep_modes)),
+            choices=tuple(self.sweep_modes),
+            description=self.scan_modes_description,
+        )
+        s.New(
+            name="collection_delay",
+            initial=0.01,
+            unit="s",
+            description="after setting the wheel position, data collection is delayed allowing system to reach steady state",
+        )
+        setup_settle_settings(s, self.actuator_names)
+        s.New(
+            name="pipeline_collectors",
+            dtype=bool,
+            initial=True,
+            description="async collectors are read out while moving to the next point",
+        )
+
+        s.New(
+            name="res_in_new_dir",
+            dtype=bool,
+            initial=False,
+            description="dumps data in a new sub folder. Intended for <i>any_measurement</i> where a file is stored per acquisition",
+        )
+        s.New(
+            name="container_mode",
+            dtype=bool,
+            initial=False,
+            description="<i>any_measurement</i> stores its measurement group in the sweep file under /points/&lt;index&gt; instead of a file per acquisition",
+        )
+        s.New(
+            name="data_storage",
+            dtype=str,
+            initial="memory",
+            choices=STORAGE_MODES,
+            description="<i>memory</i>: repeated data is also kept in memory. <i>h5</i>: the file is the only store, the plot shows recent points",
+        )
+        s.New(
+            name="plot_option",
+            dtype=str,
+            initial="powers",
+            choices=("",),
+            description="plot option",
+        )
+
+        for i in range(self.n_any_measurements):
+            self.collectors.append(
+                AnyMeasurementCollector(self, name=f"any_measurement_{i}")
+            )
+
+        for i in range(self.n_read_any_settings):
+            self.collectors.append(AnySettingCollector(self, name=f"any_setting_{i}"))
+
+        for collector in self.collectors:
+            collector.setup_reps_lq(s)
+
+        self.scan_ranges = []
+        for name, n in zip(self.actuator_names, self.range_n_intervals):
+            s.New(f"actuator_{name}", dtype=str, choices=["none"])
+            if n == 1:
+                self.scan_ranges.append(
+                    s.New_Range(f"range_{name}", True, False, initials=(1, 2, 11))
+                )
+            else:
+                self.scan_ranges.append(
+                    s.new_intervaled_range(f"range_{name}", n, False, True)
+                )
+
+        self.add_operation(
+            "update widgets",
+            self.update_widgets,
+            description="click after connecting to a hardware to extend actuator options",
+            icon_path=self.app.qtapp.style().standardIcon(
+                QtWidgets.QStyle.SP_BrowserReload
+            ),
+        )
+
+    def update_widgets(self):
+
+        s = self.settings
+
+        for i in range(self.n_read_any_settings):
+            s.get_lq(f"any_setting_{i}").change_choice_list(filtered_lq_paths(self.app))
+
+        self.actuator_defs = add_all_possible_actuators_and_parse_definitions(
+            actuator_definitions=self.user_defined_actuators, app=self.app
+        )
+        self.actuators_funcs = get_actuator_funcs(self.app, self.actuator_defs)
+
+        for i in self.actuator_names:
+            s.get_lq(f"actuator_{i}").change_choice_list(self.actuators_funcs.keys())
+
+    @property
+    def current_actuators_defs(self):
+        """Returns a list of currently selected actuator definitions."""
+        s = self.settings
+        return [self.actuator_defs[s[f"actuator_{i}"]] for i in self.actuator_names]
+
+    @property
+    def current_actuator_funcs(self):
+        s = self.settings
+        return [self.actuators_funcs[s[f"actuator_{i}"]] for i in self.actuator_names]
+
+    @property
+    def current_positions_lqs(self):
+        return (self.app.get_lq(paths[1]) for paths in self.current_actuators_defs)
+
+    @property
+    def current_target_position_funcs(self):
+        return (a[-1] for a in self.current_actuator_funcs)
+
+    def setup_figure(self):
+
+        s = self.settings
+
+        h_widget = QtWidgets.QWidget()
+        h_widget.setSizePolicy(
+            QtWidgets.QSizePolicy.Policy.Preferred, QtWidgets.QSizePolicy.Policy.Fixed
+        )
+        h_layout = QtWidgets.QHBoxLayout(h_widget)
+        h_layout.addWidget(self.mk_run_widget())
+        # the ranges of more than 3 actuators get a row of their own
+        if self.ndim <= 3:
+            h_layout.addWidget(self.mk_scan_settings_widget())
+        h_layout.addWidget(self.mk_collect_widget())
+
+        self.ui = QtWidgets.QWidget()
+        layout = QtWidgets.QVBoxLayout(self.ui)
+        layout.addWidget(h_widget)
+        if self.ndim > 3:
+            layout.addWidget(self.mk_scan_settings_widget())
+        layout.addWidget(s.get_lq("plot_option").new_default_widget())
+        layout.addWidget(self.mk_graph_widget())
+
+        self.display_ready = False
+        self.set_status("starting power scan", "y")
+        s.get_lq("plot_option").add_listener(self.update_display)
+        for i in range(self.n_any_measurements):
+            s.get_lq(f"any_measurement_{i}").change_choice_list(
+                self.app.measurements.keys()
+            )
+        for i in range(self.n_read_any_settings):
+            s.get_lq(f"any_setting_{i}").change_choice_list(
+                self.app.get_setting_paths(True)
+            )
+        self.set_status("welc\u1e4fme", (253, 188, 24), True)
+
+        self.update_widgets()
+
+    def update_display(self):
+
+        self.update_status_display()
+
+        if not self.display_ready or not self.settings["plot_option"]:
+            return
+
+        name = self.settings["plot_option"]
+        if not self.has_new_display_data(name):
+            return
+        with self.timing_phase("display"):
+            point_shape = self.scan_data.point_shape(name)
+            dlen = np.prod(point_shape)  # len of data
+
+            if len(point_shape) >= 1:
+                f = max(1, 100_000 // dlen)
+                self.line.setData(self.scan_data.recent_values(name, f))
+            else:
+                self.line.setData(*self.scan_data.point_trace(name))
+        #
+        # elif ddim in (2, 3):
+        #     self.img_item.setVisible(True)
+        #     images = dset.reshape((-1,)+ dset.shape[4:])
+        #     self.img_item.setImage(images[curr], autoLevels=True)
+
+    def has_new_display_data(self, name: str) -> bool:
+        """True (once) if *name* changed since it was last displayed"""
+        displayed = (self.scan_data, name, self.scan_data.version(name))
+        if displayed == self.displayed:
+            return False
+        self.displayed = displayed
+        return True
+
+    def set_status(self, msg, color="w", force_report=False):
+        self.status = {
+            "title": msg,
+            "color": color,
+        }
+        if force_report:
+            self.update_status_display()
+
+    def update_status_display(self):
+        self.axes.setTitle(**self.status)
+
+    def mk_run_widget(self):
+        run_widget = QtWidgets.QGroupBox("run")
+        vlayout = QtWidgets.QVBoxLayout(run_widget)
+        vlayout.addWidget(self.new_start_stop_button())
+        include = (
+            # "plot_option",
+            "collection_delay",
+            "settle_mode",
+            "concurrent_moves",
+            "res_in_new_dir",
+            "container_mode",
+        )
+        if len(self.sweep_modes) > 1:
+            include += ("scan_mode",)
+        vlayout.addWidget(self.settings.New_UI(include))
+        vlayout.addWidget(self.operations.new_button("update widgets"))
+        run_widget.setFlat(False)
+        return run_widget
+
+    def mk_scan_settings_widget(self):
+        h_layout = QtWidgets.QHBoxLayout()
+        for i in self.actuator_names:
+            r = self.settings.ranges[f"range_{i}"]
+            w1 = r.New_UI()
+            w1.layout().insertRow(
+                0, self.settings.get_lq(f"actuator_{i}").new_default_widget()
+            )
+            w1.layout().setSpacing(1)
+            h_layout.addWidget(w1)
+
+        widget = QtWidgets.QGroupBox("scan settings")
+        widget.setLayout(h_layout)
+        widget.setFlat(False)
+        return widget
+
+    def mk_collect_widget(self):
+
+        collect_widget = QtWidgets.QGroupBox(
+            title="choose the number of repetion for each detectors - drag and drop to change order"
+        )
+        layout = QtWidgets.QVBoxLayout(collect_widget)
+
+        self.collector_list_widget = InteractiveCollectorList()
+        for collector in self.collectors:
+            self.collector_list_widget.add_item(collector)
+
+        layout.addWidget(self.collector_list_widget)
+        return collect_widget
+
+    def mk_graph_widget(self):
+        graph_widget = pg.GraphicsLayoutWidget()
+        self.axes = graph_widget.addPlot(title=self.name)
+        self.axes.setLogMode(False, False)
+        self.axes.showGrid(True, True)
+        self.line = self.axes.plot()
+        # self.img_item = pg.ImageItem()
+        # self.img_item.setVisible(False)
+        # self.axes.addItem(self.img_item)
+        return graph_widget
@@ -0,0 +1,122 @@
+"""
+Vectorized sweep trajectories for any number of actuators.
+
+A SweepMode groups the actuators (0, 1, ...) into loops, slowest loop first.
+The actuators of a group co-move: they step through their arrays together
+and their data lands on the axis of the last actuator of the group, the
+other axes of the group have length 1. With serpentine every loop but the
+slowest reverses direction on every other pass.
+
+mk_trajectory computes the positions and data indices of all points with
+numpy index arithmetic instead of nested python generators.
+"""
+
+from dataclasses import dataclass
+from typing import Dict, Sequence, Tuple
+
+import numpy as np
+
+
+@dataclass(frozen=True)
+class SweepMode:
+    groups: Tuple[Tuple[int, ...], ...]
+    serpentine: bool = False
+
+    @property
+    def ndim(self) -> int:
+        return sum(len(g) for g in self.groups)
+
+
+def nested_groups(ndim: int) -> Tuple[Tuple[int, ...], ...]:
+    return tuple((i,) for i in range(ndim))
+
+
+def std_sweep_modes(ndim: int) -> Dict[str, SweepMode]:
+    """co-move, nested and serpentine modes (and their *_swap_order) of *ndim* actuators"""
+    if ndim == 1:
+        return {"NA": SweepMode(nested_groups(1))}
+    nested = nested_groups(ndim)
+    swapped = nested[::-1]
+    return {
+        "co-move": SweepMode((tuple(range(ndim)),)),
+        "nested": SweepMode(nested),
+        "nested_swap_order": SweepMode(swapped),
+        "serpentine": SweepMode(nested, serpentine=True),
+        "serpentine_swap_order": SweepMode(swapped, serpentine=True),
+    }
+
+
+def mk_data_shape(lengths: Sequence[int], mode: SweepMode) -> Tuple[int, ...]:
+    shape = [1] * len(lengths)
+    for group in mode.groups:
+        shape[group[-1]] = lengths[group[-1]]
+    return tuple(shape)
+
+
+def mk_loop_indices(loop_lengths: Sequence[int], serpentine=False) -> np.ndarray:
+    """(n_points, n_loops) loop counters, first loop slowest"""
+    loop_lengths = tuple(loop_lengths)
+    counters = np.indices(loop_lengths).reshape(len(loop_lengths), -1)
+    if serpentine:
+        # loop i reverses on odd passes, a pass being one iteration of all
+        # slower loops together
+        passes = np.zeros(counters.shape[1], dtype=counters.dtype)
+        snaked = counters.copy()
+        for i in range(1, len(loop_lengths)):
+            passes = passes * loop_lengths[i - 1] + counters[i - 1]
+            odd = passes % 2 == 1
+            snaked[i, odd] = loop_lengths[i] - 1 - counters[i, odd]
+        counters = snaked
+    return counters.T
+
+
+def mk_trajectory(
+    arrays: Sequence[np.ndarray], mode: SweepMode
+) -> Tuple[np.ndarray, np.ndarray]:
+    """
+    positions (n_points, n_actuators) and data indices (n_points, n_actuators)
+    of the sweep over *arrays* in *mode*
+    """
+    if mode.ndim != len(arrays):
+        raise ValueError(f"{mode} does not sweep {len(arrays)} actuators")
+    loop_lengths = [len(arrays[group[-1]]) for group in mode.groups]
+    counters = mk_loop_indices(loop_lengths, mode.serpentine)
+    n = len(counters)
+    positions = np.empty((n, len(arrays)))
+    indices = np.zeros((n, len(arrays)), dtype=int)
+    for loop, group in enumerate(mode.groups):
+        for axis in group:
+            positions[:, axis] = np.asarray(arrays[axis])[counters[:, loop]]
+        indices[:, group[-1]] = counters[:, loop]
+    return positions, indices
+
+
+def mk_line_ends(indices: np.ndarray, mode: SweepMode) -> np.ndarray:
+    """True at the last point of every pass of the innermost loop"""
+    inner = mode.groups[-1]
+    slower = [axis for axis in range(indices.shape[1]) if axis not in inner]
+    changes = np.any(indices[1:, slower] != indices[:-1, slower], axis=1)
+    return np.append(changes, True)
+
+
+def mk_ranges_consistent(settings, actuator_names: Sequence[str], mode: SweepMode):
+    """co-moving actuators take the number of steps of the last one of their group"""
+    for group in mode.groups:
+        num = settings[f"range_{actuator_names[group[-1]]}_num"]
+        for axis in group[:-1]:
+            settings[f"range_{actuator_names[axis]}_num"] = num
+
+
+def modes_description(modes: Dict[str, SweepMode], actuator_names: Sequence[str]):
+    """html description of *modes*, listing the loops slowest first"""
+
+    def loop_name(group):
+        names = ",".join(actuator_names[i] for i in group)
+        return names if len(group) == 1 else f"({names} co-move)"
+
+    lines = []
+    for name, mode in modes.items():
+        loops = " &gt; ".join(loop_name(g) for g in mode.groups)
+        serpentine = ", inner loops reverse every pass" if mode.serpentine else ""
+        lines.append(f"<p><i>{name}:</i> {loops}{serpentine}")
+    return "\n".join(lines)
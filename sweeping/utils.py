@@ -1,8 +1,17 @@
 import datetime
 import pathlib
-from typing import List
+from typing import List, Sequence
+from warnings import warn
 
 from ScopeFoundry import BaseMicroscopeApp
+from ScopeFoundry.logged_quantity.collection import LQCollection
+from ScopeFoundry.scanning.actuators import (
+    SETTLE_MODES,
+    ActuatorFuncs,
+    ActuatorMover,
+    SettleCondition,
+    has_read_back,
+)
 
 
 def mk_new_dir(root, name):
@@ -28,3 +37,59 @@ def filtered_lq_paths(app: BaseMicroscopeApp) -> List[str]:
             "dark_mode",
         )
     ]
+
+
+def setup_settle_settings(settings: LQCollection, actuator_names: Sequence[str]):
+    settings.New(
+        name="settle_mode",
+        dtype=str,
+        initial="delay",
+        choices=SETTLE_MODES,
+        description="<i>delay</i>: wait collection_delay after moving. <i>tolerance</i>: wait until the read back position is within settle_tolerance of the target. <i>stable</i>: wait until settle_reads reads are within settle_tolerance",
+    )
+    for name in actuator_names:
+        settings.New(f"settle_tolerance_{name}", initial=0.01, vmin=0)
+    settings.New("settle_reads", dtype=int, initial=3, vmin=2)
+    settings.New("settle_timeout", initial=1.0, vmin=0, unit="s")
+    settings.New(
+        name="concurrent_moves",
+        dtype=bool,
+        initial=True,
+        description="write the actuators of different hardware at once, "
+        "the actuators of one hardware are written one after another",
+    )
+
+
+def mk_actuator_mover(
+    settings: LQCollection,
+    actuator_names: Sequence[str],
+    actuators: Sequence[ActuatorFuncs],
+    owners: Sequence = None,
+) -> ActuatorMover:
+    conditions = [
+        SettleCondition(
+            mode=settings["settle_mode"],
+            tolerance=settings[f"settle_tolerance_{name}"],
+            n_stable=settings["settle_reads"],
+            timeout=settings["settle_timeout"],
+        )
+        for name in actuator_names
+    ]
+    mode = settings["settle_mode"]
+    no_read_back = [
+        name
+        for name, (read, _) in zip(actuator_names, actuators)
+        if not has_read_back(read)
+    ]
+    if mode != "delay" and no_read_back:
+        warn(
+            f"settle_mode {mode}: actuator {', '.join(no_read_back)} has no read "
+            "back, waits collection_delay instead"
+        )
+    return ActuatorMover(
+        actuators,
+        conditions,
+        delay=settings["collection_delay"],
+        concurrent=settings["concurrent_moves"],
+        owners=owners,
+    )
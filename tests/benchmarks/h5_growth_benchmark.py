@@ -0,0 +1,55 @@
+"""
+Benchmark of appending to extendable h5 datasets:
+resizing by one entry per append vs. h5_io.GrowingH5Dataset
+
+    python -m ScopeFoundry.tests.benchmarks.h5_growth_benchmark
+"""
+
+import tempfile
+import time
+from pathlib import Path
+
+import h5py
+import numpy as np
+
+from ScopeFoundry import h5_io
+
+N_APPENDS = 100_000
+ENTRY_SHAPE = (4,)
+
+
+def append_resize_by_one(h5_group, n):
+    ds = h5_io.create_extendable_h5_dataset(
+        h5_group, "resize_by_one", (0,) + ENTRY_SHAPE, dtype=float, chunks=True
+    )
+    entry = np.ones(ENTRY_SHAPE)
+    for i in range(n):
+        h5_io.extend_h5_dataset_along_axis(ds, i + 1)
+        ds[i] = entry
+    return ds.shape
+
+
+def append_growing(h5_group, n):
+    ds = h5_io.GrowingH5Dataset(h5_group, "growing", (0,) + ENTRY_SHAPE, dtype=float)
+    entry = np.ones(ENTRY_SHAPE)
+    for i in range(n):
+        ds.append(entry)
+    ds.close()
+    return ds.dset.shape
+
+
+def main(n=N_APPENDS):
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        with h5py.File(Path(tmp_dir) / "benchmark.h5", "w") as h5_file:
+            for func in (append_resize_by_one, append_growing):
+                t0 = time.perf_counter()
+                shape = func(h5_file, n)
+                dt = time.perf_counter() - t0
+                print(
+                    f"{func.__name__:>22}: {n} appends in {dt:.2f} s "
+                    f"({n / dt:,.0f} appends/s) final shape {shape}"
+                )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,84 @@
+"""
+Per point overhead of running a trivial readout measurement from a sweep
+Collector: start_nested_measure_and_wait (own thread, activation signals
+and post_run on the GUI thread) vs. Collector.run_in_thread
+(Measurement.run_nested_in_thread on the sweep thread). The readout takes
+READOUT_TIME, longer than the 10 ms start_nested_measure_and_wait polls for
+the nested measurement to start, faster measurements hit its 1 s timeout.
+
+    python -m ScopeFoundry.tests.benchmarks.nested_measure_benchmark
+"""
+
+import os
+import tempfile
+import time
+
+os.environ.setdefault("QT_QPA_PLATFORM", "offscreen")
+
+from ScopeFoundry import BaseMicroscopeApp, Measurement
+from ScopeFoundry.sweeping import Collector, SweepND
+
+N_POINTS = 100
+READOUT_TIME = 0.02
+
+
+class Readout(Measurement):
+    name = "readout"
+
+    def run(self):
+        time.sleep(READOUT_TIME)
+        self.data = {"value": 1.0}
+
+
+class ReadoutCollector(Collector):
+    name = "readout"
+    repeated_dset_names = ("value",)
+    target_measure_name = "readout"
+
+
+def run_sweep(app, m, in_thread):
+    m.collectors[0].run_in_thread = in_thread
+    t0 = time.perf_counter()
+    m.start()
+    # the nested measurements need the event loop to finish
+    while m.is_measuring():
+        app.qtapp.processEvents()
+        time.sleep(0.0005)
+    return time.perf_counter() - t0
+
+
+def main(n=N_POINTS):
+    app = BaseMicroscopeApp([])
+    app.add_measurement(Readout(app))
+    position = [0.0]
+    m = app.add_measurement(
+        SweepND(
+            app,
+            actuators=[
+                ("a", lambda: position[0], lambda x: position.__setitem__(0, x))
+            ],
+            collectors=[ReadoutCollector(app)],
+            actuator_names="x",
+            n_read_any_settings=0,
+            n_any_measurements=0,
+        )
+    )
+    m.setup_figure()
+    m.settings["actuator_x"] = "a"
+    m.settings["range_x_num"] = n
+    m.settings["collection_delay"] = 0
+    m.settings["readout_repetitions"] = 1
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        app.settings["save_dir"] = tmp_dir
+        for label, in_thread in (("nested thread", False), ("in thread", True)):
+            dt = run_sweep(app, m, in_thread)
+            overhead = m.phase_times["collect"] / n - READOUT_TIME
+            print(
+                f"{label:>13}: {n} points in {dt:.2f} s "
+                f"({dt / n * 1e3:.3f} ms/point, collect overhead "
+                f"{overhead * 1e3:.3f} ms/point)"
+            )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,209 @@
+"""
+Benchmark of the raster scan pattern generators: the former per-pixel python
+loops (kept here as reference) vs. the numpy index arithmetic of
+ScopeFoundry.scanning.scan_trajectory.ScanTrajectory
+
+    python -m ScopeFoundry.tests.benchmarks.scan_generator_benchmark
+"""
+
+import time
+
+import numpy as np
+
+from ScopeFoundry.scanning.base_raster_scan import ijk_zigzag_indices
+from ScopeFoundry.scanning.scan_trajectory import ScanTrajectory
+
+N_2D = 1024
+N_3D = 128
+
+
+def _empty(Npixels, with_z=False):
+    arrays = dict(
+        h=np.zeros(Npixels, dtype=float),
+        v=np.zeros(Npixels, dtype=float),
+        slow_move=np.zeros(Npixels, dtype=bool),
+        index=np.zeros((Npixels, 3), dtype=int),
+    )
+    if with_z:
+        arrays["z"] = np.zeros(Npixels, dtype=float)
+        arrays["start_move"] = np.zeros(Npixels, dtype=bool)
+    return arrays
+
+
+def legacy_serpentine(h_array, v_array):
+    Nh, Nv = len(h_array), len(v_array)
+    a = _empty(Nh * Nv)
+    pixel_i = 0
+    for jj in range(Nv):
+        a["slow_move"][pixel_i] = True
+        if jj % 2:
+            h_line_indicies = range(Nh)[::-1]
+        else:
+            h_line_indicies = range(Nh)
+        for ii in h_line_indicies:
+            a["v"][pixel_i] = v_array[jj]
+            a["h"][pixel_i] = h_array[ii]
+            a["index"][pixel_i, :] = [0, jj, ii]
+            pixel_i += 1
+    return a
+
+
+def legacy_trace_retrace(h_array, v_array):
+    Nh, Nv = len(h_array), len(v_array)
+    a = _empty(2 * Nh * Nv)
+    pixel_i = 0
+    for jj in range(Nv):
+        a["slow_move"][pixel_i] = True
+        for kk, step in [(0, 1), (1, -1)]:
+            for ii in range(Nh)[::step]:
+                a["v"][pixel_i] = v_array[jj]
+                a["h"][pixel_i] = h_array[ii]
+                a["index"][pixel_i, :] = [kk, jj, ii]
+                pixel_i += 1
+    return a
+
+
+def legacy_ortho_raster(h_array, v_array):
+    Nh, Nv = len(h_array), len(v_array)
+    a = _empty(2 * Nh * Nv)
+    pixel_i = 0
+    for jj in range(Nv):
+        a["slow_move"][pixel_i] = True
+        for ii in range(Nh):
+            a["v"][pixel_i] = v_array[jj]
+            a["h"][pixel_i] = h_array[ii]
+            a["index"][pixel_i, :] = [0, jj, ii]
+            pixel_i += 1
+    for ii in range(Nh):
+        a["slow_move"][pixel_i] = True
+        for jj in range(Nv):
+            a["v"][pixel_i] = v_array[jj]
+            a["h"][pixel_i] = h_array[ii]
+            a["index"][pixel_i, :] = [1, jj, ii]
+            pixel_i += 1
+    return a
+
+
+def legacy_ortho_trace_retrace(h_array, v_array):
+    Nh, Nv = len(h_array), len(v_array)
+    a = _empty(4 * Nh * Nv)
+    pixel_i = 0
+    for jj in range(Nv):
+        a["slow_move"][pixel_i] = True
+        for kk, step in [(0, 1), (1, -1)]:
+            for ii in range(Nh)[::step]:
+                a["v"][pixel_i] = v_array[jj]
+                a["h"][pixel_i] = h_array[ii]
+                a["index"][pixel_i, :] = [kk, jj, ii]
+                pixel_i += 1
+    for ii in range(Nh):
+        a["slow_move"][pixel_i] = True
+        for kk, step in [(2, 1), (3, -1)]:
+            for jj in range(Nv)[::step]:
+                a["v"][pixel_i] = v_array[jj]
+                a["h"][pixel_i] = h_array[ii]
+                a["index"][pixel_i, :] = [kk, jj, ii]
+                pixel_i += 1
+    return a
+
+
+def legacy_serpentine_3d(h_array, v_array, z_array):
+    Nh, Nv, Nz = len(h_array), len(v_array), len(z_array)
+    a = _empty(Nh * Nv * Nz, with_z=True)
+    pixel_i = 0
+    for kk in range(Nz):
+        a["start_move"][pixel_i] = True
+        for jj in range(Nv):
+            a["slow_move"][pixel_i] = True
+            if jj % 2:
+                h_line_indicies = range(Nh)[::-1]
+            else:
+                h_line_indicies = range(Nh)
+            for ii in h_line_indicies:
+                a["z"][pixel_i] = z_array[kk]
+                a["v"][pixel_i] = v_array[jj]
+                a["h"][pixel_i] = h_array[ii]
+                a["index"][pixel_i, :] = [kk, jj, ii]
+                pixel_i += 1
+    return a
+
+
+def legacy_ijk_zigzag_generator(dims, axis_order=(0, 1, 2)):
+    ax0, ax1, ax2 = axis_order
+    for i_ax0 in range(dims[ax0]):
+        zig_or_zag0 = (1, -1)[i_ax0 % 2]
+        for i_ax1 in range(dims[ax1])[::zig_or_zag0]:
+            zig_or_zag1 = (1, -1)[(i_ax0 + i_ax1) % 2]
+            for i_ax2 in range(dims[ax2])[::zig_or_zag1]:
+                ijk = [0, 0, 0]
+                ijk[ax0] = i_ax0
+                ijk[ax1] = i_ax1
+                ijk[ax2] = i_ax2
+                yield tuple(ijk)
+
+
+def vectorized(pattern, *axes):
+    trajectory = ScanTrajectory(pattern, axes)
+    index = trajectory.indices()
+    a = dict(
+        index=index,
+        slow_move=trajectory.slow_move(),
+        start_move=trajectory.start_move(),
+    )
+    for name, axis, column in zip("hvz", axes, (2, 1, 0)):
+        a[name] = axis[index[:, column]]
+    return a
+
+
+def first_pixel(pattern, *axes):
+    trajectory = ScanTrajectory(pattern, axes)
+    views = trajectory.views()
+    return views["scan_index_array"][0], views["scan_h_positions"][0]
+
+
+CASES_2D = [
+    (legacy_serpentine, "serpentine"),
+    (legacy_trace_retrace, "trace_retrace"),
+    (legacy_ortho_raster, "ortho_raster"),
+    (legacy_ortho_trace_retrace, "ortho_trace_retrace"),
+]
+
+
+def timed(func, *args):
+    t0 = time.perf_counter()
+    result = func(*args)
+    return result, time.perf_counter() - t0
+
+
+def report(name, n, t_legacy, t_new):
+    print(
+        f"{name:>28}: {n:>11,} pixels legacy {t_legacy:7.3f} s "
+        f"numpy {t_new:7.4f} s ({t_legacy / t_new:,.0f}x)"
+    )
+
+
+def main(n_2d=N_2D, n_3d=N_3D):
+    h_array = np.linspace(-1.0, 1.0, n_2d)
+    v_array = np.linspace(0.0, 3.0, n_2d)
+    for legacy, pattern in CASES_2D:
+        _, t_legacy = timed(legacy, h_array, v_array)
+        a, t_new = timed(vectorized, pattern, h_array, v_array)
+        report(pattern, len(a["index"]), t_legacy, t_new)
+
+    axes = [np.linspace(0.0, 1.0, n_3d)] * 3
+    _, t_legacy = timed(legacy_serpentine_3d, *axes)
+    a, t_new = timed(vectorized, "serpentine", *axes)
+    report("serpentine 3D", len(a["index"]), t_legacy, t_new)
+
+    axes = [np.linspace(0.0, 1.0, 4096)] * 2
+    _, t_first = timed(first_pixel, "serpentine", *axes)
+    print(f"lazy 4096x4096 serpentine: first pixel after {t_first * 1e3:.2f} ms")
+
+    dims = (n_3d,) * 3
+    _, t_legacy = timed(lambda: list(legacy_ijk_zigzag_generator(dims)))
+    a, t_new = timed(ijk_zigzag_indices, dims)
+    report("ijk_zigzag_indices", len(a), t_legacy, t_new)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,216 @@
+"""
+Throughput of Sweep1D-4D and Map2D with the simulated example hardware
+(SimulonXYZStageHW, Noiser200HW and Noiser200Collector), run headless with
+the display timer driven by a processEvents loop.
+
+Reports per sweep the points/s, the time spent in each phase (move, settle,
+collect, write on the sweep thread, display on the GUI thread) and the peak
+python heap (tracemalloc). --json writes the results, with the latencies and
+versions, to a file to compare between releases.
+
+    python -m ScopeFoundry.tests.benchmarks.sweep_throughput_benchmark
+    python -m ScopeFoundry.tests.benchmarks.sweep_throughput_benchmark \\
+        --points 400 --move-latency 0.002 --json sweep_throughput.json
+"""
+
+import argparse
+import glob
+import json
+import os
+import platform
+import tempfile
+import time
+import tracemalloc
+from importlib import metadata
+
+os.environ.setdefault("QT_QPA_PLATFORM", "offscreen")
+
+import numpy as np
+
+from ScopeFoundry import BaseMicroscopeApp
+from ScopeFoundry.examples.measurements.collectors import Noiser200Collector
+from ScopeFoundry.examples.ScopeFoundryHW.bsinc_noiser200 import Noiser200HW
+from ScopeFoundry.examples.ScopeFoundryHW.simulon_xyz_stage import SimulonXYZStageHW
+from ScopeFoundry.sweeping import Map2D, Sweep1D, Sweep2D, Sweep3D, Sweep4D
+from ScopeFoundry.sweeping.sweep_ND import SWEEP_PHASES
+
+N_POINTS = 200
+SWEEPS = (Sweep1D, Sweep2D, Sweep3D, Sweep4D, Map2D)
+
+
+class SimulatedAxis:
+    """4th actuator of Sweep4D"""
+
+    def __init__(self):
+        self.position = 0.0
+
+    def read(self):
+        return self.position
+
+    def write(self, position):
+        self.position = position
+
+
+def with_latency(func, latency):
+    if not latency:
+        return func
+
+    def delayed(*args):
+        time.sleep(latency)
+        return func(*args)
+
+    return delayed
+
+
+class BenchmarkApp(BaseMicroscopeApp):
+
+    name = "sweep_throughput_benchmark"
+
+    def setup(self):
+        self.add_hardware(SimulonXYZStageHW(self))
+        self.add_hardware(Noiser200HW(self))
+        self.w_axis = SimulatedAxis()
+        stage = "hw/simulon_xyz_stage"
+        actuators = [
+            (
+                f"{ax}_position",
+                f"{stage}/{ax}_position",
+                f"{stage}/{ax}_target_position",
+            )
+            for ax in "xyz"
+        ]
+        actuators.append(("w_position", self.w_axis.read, self.w_axis.write))
+        for sweep in SWEEPS:
+            self.add_measurement(
+                sweep(
+                    self,
+                    actuators=actuators,
+                    collectors=[Noiser200Collector(self)],
+                    n_read_any_settings=0,
+                    n_any_measurements=0,
+                )
+            )
+
+    def connect_simulated_hardware(self, move_latency, read_latency, signal_latency):
+        """connects the hardware with the device calls delayed by the latencies"""
+        stage = self.hardware["simulon_xyz_stage"]
+        noiser = self.hardware["noiser_200"]
+        for hw in (stage, noiser):
+            hw.settings["connected"] = True
+        dev = stage.stage_device
+        for ax in "xyz":
+            stage.settings.get_lq(f"{ax}_target_position").connect_to_hardware(
+                write_func=with_latency(getattr(dev, f"write_{ax}"), move_latency)
+            )
+            stage.settings.get_lq(f"{ax}_position").connect_to_hardware(
+                read_func=with_latency(getattr(dev, f"read_{ax}"), read_latency)
+            )
+        noiser.signal.connect_to_hardware(
+            read_func=with_latency(noiser.dev.read_signal, signal_latency)
+        )
+
+
+def setup_sweep(m, n_points, settle_mode):
+    S = m.settings
+    m.setup_figure()
+    n = max(2, round(n_points ** (1 / m.ndim)))
+    for name, actuator in zip(m.actuator_names, ("x", "y", "z", "w")):
+        S[f"actuator_{name}"] = f"{actuator}_position"
+        S[f"range_{name}_min"] = 1
+        S[f"range_{name}_max"] = 2
+        S[f"range_{name}_num"] = n
+    S["scan_mode"] = "nested" if "nested" in m.sweep_modes else "NA"
+    S["collection_delay"] = 0
+    S["settle_mode"] = settle_mode
+    S["noiser200_repetitions"] = 1
+    S["plot_option"] = ""
+    return n**m.ndim
+
+
+def run_sweep(app, m, trace_memory):
+    """runs *m* like the GUI does and returns its duration and peak heap"""
+    if trace_memory:
+        tracemalloc.start()
+    t0 = time.perf_counter()
+    m.start()
+    while m.is_measuring():
+        if m.display_ready and not m.settings["plot_option"]:
+            m.settings["plot_option"] = "noiser200_signals_raw"
+        app.qtapp.processEvents()
+        time.sleep(0.001)
+    duration = time.perf_counter() - t0
+    peak = None
+    if trace_memory:
+        peak = tracemalloc.get_traced_memory()[1]
+        tracemalloc.stop()
+    return duration, peak
+
+
+def package_version():
+    try:
+        return metadata.version("ScopeFoundry")
+    except metadata.PackageNotFoundError:
+        return "unknown"
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    parser.add_argument("--points", type=int, default=N_POINTS, help="per sweep")
+    parser.add_argument("--move-latency", type=float, default=0.0, help="s")
+    parser.add_argument("--read-latency", type=float, default=0.0, help="s")
+    parser.add_argument("--signal-latency", type=float, default=0.0, help="s")
+    parser.add_argument("--settle-mode", default="delay")
+    parser.add_argument("--no-memory", action="store_true", help="skip tracemalloc")
+    parser.add_argument("--json", help="file to write the results to")
+    args = parser.parse_args(argv)
+
+    app = BenchmarkApp([])
+    app.connect_simulated_hardware(
+        args.move_latency, args.read_latency, args.signal_latency
+    )
+    results = []
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        app.settings["save_dir"] = tmp_dir
+        for sweep in SWEEPS:
+            m = app.measurements[sweep.name]
+            n_points = setup_sweep(m, args.points, args.settle_mode)
+            duration, peak = run_sweep(app, m, not args.no_memory)
+            result = {
+                "sweep": m.name,
+                "points": n_points,
+                "duration": duration,
+                "points_per_s": n_points / duration,
+                "phase_times": {p: m.phase_times[p] for p in SWEEP_PHASES},
+                "peak_memory": peak,
+            }
+            results.append(result)
+            phases = " ".join(
+                f"{p} {t * 1e3 / n_points:.3f}"
+                for p, t in result["phase_times"].items()
+            )
+            memory = f" peak {peak / 2**20:.1f} MiB" if peak is not None else ""
+            print(
+                f"{m.name:>9}: {n_points:>6} points {n_points / duration:8.1f} points/s"
+                f" | ms/point {phases}{memory}"
+            )
+        n_files = len(glob.glob(f"{tmp_dir}/*.h5"))
+    assert n_files == len(SWEEPS), "every sweep writes a file"
+
+    if args.json:
+        report = {
+            "benchmark": "sweep_throughput",
+            "scopefoundry": package_version(),
+            "python": platform.python_version(),
+            "numpy": np.__version__,
+            "platform": platform.platform(),
+            "time": time.strftime("%Y-%m-%dT%H:%M:%S"),
+            "config": vars(args),
+            "results": results,
+        }
+        with open(args.json, "w") as file:
+            json.dump(report, file, indent=2)
+    return results
+
+
+if __name__ == "__main__":
+    main()
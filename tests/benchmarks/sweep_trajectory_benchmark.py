@@ -0,0 +1,207 @@
+"""
+Benchmark of the sweep trajectories: the former nested python generators of
+sweep_2D_modes.py ... sweep_4D_modes.py (kept here as reference) vs. the
+numpy index arithmetic of ScopeFoundry.sweeping.sweep_modes.mk_trajectory
+
+    python -m ScopeFoundry.tests.benchmarks.sweep_trajectory_benchmark
+"""
+
+import time
+
+import numpy as np
+
+from ScopeFoundry.sweeping.sweep_2D_modes import SWEEP_MODES as MODES_2D
+from ScopeFoundry.sweeping.sweep_3D_modes import SWEEP_MODES as MODES_3D
+from ScopeFoundry.sweeping.sweep_4D_modes import SWEEP_MODES as MODES_4D
+from ScopeFoundry.sweeping.sweep_modes import mk_trajectory
+
+N_2D = 1000
+N_3D = 100
+N_4D = 32
+
+
+def legacy_positions_2d(ar_1, ar_2, mode="nested"):
+    if mode == "nested":
+        for k, kv in enumerate(ar_1):
+            for l, lv in enumerate(ar_2):
+                yield (kv, lv)
+
+    elif mode == "nested_swap_order":
+        for l, lv in enumerate(ar_2):
+            for k, kv in enumerate(ar_1):
+                yield (kv, lv)
+
+    elif mode == "co-move":
+        for l, lv in enumerate(ar_2):
+            yield (ar_1[l], ar_2[l])
+
+    elif mode == "serpentine":
+        for k, kv in enumerate(ar_1):
+            if k % 2 == 0:
+                for l, lv in enumerate(ar_2):
+                    yield (kv, lv)
+            else:
+                for l, lv in reversed(list(enumerate(ar_2))):
+                    yield (kv, lv)
+
+    elif mode == "serpentine_swap_order":
+        for l, lv in enumerate(ar_2):
+            if l % 2 == 0:
+                for k, kv in enumerate(ar_1):
+                    yield (kv, lv)
+            else:
+                for k, kv in reversed(list(enumerate(ar_1))):
+                    yield (kv, lv)
+
+
+def legacy_indices_2d(ar_1, ar_2, mode="nested"):
+    if mode == "nested":
+        for k, v in enumerate(ar_1):
+            for l, v in enumerate(ar_2):
+                yield k, l
+
+    elif mode == "nested_swap_order":
+        for l, lv in enumerate(ar_2):
+            for k, kv in enumerate(ar_1):
+                yield k, l
+
+    elif mode == "co-move":
+        for l, v in enumerate(ar_2):
+            yield 0, l
+
+    elif mode == "serpentine":
+        for k, v in enumerate(ar_1):
+            if k % 2 == 0:
+                for l, v in enumerate(ar_2):
+                    yield k, l
+            else:
+                for l, v in reversed(list(enumerate(ar_2))):
+                    yield k, l
+
+    elif mode == "serpentine_swap_order":
+        for l, v in enumerate(ar_2):
+            if l % 2 == 0:
+                for k, v in enumerate(ar_1):
+                    yield k, l
+            else:
+                for k, v in reversed(list(enumerate(ar_1))):
+                    yield k, l
+
+
+def legacy_positions_3d(ar_1, ar_2, ar_3, mode="nested"):
+    if mode == "nested":
+        for k, kv in enumerate(ar_1):
+            for l, lv in enumerate(ar_2):
+                for m, mv in enumerate(ar_3):
+                    yield (kv, lv, mv)
+
+    elif mode == "co-move":
+        for k, v in enumerate(ar_1):
+            yield (ar_1[k], ar_2[k], ar_3[k])
+
+    elif mode == "2,3_co-move":
+        for k, kv in enumerate(ar_1):
+            for l, lv in enumerate(ar_2):
+                yield (kv, ar_2[l], ar_3[l])
+
+    elif mode == "1,2_co-move":
+        for k, kv in enumerate(ar_1):
+            for m, mv in enumerate(ar_3):
+                yield (ar_1[k], ar_2[k], mv)
+
+
+def legacy_indices_3d(ar_1, ar_2, ar_3, mode="nested"):
+    if mode == "nested":
+        for k, v in enumerate(ar_1):
+            for l, v in enumerate(ar_2):
+                for m, v in enumerate(ar_3):
+                    yield k, l, m,
+
+    elif mode == "co-move":
+        for n, v in enumerate(ar_3):
+            yield 0, 0, n
+
+    elif mode == "2,3_co-move":
+        for k, v in enumerate(ar_1):
+            for m, v in enumerate(ar_3):
+                yield k, 0, m
+
+    elif mode == "1,2_co-move":
+        for l, v in enumerate(ar_2):
+            for m, v in enumerate(ar_3):
+                yield 0, l, m
+
+
+def legacy_positions_4d(ar_1, ar_2, ar_3, ar_4, mode="nested"):
+    if mode == "nested":
+        for k, kv in enumerate(ar_1):
+            for l, lv in enumerate(ar_2):
+                for m, mv in enumerate(ar_3):
+                    for n, nv in enumerate(ar_4):
+                        yield (kv, lv, mv, nv)
+
+    elif mode == "co-move":
+        for k, v in enumerate(ar_1):
+            yield (ar_1[k], ar_2[k], ar_3[k], ar_4[k])
+
+    elif mode == "1,2_nested_3,4_co-move":
+        for k, kv in enumerate(ar_1):
+            for l, lv in enumerate(ar_2):
+                for m, mv in enumerate(ar_3):
+                    yield (kv, lv, ar_3[m], ar_4[m])
+
+
+def legacy_indices_4d(ar_1, ar_2, ar_3, ar_4, mode="nested"):
+    if mode == "nested":
+        for k, v in enumerate(ar_1):
+            for l, v in enumerate(ar_2):
+                for m, v in enumerate(ar_3):
+                    for n, v in enumerate(ar_4):
+                        yield k, l, m, n
+
+    elif mode == "co-move":
+        for n, v in enumerate(ar_4):
+            yield 0, 0, 0, n
+
+    elif mode == "1,2_nested_3,4_co-move":
+        for k, v in enumerate(ar_1):
+            for l, v in enumerate(ar_2):
+                for n, v in enumerate(ar_4):
+                    yield k, l, 0, n
+
+
+LEGACY = {
+    2: (legacy_positions_2d, legacy_indices_2d, MODES_2D),
+    3: (legacy_positions_3d, legacy_indices_3d, MODES_3D),
+    4: (legacy_positions_4d, legacy_indices_4d, MODES_4D),
+}
+
+
+def legacy_trajectory(arrays, mode):
+    positions_gen, indices_gen, _ = LEGACY[len(arrays)]
+    positions = list(positions_gen(*arrays, mode=mode))
+    indices = list(indices_gen(*arrays, mode=mode))
+    return positions, indices
+
+
+def timed(func, *args):
+    t0 = time.perf_counter()
+    result = func(*args)
+    return result, time.perf_counter() - t0
+
+
+def main(n_2d=N_2D, n_3d=N_3D, n_4d=N_4D):
+    for ndim, n in ((2, n_2d), (3, n_3d), (4, n_4d)):
+        arrays = [np.linspace(0.0, 1.0, n)] * ndim
+        for name, mode in LEGACY[ndim][2].items():
+            (positions, _), t_legacy = timed(legacy_trajectory, arrays, name)
+            _, t_new = timed(mk_trajectory, arrays, mode)
+            print(
+                f"{ndim}D {name:>24}: {len(positions):>11,} points "
+                f"legacy {t_legacy:7.3f} s numpy {t_new:7.4f} s "
+                f"({t_legacy / t_new:,.0f}x)"
+            )
+
+
+if __name__ == "__main__":
+    main()
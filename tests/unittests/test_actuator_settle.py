@@ -0,0 +1,262 @@
+import threading
+import time
+import unittest
+
+import numpy as np
+
+from ScopeFoundry import BaseMicroscopeApp, HardwareComponent
+from ScopeFoundry.logged_quantity.collection import LQCollection
+from ScopeFoundry.scanning.actuators import (
+    ActuatorMover,
+    LQReadBack,
+    SettleCondition,
+    actuator_owner,
+    get_actuator_funcs,
+    no_read,
+    parse_definitions,
+    wait_settled,
+)
+from ScopeFoundry.sweeping.utils import mk_actuator_mover, setup_settle_settings
+
+
+class SlowStage:
+    """approaches the written target exponentially with time constant *tau*"""
+
+    def __init__(self, tau, noise=0.0):
+        self.tau = tau
+        self.noise = noise
+        self.start = 0.0
+        self.target = 0.0
+        self.t_write = time.perf_counter()
+        self.threads = set()
+
+    def write(self, position):
+        self.threads.add(threading.get_ident())
+        self.start = self.read()
+        self.target = position
+        self.t_write = time.perf_counter()
+
+    def read(self):
+        dt = time.perf_counter() - self.t_write
+        x = self.target + (self.start - self.target) * np.exp(-dt / self.tau)
+        return x + self.noise * np.random.uniform(-1, 1)
+
+    @property
+    def funcs(self):
+        return self.read, self.write
+
+
+class WaitSettledTest(unittest.TestCase):
+
+    def test_tolerance(self):
+        stage = SlowStage(tau=0.01)
+        stage.write(1.0)
+        condition = SettleCondition("tolerance", tolerance=0.01, timeout=1.0)
+        elapsed, value, settled = wait_settled(stage.read, 1.0, condition)
+        self.assertTrue(settled)
+        self.assertAlmostEqual(value, 1.0, delta=0.01)
+        # exp(-t/tau) < 0.01 needs t > 4.6 tau
+        self.assertGreater(elapsed, 0.04)
+        self.assertLess(elapsed, 0.5)
+
+    def test_stable(self):
+        # stable mode does not need the target, a noisy stage settles on the
+        # spread of the last reads
+        stage = SlowStage(tau=0.01, noise=1e-4)
+        stage.write(1.0)
+        condition = SettleCondition("stable", tolerance=1e-3, n_stable=5)
+        elapsed, value, settled = wait_settled(stage.read, np.nan, condition)
+        self.assertTrue(settled)
+        self.assertAlmostEqual(value, 1.0, delta=0.01)
+
+    def test_timeout(self):
+        stage = SlowStage(tau=10.0)
+        stage.write(1.0)
+        condition = SettleCondition("tolerance", tolerance=1e-3, timeout=0.05)
+        elapsed, value, settled = wait_settled(stage.read, 1.0, condition)
+        self.assertFalse(settled)
+        self.assertGreaterEqual(elapsed, 0.05)
+        self.assertLess(elapsed, 0.5)
+
+
+class ActuatorMoverTest(unittest.TestCase):
+
+    def test_concurrent_moves(self):
+        stages = [SlowStage(tau=0.02) for _ in range(3)]
+        condition = SettleCondition("tolerance", tolerance=0.01)
+        mover = ActuatorMover([s.funcs for s in stages], [condition] * 3)
+        try:
+            t0 = time.perf_counter()
+            settle_times, settled = mover.move([1.0, 2.0, 3.0])
+            duration = time.perf_counter() - t0
+        finally:
+            mover.shutdown()
+        self.assertTrue(settled.all())
+        self.assertEqual(settle_times.shape, (3,))
+        # each stage takes > 4.6 tau = 0.09 s (0.11 s for a 3 step), they
+        # settle in parallel
+        self.assertLess(duration, settle_times.sum())
+        self.assertAlmostEqual(duration, settle_times.max(), delta=0.05)
+        self.assertEqual(len(set.union(*(s.threads for s in stages))), 3)
+
+    def test_sequential_moves(self):
+        stages = [SlowStage(tau=0.01) for _ in range(2)]
+        condition = SettleCondition("tolerance", tolerance=0.01)
+        mover = ActuatorMover(
+            [s.funcs for s in stages], [condition] * 2, concurrent=False
+        )
+        settle_times, settled = mover.move([1.0, 1.0])
+        self.assertTrue(settled.all())
+        self.assertEqual(
+            set.union(*(s.threads for s in stages)), {threading.get_ident()}
+        )
+
+    def test_delay_counted_once(self):
+        written = []
+        funcs = [(no_read, written.append), (no_read, written.append)]
+        for concurrent in (True, False):
+            mover = ActuatorMover(
+                funcs, [SettleCondition()] * 2, delay=0.05, concurrent=concurrent
+            )
+            t0 = time.perf_counter()
+            settle_times, settled = mover.move([1.0, 2.0])
+            duration = time.perf_counter() - t0
+            mover.shutdown()
+            self.assertLess(duration, 0.09)
+            self.assertFalse(settled.any())
+            np.testing.assert_array_less(0.05 - 1e-9, settle_times)
+        self.assertEqual(sorted(written), [1.0, 1.0, 2.0, 2.0])
+
+    def test_delay_after_writes(self):
+        def blocking_write(position):
+            time.sleep(0.05)
+
+        mover = ActuatorMover([(no_read, blocking_write)], [SettleCondition()], 0.05)
+        t0 = time.perf_counter()
+        settle_times, _ = mover.move([1.0])
+        self.assertGreaterEqual(time.perf_counter() - t0, 0.1)
+        self.assertAlmostEqual(mover.write_time, 0.05, delta=0.03)
+
+    def test_owners_move_sequentially(self):
+        # x and y of one stage share a connection, z has its own
+        stages = [SlowStage(tau=0.01) for _ in range(3)]
+        active = []
+        overlaps = []
+
+        def guarded(stage, name):
+            def write(position):
+                overlaps.append(bool(active))
+                active.append(name)
+                time.sleep(0.02)
+                stage.write(position)
+                active.remove(name)
+
+            return stage.read, write
+
+        funcs = [guarded(s, n) for s, n in zip(stages, ("x", "y", "z"))]
+        condition = SettleCondition("tolerance", tolerance=0.01)
+        mover = ActuatorMover(
+            funcs[:2], [condition] * 2, owners=["hw/stage", "hw/stage"]
+        )
+        try:
+            settle_times, settled = mover.move([1.0, 2.0])
+        finally:
+            mover.shutdown()
+        self.assertTrue(settled.all())
+        self.assertEqual(overlaps, [False, False])
+        self.assertEqual(stages[0].threads, stages[1].threads)
+
+        mover = ActuatorMover(funcs, [condition] * 3, owners=["a", "a", "b"])
+        try:
+            mover.move([0.0, 0.0, 1.0])
+        finally:
+            mover.shutdown()
+        # z is written while x or y are
+        self.assertTrue(any(overlaps[2:]))
+
+    def test_actuator_owner(self):
+        stage = SlowStage(tau=0.01)
+        self.assertEqual(actuator_owner("hw/stage/x_target"), "hw/stage")
+        self.assertEqual(actuator_owner("app/save_dir"), "app")
+        self.assertIs(actuator_owner(stage.write), stage)
+        self.assertIs(actuator_owner(print), print)
+
+
+class StageHW(HardwareComponent):
+    name = "stage"
+
+    def setup(self):
+        self.settings.New("x_target", initial=0.0)
+        self.stage = SlowStage(tau=0.02)
+
+    def connect(self):
+        self.settings.x_target.connect_to_hardware(
+            read_func=self.stage.read, write_func=self.stage.write
+        )
+
+    def disconnect(self):
+        self.settings.disconnect_all_from_hardware()
+
+
+class PathActuatorTest(unittest.TestCase):
+
+    @classmethod
+    def setUpClass(cls):
+        cls.app = BaseMicroscopeApp([])
+        cls.hw = cls.app.add_hardware(StageHW(cls.app))
+
+    def setUp(self):
+        self.settings = LQCollection()
+        self.settings.New("collection_delay", initial=0.0)
+        setup_settle_settings(self.settings, ["x"])
+        self.settings["settle_mode"] = "tolerance"
+        self.settings["settle_tolerance_x"] = 0.01
+        defs = parse_definitions(["hw/stage/x_target"])
+        (self.funcs,) = get_actuator_funcs(self.app, defs).values()
+
+    def tearDown(self):
+        self.hw.settings["connected"] = False
+
+    def test_reads_back_connected_lq(self):
+        self.assertIsInstance(self.funcs[0], LQReadBack)
+        self.hw.settings["connected"] = True
+        mover = mk_actuator_mover(self.settings, ["x"], [self.funcs])
+        try:
+            settle_times, settled = mover.move([1.0])
+        finally:
+            mover.shutdown()
+        self.assertTrue(settled.all())
+        # exp(-t/tau) < 0.01 needs t > 4.6 tau
+        self.assertGreater(settle_times[0], 0.08)
+        self.assertAlmostEqual(self.hw.stage.read(), 1.0, delta=0.01)
+
+    def test_warns_without_read_back(self):
+        with self.assertWarns(UserWarning):
+            mover = mk_actuator_mover(self.settings, ["x"], [self.funcs])
+        try:
+            settle_times, settled = mover.move([1.0])
+        finally:
+            mover.shutdown()
+        # falls back to the delay, 0 here
+        self.assertLess(settle_times[0], 0.02)
+        self.assertFalse(settled[0])
+
+
+class SettleSettingsTest(unittest.TestCase):
+
+    def test_mk_actuator_mover(self):
+        settings = LQCollection()
+        settings.New("collection_delay", initial=0.2)
+        setup_settle_settings(settings, ["x", "y"])
+        settings["settle_mode"] = "stable"
+        settings["settle_tolerance_y"] = 0.5
+        stage = SlowStage(tau=0.01)
+        mover = mk_actuator_mover(settings, ["x", "y"], [stage.funcs] * 2)
+        mover.shutdown()
+        self.assertEqual(mover.delay, 0.2)
+        self.assertEqual([c.mode for c in mover.conditions], ["stable"] * 2)
+        self.assertEqual([c.tolerance for c in mover.conditions], [0.01, 0.5])
+
+
+if __name__ == "__main__":
+    unittest.main()
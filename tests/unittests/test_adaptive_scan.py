@@ -0,0 +1,99 @@
+import tempfile
+import unittest
+
+import h5py
+import numpy as np
+
+from ScopeFoundry import BaseMicroscopeApp
+from ScopeFoundry.scanning import BaseRaster2DSlowScan
+from ScopeFoundry.scanning.adaptive_scan import (
+    coarse_grid,
+    fill_unmeasured,
+    refinement_points,
+)
+
+
+def disk(Nv, Nh):
+    jj, ii = np.mgrid[:Nv, :Nh]
+    return ((jj - 30) ** 2 + (ii - 25) ** 2 < 150).astype(float)
+
+
+class AdaptiveSamplingTest(unittest.TestCase):
+
+    def test_coarse_grid(self):
+        points = coarse_grid((5, 6), 4)
+        self.assertEqual(
+            points.tolist(), [[0, 0], [0, 4], [0, 5], [4, 5], [4, 4], [4, 0]]
+        )
+
+    def test_fill_unmeasured(self):
+        image = np.array([[1.0, np.nan, 2.0], [np.nan] * 3, [3.0, np.nan, np.nan]])
+        filled = fill_unmeasured(image, np.isfinite(image))
+        np.testing.assert_array_equal(filled, [[1, 1, 2], [1, 1, 2], [3, 3, 3]])
+
+    def test_refinement_only_in_important_blocks(self):
+        measured = np.zeros((8, 8), dtype=bool)
+        measured[coarse_grid((8, 8), 4)[:, 0], coarse_grid((8, 8), 4)[:, 1]] = True
+        importance = np.zeros((8, 8))
+        importance[1, 6] = 1.0
+        points = refinement_points(measured, importance, 4, 0.5)
+        self.assertEqual(points.tolist(), [[0, 6], [2, 6], [2, 4]])
+
+
+class DiskScan(BaseRaster2DSlowScan):
+    name = "disk_scan"
+
+    def pre_scan_setup(self):
+        self.truth = disk(*self.scan_shape[1:])
+
+    def move_position_start(self, h, v):
+        pass
+
+    def collect_pixel(self, pixel_num, k, j, i):
+        self.display_image_map[k, j, i] = self.truth[j, i]
+
+    def post_scan_cleanup(self):
+        pass
+
+
+class AdaptiveScanTest(unittest.TestCase):
+
+    def setUp(self):
+        self.tmp_dir = tempfile.TemporaryDirectory()
+        self.app = BaseMicroscopeApp([])
+        self.app.settings["save_dir"] = self.tmp_dir.name
+
+    def tearDown(self):
+        self.tmp_dir.cleanup()
+
+    def test_adaptive_scan(self):
+        m = self.app.add_measurement(DiskScan(self.app))
+        S = m.settings
+        S["Nh"], S["Nv"] = 64, 64
+        S["adaptive_scan"] = True
+        S["adaptive_coarse_step"] = 8
+        m._thread_run()
+
+        measured = np.isfinite(m.display_image_map[0])
+        self.assertLess(measured.mean(), 0.2)
+        np.testing.assert_array_equal(
+            fill_unmeasured(m.display_image_map[0], measured), m.truth
+        )
+        with h5py.File(m.h5_filename, "r") as file:
+            H = file["measurement/disk_scan"]
+            samples = H["adaptive_samples"][:]
+            self.assertAlmostEqual(H.attrs["adaptive_fraction"], measured.mean())
+            np.testing.assert_array_equal(H["pixel_time"][0] > 0, measured)
+            np.testing.assert_array_equal(
+                H["display_image_map"][0], m.display_image_map[0]
+            )
+        self.assertEqual(len(samples), measured.sum())
+        np.testing.assert_array_equal(
+            samples["value"], m.truth[samples["j"], samples["i"]]
+        )
+        np.testing.assert_array_equal(samples["h"], m.h_array[samples["i"]])
+        self.assertEqual(samples["level"].max(), 3)
+
+
+if __name__ == "__main__":
+    unittest.main()
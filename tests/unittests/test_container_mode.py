@@ -0,0 +1,111 @@
+import glob
+import tempfile
+import time
+import unittest
+
+import h5py
+import numpy as np
+
+from ScopeFoundry import BaseMicroscopeApp, Measurement
+from ScopeFoundry.sweeping import SweepND
+
+
+class Snapshot(Measurement):
+    """saves its counts to a file of its own, or to the container"""
+
+    name = "snapshot"
+
+    def setup(self):
+        self.files = []
+
+    def run(self):
+        self.open_new_h5_file()
+        counts = np.arange(4) + len(self.files)
+        self.h5_meas_group.create_dataset("counts", data=counts)
+        self.files.append(self.h5_file.filename)
+        self.close_h5_file()
+        if self.h5_container is not None:
+            # the shared file stays open and writable
+            self.h5_container.attrs["written_after_close"] = bool(self.h5_file)
+        self.data = {}
+
+
+class ContainerModeTest(unittest.TestCase):
+
+    @classmethod
+    def setUpClass(cls):
+        cls.app = BaseMicroscopeApp([])
+        cls.snapshot = cls.app.add_measurement(Snapshot(cls.app))
+        cls.position = {"a": 0.0}
+        cls.m = cls.app.add_measurement(
+            SweepND(
+                cls.app,
+                actuators=[
+                    (
+                        "a",
+                        lambda: cls.position["a"],
+                        lambda x: cls.position.__setitem__("a", x),
+                    )
+                ],
+                actuator_names="x",
+                n_read_any_settings=0,
+                n_any_measurements=1,
+            )
+        )
+        cls.m.setup_figure()
+        S = cls.m.settings
+        S["actuator_x"] = "a"
+        S["range_x_num"] = 3
+        S["collection_delay"] = 0
+        S["any_measurement_0"] = "snapshot"
+        S["any_measurement_0_repetitions"] = 1
+        S["container_mode"] = True
+        S["res_in_new_dir"] = False
+
+    def setUp(self):
+        self.tmp_dir = tempfile.TemporaryDirectory()
+        self.app.settings["save_dir"] = self.tmp_dir.name
+        self.snapshot.files = []
+
+    def tearDown(self):
+        self.tmp_dir.cleanup()
+
+    def run_sweep(self, in_thread):
+        self.m.settings["any_measurement_0_in_thread"] = in_thread
+        if in_thread:
+            self.m._thread_run()
+            return
+        # the nested measurements need the event loop to finish
+        self.m.start()
+        while self.m.is_measuring():
+            self.app.qtapp.processEvents()
+            time.sleep(0.001)
+        self.app.qtapp.processEvents()
+
+    def check_sweep_file(self):
+        # a single file, the nested runs did not close it
+        (fname,) = glob.glob(f"{self.tmp_dir.name}/*.h5")
+        self.assertEqual(self.snapshot.files, [fname] * 3)
+        with h5py.File(fname, "r") as file:
+            for index in range(3):
+                point = file[f"points/{index}"]
+                self.assertTrue(point.attrs["written_after_close"])
+                group = point["measurement/snapshot"]
+                np.testing.assert_array_equal(group["counts"][()], np.arange(4) + index)
+                self.assertIn("unique_id", group.attrs)
+            # written by the sweep after the nested runs
+            H = file[f"measurement/{self.m.name}"]
+            np.testing.assert_array_equal(H["indices"][:, 0], np.arange(3))
+        self.assertIsNone(self.snapshot.h5_container)
+
+    def test_in_thread(self):
+        self.run_sweep(in_thread=True)
+        self.check_sweep_file()
+
+    def test_nested_thread(self):
+        self.run_sweep(in_thread=False)
+        self.check_sweep_file()
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,103 @@
+import tempfile
+import threading
+import time
+import unittest
+
+import h5py
+import numpy as np
+
+from ScopeFoundry import BaseMicroscopeApp
+from ScopeFoundry.scanning import BaseRaster2DSlowScan
+from ScopeFoundry.scanning.detector_reads import DetectorPool
+
+
+def sleeper(latency, value):
+    def read():
+        time.sleep(latency)
+        return value
+
+    return read
+
+
+class DetectorPoolTest(unittest.TestCase):
+
+    def test_reads_concurrently(self):
+        pool = DetectorPool()
+        pool.add("a", sleeper(0.05, 1.0))
+        pool.add("b", sleeper(0.05, np.arange(3)), shape=(3,))
+        pool.add("c", sleeper(0.02, 2.0))
+        pool.start()
+        try:
+            t0 = time.perf_counter()
+            values, latencies = pool.read_all()
+            duration = time.perf_counter() - t0
+        finally:
+            pool.shutdown()
+        self.assertEqual(values["a"], 1.0)
+        np.testing.assert_array_equal(values["b"], np.arange(3))
+        self.assertGreaterEqual(latencies["a"], 0.05)
+        self.assertLess(latencies["c"], latencies["a"])
+        self.assertLess(duration, 0.1)
+
+    def test_read_error_is_raised(self):
+        pool = DetectorPool()
+        pool.add("ok", sleeper(0, 1.0))
+        pool.add("bad", lambda: 1 / 0)
+        pool.start()
+        try:
+            with self.assertRaises(ZeroDivisionError):
+                pool.read_all()
+        finally:
+            pool.shutdown()
+
+
+class MultiDetectorScan(BaseRaster2DSlowScan):
+    name = "multi_detector_scan"
+
+    def pre_scan_setup(self):
+        self.threads = set()
+        self.add_detector("counter", self.read_counter)
+        self.add_detector("spectrum", sleeper(0.01, np.ones(4)), shape=(4,))
+        self.add_detector("power", sleeper(0.01, 0.5))
+
+    def read_counter(self):
+        self.threads.add(threading.get_ident())
+        time.sleep(0.01)
+        return self.pixel_i
+
+    def move_position_start(self, h, v):
+        pass
+
+    def post_scan_cleanup(self):
+        pass
+
+
+class MultiDetectorScanTest(unittest.TestCase):
+
+    def setUp(self):
+        self.tmp_dir = tempfile.TemporaryDirectory()
+        self.app = BaseMicroscopeApp([])
+        self.app.settings["save_dir"] = self.tmp_dir.name
+
+    def tearDown(self):
+        self.tmp_dir.cleanup()
+
+    def test_detector_datasets(self):
+        m = self.app.add_measurement(MultiDetectorScan(self.app))
+        m.settings["Nh"] = 4
+        m.settings["Nv"] = 3
+        m._thread_run()
+
+        self.assertNotIn(threading.get_ident(), m.threads)
+        expected = np.arange(12.0).reshape(1, 3, 4)
+        np.testing.assert_array_equal(m.display_image_map, expected)
+        with h5py.File(m.h5_filename, "r") as file:
+            H = file["measurement/multi_detector_scan"]
+            np.testing.assert_array_equal(H["counter"][:], expected)
+            self.assertEqual(H["spectrum"].shape, (1, 3, 4, 4))
+            np.testing.assert_array_equal(H["power"][:], 0.5)
+            self.assertTrue((H["power_latency"][:] >= 0.01).all())
+
+
+if __name__ == "__main__":
+    unittest.main()
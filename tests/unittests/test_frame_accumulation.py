@@ -0,0 +1,114 @@
+import glob
+import os
+import tempfile
+import unittest
+
+import h5py
+import numpy as np
+
+from ScopeFoundry import BaseMicroscopeApp
+from ScopeFoundry.running_stats import RunningStats
+from ScopeFoundry.scanning import BaseRaster2DFrameSlowScan
+
+
+class RunningStatsTest(unittest.TestCase):
+
+    def test_matches_numpy(self):
+        samples = np.random.default_rng(0).normal(3.0, 2.0, (50, 4, 5))
+        stats = RunningStats((4, 5))
+        for sample in samples:
+            for j in range(4):
+                stats.add((j, slice(None)), sample[j])
+        np.testing.assert_allclose(stats.mean, samples.mean(axis=0))
+        np.testing.assert_allclose(stats.variance, samples.var(axis=0, ddof=1))
+        np.testing.assert_array_equal(stats.min, samples.min(axis=0))
+        np.testing.assert_array_equal(stats.max, samples.max(axis=0))
+        np.testing.assert_array_equal(stats.count, 50)
+
+    def test_variance_needs_two_samples(self):
+        stats = RunningStats((2,))
+        stats.add(0, 1.0)
+        self.assertTrue(np.isnan(stats.variance).all())
+
+
+class NoisyFrameScan(BaseRaster2DFrameSlowScan):
+    name = "noisy_frame_scan"
+
+    def pre_scan_setup(self):
+        self.rng = np.random.default_rng(1)
+        self.frames = []
+        self.data_h5 = self.create_h5_framed_dataset("data", self.display_image_map)
+
+    def on_new_frame(self, frame_i):
+        self.frames.append(np.zeros(self.scan_shape))
+        self.extend_h5_framed_dataset(self.data_h5, frame_i)
+
+    def move_position_start(self, x, y):
+        pass
+
+    move_position_slow = move_position_fast = lambda self, x, y, dx, dy: None
+
+    def collect_pixel(self, pixel_num, frame_i, k, j, i):
+        value = self.rng.normal(j, 1.0)
+        self.frames[frame_i][k, j, i] = value
+        self.display_image_map[k, j, i] = value
+        self.data_h5[frame_i, k, j, i] = value
+
+    def post_scan_cleanup(self):
+        pass
+
+
+class FrameAccumulationTest(unittest.TestCase):
+
+    def setUp(self):
+        self.tmp_dir = tempfile.TemporaryDirectory()
+        self.app = BaseMicroscopeApp([])
+        self.app.settings["save_dir"] = self.tmp_dir.name
+        self.m = self.app.add_measurement(NoisyFrameScan(self.app))
+        self.m.settings["Nh"] = 4
+        self.m.settings["Nv"] = 3
+        self.m.settings["n_frames"] = 7
+
+    def tearDown(self):
+        self.tmp_dir.cleanup()
+
+    def h5_filename(self):
+        (fname,) = glob.glob(os.path.join(self.tmp_dir.name, "*.h5"))
+        return fname
+
+    def test_accumulate_frames(self):
+        self.m.settings["accumulate_frames"] = True
+        self.m.settings["raw_frame_interval"] = 3
+        self.m._thread_run()
+
+        frames = np.array(self.m.frames)
+        with h5py.File(self.h5_filename(), "r") as file:
+            H = file["measurement/noisy_frame_scan"]
+            np.testing.assert_allclose(H["data_mean"][:], frames.mean(axis=0))
+            np.testing.assert_allclose(
+                H["data_variance"][:], frames.var(axis=0, ddof=1)
+            )
+            np.testing.assert_array_equal(H["data_min"][:], frames.min(axis=0))
+            np.testing.assert_array_equal(H["data_max"][:], frames.max(axis=0))
+            np.testing.assert_array_equal(H["data_count"][:], 7)
+            np.testing.assert_array_equal(H["data_frame_index"][:], [0, 3, 6])
+            np.testing.assert_array_equal(H["data"][:], frames[[0, 3, 6]])
+            # the raw time stamps of every frame
+            self.assertNotIn("pixel_times_count", H)
+            pixel_times = H["pixel_times"][:]
+            self.assertEqual(pixel_times.shape, frames.shape)
+            self.assertTrue((pixel_times > 0).all())
+            frame_starts = pixel_times.reshape(7, -1).min(axis=1)
+            self.assertTrue((np.diff(frame_starts) > 0).all())
+
+    def test_stores_all_frames_by_default(self):
+        self.m._thread_run()
+
+        with h5py.File(self.h5_filename(), "r") as file:
+            H = file["measurement/noisy_frame_scan"]
+            np.testing.assert_array_equal(H["data"][:], np.array(self.m.frames))
+            self.assertNotIn("data_mean", H)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,78 @@
+import os
+import tempfile
+import unittest
+from pathlib import Path
+
+import h5py
+import numpy as np
+
+from ScopeFoundry.generate_loaders_py import find_h5_files, get_dset_names
+from ScopeFoundry.h5_catalog import CATALOG_FNAME, H5Catalog
+
+
+def new_file(fname, mm_name, time_id, **settings):
+    with h5py.File(fname, "w") as file:
+        file.attrs["time_id"] = time_id
+        file.attrs["unique_id"] = f"uid{time_id}"
+        file.create_group("app/settings").attrs["sample"] = "s1"
+        m = file.create_group(f"measurement/{mm_name}")
+        m.create_group("settings").attrs.update(settings)
+        m["counts"] = np.zeros((3, 4))
+
+
+class H5CatalogTest(unittest.TestCase):
+
+    def setUp(self):
+        self.tmp_dir = tempfile.TemporaryDirectory()
+        self.root = Path(self.tmp_dir.name)
+        (self.root / "sub").mkdir()
+        new_file(self.root / "a.h5", "m1", 100, exposure=0.1)
+        new_file(self.root / "sub" / "b.h5", "m2", 200, exposure=0.2)
+        self.catalog = H5Catalog(self.root)
+
+    def tearDown(self):
+        self.tmp_dir.cleanup()
+
+    def test_rescan_is_incremental(self):
+        self.assertEqual(self.catalog.rescan(), 2)
+        self.assertEqual(self.catalog.rescan(), 0)
+        new_file(self.root / "c.h5", "m1", 300, exposure=0.3)
+        self.assertEqual(self.catalog.rescan(), 1)
+        os.remove(self.root / "a.h5")
+        self.catalog.rescan()
+        self.assertEqual(len(self.catalog.search()), 2)
+
+    def test_search(self):
+        self.catalog.rescan()
+        results = self.catalog.search()
+        self.assertEqual([r["time_id"] for r in results], [200, 100])
+        self.assertEqual(results[0]["path"], self.root / "sub" / "b.h5")
+        self.assertEqual(results[0]["unique_id"], "uid200")
+
+        self.assertEqual(len(self.catalog.search(measurement="m1")), 1)
+        self.assertEqual(len(self.catalog.search(text="M2")), 1)
+        self.assertEqual(len(self.catalog.search(since=150)), 1)
+        found = self.catalog.search(settings={"measurement/*/exposure": 0.2})
+        self.assertEqual([r["measurement"] for r in found], ["m2"])
+
+        dsets = self.catalog.datasets(self.root / "a.h5")
+        self.assertEqual(dsets["measurement/m1/counts"], ("(3, 4)", "float64"))
+        settings = self.catalog.settings(self.root / "a.h5")
+        self.assertEqual(settings["app/sample"], "s1")
+
+    def test_find(self):
+        self.assertIsNone(H5Catalog.find(self.root.parent))
+        catalog = H5Catalog.find(self.root / "sub")
+        self.assertEqual(catalog.root, self.root.absolute())
+        self.assertTrue((self.root / CATALOG_FNAME).is_file())
+
+    def test_loaders_use_catalog(self):
+        files = find_h5_files(self.root)
+        self.assertEqual([mm for _, mm in files], ["m1", "m2"])
+        self.assertEqual(
+            get_dset_names(self.root), {"m1": {"counts"}, "m2": {"counts"}}
+        )
+
+
+if __name__ == "__main__":
+    unittest.main()
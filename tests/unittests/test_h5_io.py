@@ -0,0 +1,180 @@
+import tempfile
+import unittest
+from pathlib import Path
+
+import h5py
+import numpy as np
+
+from ScopeFoundry import BaseMicroscopeApp, HardwareComponent, h5_io
+
+
+class Hardware1(HardwareComponent):
+    name = "hardware1"
+
+    def setup(self):
+        self.settings.New("float", float, initial=1.0, unit="V")
+        self.settings.New("string", str, initial="0")
+
+
+class SettingsSnapshotTest(unittest.TestCase):
+
+    def setUp(self):
+        self.app = BaseMicroscopeApp([])
+        self.hw = self.app.add_hardware(Hardware1(self.app))
+        self.tmp_dir = tempfile.TemporaryDirectory()
+        self.root = Path(self.tmp_dir.name)
+        self.app.settings["save_dir"] = self.root.as_posix()
+        self.app.settings["settings_snapshots"] = True
+
+    def tearDown(self):
+        self.tmp_dir.cleanup()
+
+    def new_file(self, fname):
+        with h5_io.h5_base_file(self.app, fname=str(self.root / fname)):
+            pass
+        return self.root / fname
+
+    def test_unchanged_settings_stored_once(self):
+        f1 = self.new_file("a.h5")
+        f2 = self.new_file("b.h5")
+        self.hw.settings["float"] = 2.0
+        f3 = self.new_file("c.h5")
+
+        with h5py.File(self.root / h5_io.SETTINGS_SNAPSHOT_STORE_FNAME, "r") as store:
+            # app + hardware1, plus changed hardware1
+            self.assertEqual(len(store["snapshots"]), 3)
+
+        with h5py.File(f1, "r") as a, h5py.File(f2, "r") as b, h5py.File(f3, "r") as c:
+            hw_a = a["hardware/hardware1"].attrs["settings_snapshot"]
+            self.assertEqual(hw_a, b["hardware/hardware1"].attrs["settings_snapshot"])
+            self.assertNotEqual(
+                hw_a, c["hardware/hardware1"].attrs["settings_snapshot"]
+            )
+            # external link resolves
+            self.assertEqual(c["hardware/hardware1/settings"].attrs["float"], 2.0)
+
+    def test_hash_includes_shape_and_dtype(self):
+        settings = self.hw.settings
+        lq = settings.New("array", dtype=float, is_array=True, initial=np.zeros((2, 3)))
+        hashes = set()
+        for value in (
+            np.arange(6.0).reshape(2, 3),
+            np.arange(6.0).reshape(3, 2),
+            np.arange(6, dtype=np.int64).reshape(2, 3),
+            np.arange(6, dtype=np.int64).reshape(2, 3).view(np.float64),
+        ):
+            lq.val = value
+            hashes.add(h5_io.lqcoll_snapshot_hash(settings))
+        self.assertEqual(len(hashes), 4)
+
+    def test_recreated_store(self):
+        self.new_file("a.h5")
+        store_path = self.root / h5_io.SETTINGS_SNAPSHOT_STORE_FNAME
+        recreate = (store_path.unlink, lambda: h5py.File(store_path, "w").close())
+        for fname, func in zip(("b.h5", "c.h5"), recreate):
+            func()
+            # the snapshots are stored again, not taken from the cache
+            settings = h5_io.load_settings(self.new_file(fname))
+            self.assertEqual(settings["hardware/hardware1/float"], 1.0)
+            with h5py.File(store_path, "r") as store:
+                self.assertEqual(len(store["snapshots"]), 2)
+
+    def test_load_settings_resolves_snapshots(self):
+        self.new_file("a.h5")
+        self.hw.settings["float"] = 3.0
+        settings = h5_io.load_settings(self.new_file("b.h5"))
+        self.assertEqual(settings["hardware/hardware1/float"], 3.0)
+        self.assertEqual(settings["hardware/hardware1/string"], "0")
+        self.assertIn("app/save_dir", settings)
+
+
+class GrowingH5DatasetTest(unittest.TestCase):
+
+    def setUp(self):
+        self.tmp_dir = tempfile.TemporaryDirectory()
+        self.h5_file = h5py.File(Path(self.tmp_dir.name) / "growing.h5", "w")
+
+    def tearDown(self):
+        self.h5_file.close()
+        self.tmp_dir.cleanup()
+
+    def test_append_and_trim(self):
+        ds = h5_io.GrowingH5Dataset(
+            self.h5_file, "d", (0, 3), dtype=int, initial_capacity=4, buffer_size=5
+        )
+        for i in range(23):
+            ds.append([i, i, i])
+        ds.extend(np.ones((2, 3)))
+        self.assertEqual(len(ds), 25)
+        self.assertGreaterEqual(ds.capacity, 25)
+        ds.close()
+        self.assertEqual(ds.dset.shape, (25, 3))
+        self.assertEqual(ds.dset.attrs["logical_length"], 25)
+        np.testing.assert_array_equal(ds.dset[:23, 0], np.arange(23))
+
+    def test_axis(self):
+        ds = h5_io.GrowingH5Dataset(self.h5_file, "d", (2, 0), axis=1, dtype=float)
+        ds.append([1.0, 2.0])
+        ds.append([3.0, 4.0])
+        ds.close()
+        np.testing.assert_array_equal(ds.dset[:], [[1.0, 3.0], [2.0, 4.0]])
+
+    def test_async_write(self):
+        writer = h5_io.AsyncH5Writer()
+        ds = h5_io.GrowingH5Dataset(
+            self.h5_file, "d", (0, 2), dtype=int, buffer_size=4, write=writer.write
+        )
+        for i in range(10):
+            ds.append([i, -i])
+        # the buffer is reused while blocks are queued
+        writer.flush()
+        np.testing.assert_array_equal(ds.dset[:8, 0], np.arange(8))
+        ds.flush()
+        writer.close()
+        ds.close()
+        np.testing.assert_array_equal(ds.dset[:, 1], -np.arange(10))
+
+
+class VirtualIndexTest(unittest.TestCase):
+
+    def setUp(self):
+        self.tmp_dir = tempfile.TemporaryDirectory()
+        self.root = Path(self.tmp_dir.name)
+        for k in range(5):
+            with h5py.File(self.root / f"{k}_m.h5", "w") as file:
+                file.attrs["time_id"] = 100 + k
+                file["measurement/m/counts"] = np.full(4, k, dtype=float)
+
+    def tearDown(self):
+        self.tmp_dir.cleanup()
+
+    def test_stitch_files(self):
+        fname = h5_io.h5_stitch_run_dir(self.root, "measurement/*/counts")
+        with h5py.File(fname, "r") as file:
+            np.testing.assert_array_equal(file["data"][:, 0], np.arange(5))
+
+    def test_stitch_sweep(self):
+        with h5py.File(self.root / "sweep.h5", "w") as file:
+            file.attrs["time_id"] = 99
+            H = file.create_group("measurement/sweep_2d")
+            H["indices"] = [(i, j) for i in range(2) for j in range(3)]
+            H["range_1"] = [0.0, 1.0]
+            H["range_2"] = [5.0, 6.0, 7.0]
+
+        fname = h5_io.h5_stitch_run_dir(self.root, "measurement/m/counts")
+        with h5py.File(fname, "r") as file:
+            data = file["data"]
+            self.assertEqual(data.shape, (2, 3, 1, 4))
+            self.assertEqual(data[1, 1, 0, 0], 4)
+            self.assertTrue(np.isnan(data[1, 2, 0, 0]))
+            np.testing.assert_array_equal(data.dims[1][0][:], [5.0, 6.0, 7.0])
+
+    def test_incompatible_shapes(self):
+        with h5py.File(self.root / "9_m.h5", "w") as file:
+            file["measurement/m/counts"] = np.zeros(3)
+        with self.assertRaises(ValueError):
+            h5_io.h5_stitch_run_dir(self.root, "measurement/*/counts")
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,114 @@
+import unittest
+
+import numpy as np
+import pyqtgraph as pg
+from qtpy import QtGui
+
+from ScopeFoundry.scanning.incremental_display import (
+    DirtyRows,
+    IncrementalDisplay,
+    IncrementalImageItem,
+    RunningLevels,
+)
+
+app = pg.mkQApp()
+
+
+def paint(item, shape):
+    qimage = QtGui.QImage(*shape, QtGui.QImage.Format.Format_ARGB32)
+    qimage.fill(0)
+    painter = QtGui.QPainter(qimage)
+    item.paint(painter)
+    painter.end()
+    return qimage
+
+
+class RunningLevelsTest(unittest.TestCase):
+
+    def test_min_max(self):
+        levels = RunningLevels()
+        self.assertIsNone(levels.levels)
+        levels.update([np.nan, 2.0, 3.0])
+        levels.update([[1.0, np.nan], [2.5, 2.0]])
+        self.assertEqual(levels.levels, (1.0, 3.0))
+        self.assertEqual(levels.count, 5)
+
+    def test_percentile_estimate(self):
+        data = np.random.default_rng(1).normal(size=200_000)
+        levels = RunningLevels(percentiles=(1.0, 99.0), sample_size=20_000)
+        for batch in np.split(data, 100):
+            levels.update(batch)
+        np.testing.assert_allclose(
+            levels.levels, np.percentile(data, (1.0, 99.0)), atol=0.1
+        )
+
+
+class DirtyRowsTest(unittest.TestCase):
+
+    def test_mark_take(self):
+        rows = DirtyRows()
+        self.assertFalse(rows.active)
+        rows.mark(np.int16(0), 3)
+        rows.mark(1, np.array([4, 5, 4]))
+        self.assertTrue(rows.active)
+        self.assertEqual(rows.take(), {(0, 3), (1, 4), (1, 5)})
+        self.assertEqual(rows.take(), set())
+
+
+class IncrementalImageItemTest(unittest.TestCase):
+
+    def new_item(self, band_size):
+        item = IncrementalImageItem(band_size=band_size)
+        self.rendered = []
+        render_band = item.render_band
+
+        def counting_render_band(band, lut):
+            self.rendered.append(band)
+            return render_band(band, lut)
+
+        item.render_band = counting_render_band
+        return item
+
+    def test_partial_render_matches_full_render(self):
+        Nv, Nh = 20, 7
+        image_map = np.full((1, Nv, Nh), np.nan)
+        display = IncrementalDisplay()
+        item = self.new_item(band_size=4)
+
+        image_map[0, :10] = np.arange(10 * Nh).reshape(10, Nh)
+        display.mark(0, np.arange(10))
+        display.update_image(item, image_map, 0)
+        paint(item, (Nh, Nv))
+        self.assertEqual(sorted(self.rendered), [0, 1, 2, 3, 4])
+
+        # new row within the current levels: only its band is redrawn
+        self.rendered.clear()
+        image_map[0, 13] = 5.0
+        display.mark(0, 13)
+        display.update_image(item, image_map, 0)
+        incremental = paint(item, (Nh, Nv))
+        self.assertEqual(self.rendered, [3])
+
+        full = pg.ImageItem(image_map[0].T, levels=item.levels, autoDownsample=False)
+        self.assertEqual(incremental, paint(full, (Nh, Nv)))
+
+    def test_levels_change_redraws_all(self):
+        image_map = np.zeros((2, 8, 3))
+        display = IncrementalDisplay()
+        item = self.new_item(band_size=2)
+        display.mark(0, 0)
+        display.update_image(item, image_map, 0)
+        paint(item, (3, 8))
+
+        self.rendered.clear()
+        image_map[0, 5] = 100.0
+        image_map[1, 0] = -100.0
+        display.mark(np.array([0, 1]), np.array([5, 0]))
+        display.update_image(item, image_map, 0)
+        paint(item, (3, 8))
+        self.assertEqual(tuple(item.levels), (-100.0, 100.0))
+        self.assertEqual(sorted(self.rendered), [0, 1, 2, 3])
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,335 @@
+import tempfile
+import time
+import unittest
+
+import h5py
+import numpy as np
+
+from ScopeFoundry import BaseMicroscopeApp, HardwareComponent, Measurement
+from ScopeFoundry.h5_io import AsyncH5Writer
+from ScopeFoundry.sweeping import Collector
+from ScopeFoundry.sweeping.nd_scan_data import (
+    POINT_BUFFER_SIZE,
+    DecimatedTrace,
+    NDScanData,
+    RepeatStats,
+    SettingsLineBuffer,
+)
+
+
+class SweepHost(Measurement):
+    name = "sweep_host"
+
+
+class SpectrumCollector(Collector):
+    name = "spec"
+    repeated_dset_names = ("counts", "power")
+
+    def collect(self, point, rep):
+        self.data = {
+            "counts": np.arange(5.0) * point + rep,
+            "power": float(point),
+            "wavelengths": np.linspace(400, 800, 5),
+        }
+
+
+class Monitor(HardwareComponent):
+    """settings read back with a latency of 5 ms"""
+
+    name = "monitor"
+
+    def setup(self):
+        self.settings.New("temperature", initial=20.0)
+        self.settings.New("mode", dtype=str, initial="idle")
+        self.reads = []
+
+    def connect(self):
+        self.settings.temperature.connect_to_hardware(read_func=self.read_temperature)
+        self.settings.mode.connect_to_hardware(read_func=self.read_mode)
+
+    def read(self, value):
+        t0 = time.perf_counter()
+        time.sleep(0.005)
+        self.reads.append((t0, time.perf_counter()))
+        return value
+
+    def read_temperature(self):
+        return self.read(20.0 + len(self.reads))
+
+    def read_mode(self):
+        return self.read("run")
+
+
+class MonitoredCollector(SpectrumCollector):
+    settings_to_collect = (
+        "hw/monitor/temperature",
+        "hw/monitor/mode",
+        "hw/monitor_2/temperature",
+        "mm/sweep_host/reps",
+    )
+
+
+def run_sweep(
+    m, storage, base_shape=(3, 4), keep_raw=True, collector_class=SpectrumCollector
+):
+    collector = collector_class(m.app, keep_raw=keep_raw)
+    collector.repeats = []
+    collector.reps_lq = m.settings.get_lq("reps")
+    reps = collector.reps
+    scan_data = NDScanData(base_shape, m, storage=storage)
+    for point, indices in enumerate(np.ndindex(*base_shape)):
+        for r in range(reps):
+            collector.collect(point, r)
+            if point == 0 and r == 0:
+                scan_data.init_dsets(collector)
+            scan_data.incorporate(collector, *indices, r)
+        scan_data.add_indices(indices)
+    scan_data.average_repeats(collector)
+    fname = scan_data.h5_file.filename
+    return scan_data, fname
+
+
+class DecimatedTraceTest(unittest.TestCase):
+
+    def test_min_max_bins(self):
+        values = np.sin(np.arange(10_000) / 50.0) + np.arange(10_000) % 7
+        trace = DecimatedTrace(max_bins=64)
+        for n, value in enumerate(values):
+            trace.add(value)
+            if n == 63:
+                # not decimated yet
+                x, y = trace.xy()
+                np.testing.assert_array_equal(x, np.arange(64))
+                np.testing.assert_array_equal(y, values[:64])
+        self.assertEqual(trace.bin_size, 256)
+        x, y = trace.xy()
+        n_bins = -(-10_000 // 256)
+        self.assertEqual(len(y), 2 * n_bins)
+        np.testing.assert_array_equal(x[::2], np.arange(n_bins) * 256)
+        bins = np.array_split(values, np.arange(256, 10_000, 256))
+        np.testing.assert_array_equal(y[0::2], [b.min() for b in bins])
+        np.testing.assert_array_equal(y[1::2], [b.max() for b in bins])
+
+
+class RepeatStatsTest(unittest.TestCase):
+
+    def test_written_once_per_point(self):
+        writes = []
+
+        def write(dset, index, value):
+            writes.append(index)
+            dset[index] = value
+
+        with h5py.File("stats.h5", "w", driver="core", backing_store=False) as file:
+            stats = RepeatStats(file, "counts", (2, 3), (4,), reps=3)
+            for r in range(3):
+                self.assertEqual(writes, [])
+                stats.add((0, 0), np.arange(4.0) + r, write)
+            # the statistics of each dataset, once the last repetition came in
+            self.assertEqual(writes, [(0, 0)] * 5)
+            np.testing.assert_array_equal(file["counts"][0, 0], np.arange(4.0) + 1)
+            np.testing.assert_array_equal(file["counts_count"][0, 0], 3)
+
+            # interrupted point
+            stats.add((0, 1), np.ones(4), write)
+            self.assertEqual(len(writes), 5)
+            stats.write(write)
+            stats.write(write)
+            self.assertEqual(writes[5:], [(0, 1)] * 5)
+            np.testing.assert_array_equal(file["counts_count"][0, 1], 1)
+            np.testing.assert_array_equal(file["counts_max"][0, 1], 1.0)
+
+
+class SettingsLineBufferTest(unittest.TestCase):
+
+    def setUp(self):
+        self.writes = []
+
+    def write(self, dset, index, value):
+        self.writes.append(index)
+        dset[index] = value
+
+    def test_serpentine_swap_order(self):
+        # the innermost loop runs along axis 0 and reverses every line
+        data = np.zeros((4, 3, 2))
+        line = SettingsLineBuffer(data, 0, 2, float)
+        for j in range(3):
+            for i in range(4) if j % 2 == 0 else range(3, -1, -1):
+                for r in range(2):
+                    line.add((i, j), r, 10 * i + j + 0.1 * r, self.write)
+            # nothing is written before the line ends
+            self.assertEqual(len(self.writes), j)
+            line.write(self.write)
+        self.assertEqual(self.writes, [(slice(0, 4), j) for j in range(3)])
+        i, j, r = np.indices(data.shape)
+        np.testing.assert_allclose(data, 10 * i + j + 0.1 * r)
+
+    def test_long_line(self):
+        # co-move: a single line, written in blocks, interrupted
+        n = 3 * POINT_BUFFER_SIZE + 10
+        data = np.zeros((1, 4 * POINT_BUFFER_SIZE, 1))
+        line = SettingsLineBuffer(data, 1, 1, float)
+        for k in range(n):
+            line.add((0, k), 0, k + 1.0, self.write)
+        self.assertEqual(len(self.writes), 3)
+        self.assertEqual(len(line.positions), 10)
+        line.write(self.write)
+        np.testing.assert_array_equal(data[0, :n, 0], np.arange(1.0, n + 1))
+        np.testing.assert_array_equal(data[0, n:, 0], 0)
+
+
+class NDScanDataStorageTest(unittest.TestCase):
+
+    def setUp(self):
+        self.tmp_dir = tempfile.TemporaryDirectory()
+        self.app = BaseMicroscopeApp([])
+        self.app.settings["save_dir"] = self.tmp_dir.name
+        self.m = self.app.add_measurement(SweepHost(self.app))
+        self.m.settings.New("reps", dtype=int, initial=3)
+
+    def tearDown(self):
+        self.tmp_dir.cleanup()
+
+    def read(self, fname):
+        with h5py.File(fname, "r") as file:
+            H = file["measurement/sweep_host"]
+            return {k: H[k][()] for k in ("spec_counts_raw", "spec_counts")}
+
+    def test_h5_storage_matches_memory(self):
+        memory, fname = run_sweep(self.m, "memory")
+        expected_means = memory.point_means("spec_power_raw")
+        expected_recent = memory.recent_values("spec_counts_raw", 3)
+        memory.close_h5()
+        expected = self.read(fname)
+
+        # file names have a resolution of seconds
+        self.app.settings["save_dir"] = tempfile.mkdtemp(dir=self.tmp_dir.name)
+        out_of_core, fname = run_sweep(self.m, "h5")
+        self.assertIsInstance(out_of_core.data["spec_counts_raw"], h5py.Dataset)
+        np.testing.assert_array_equal(
+            out_of_core.point_means("spec_power_raw"), expected_means
+        )
+        self.assertEqual(out_of_core.point_shape("spec_counts_raw"), (5,))
+        np.testing.assert_array_equal(
+            out_of_core.recent_values("spec_counts_raw", 3), expected_recent
+        )
+        out_of_core.close_h5()
+        for name, data in self.read(fname).items():
+            np.testing.assert_array_equal(data, expected[name])
+
+    def test_repeat_statistics(self):
+        for storage in ("memory", "h5"):
+            self.app.settings["save_dir"] = tempfile.mkdtemp(dir=self.tmp_dir.name)
+            scan_data, fname = run_sweep(self.m, storage)
+            scan_data.close_h5()
+            with h5py.File(fname, "r") as file:
+                H = file["measurement/sweep_host"]
+                raw = H["spec_counts_raw"][:]
+                np.testing.assert_allclose(H["spec_counts"][:], raw.mean(axis=2))
+                np.testing.assert_allclose(
+                    H["spec_counts_std"][:], raw.std(axis=2, ddof=1)
+                )
+                np.testing.assert_array_equal(H["spec_counts_min"][:], raw.min(axis=2))
+                np.testing.assert_array_equal(H["spec_counts_max"][:], raw.max(axis=2))
+                np.testing.assert_array_equal(H["spec_power_count"][:], 3)
+
+    def test_statistics_only(self):
+        scan_data, fname = run_sweep(self.m, "memory", keep_raw=False)
+        self.assertNotIn("spec_counts_raw", scan_data.data)
+        self.assertEqual(scan_data.point_shape("spec_counts"), (5,))
+        np.testing.assert_allclose(
+            scan_data.recent_values("spec_counts", 1), np.arange(5.0) * 11 + 1
+        )
+        scan_data.close_h5()
+        with h5py.File(fname, "r") as file:
+            H = file["measurement/sweep_host"]
+            self.assertNotIn("spec_counts_raw", H)
+            np.testing.assert_allclose(H["spec_counts"][2, 3], np.arange(5.0) * 11 + 1)
+            np.testing.assert_allclose(H["spec_power_std"][:], 0)
+
+    def test_settings_to_collect(self):
+        for name in ("monitor", "monitor_2"):
+            hw = self.app.add_hardware(Monitor(self.app, name=name))
+            hw.settings["connected"] = True
+        scan_data, fname = run_sweep(
+            self.m, "h5", base_shape=(2, 3), collector_class=MonitoredCollector
+        )
+        scan_data.close_h5()
+        monitor = self.app.hardware["monitor"]
+        self.assertEqual(len(monitor.reads), 2 * 2 * 3 * 3)
+        # the reads of an owner are sequential, owners are read concurrently
+        starts, ends = np.array(monitor.reads).T
+        self.assertTrue((starts[1:] >= ends[:-1]).all())
+        starts_2, ends_2 = np.array(self.app.hardware["monitor_2"].reads).T
+        self.assertTrue(((starts[::2] < ends_2) & (starts_2 < ends[::2])).all())
+        with h5py.File(fname, "r") as file:
+            settings = file["measurement/sweep_host/spec_settings"][:]
+        self.assertEqual(settings.shape, (2, 3, 3))
+        self.assertEqual(settings.dtype.names, MonitoredCollector.settings_to_collect)
+        np.testing.assert_array_equal(
+            settings["hw/monitor/temperature"].ravel(), 20.0 + np.arange(0, 36, 2)
+        )
+        np.testing.assert_array_equal(settings["mm/sweep_host/reps"], 3)
+        self.assertEqual(settings["hw/monitor/mode"][1, 2, 0], b"run")
+
+    def test_point_trace(self):
+        scan_data, _ = run_sweep(self.m, "memory", base_shape=(2, 3))
+        self.assertEqual(scan_data.version("spec_counts_raw"), 2 * 3 * 3)
+        x, y = scan_data.point_trace("spec_counts_raw")
+        # point means of the counts arange(5) * point + rep, rep = 0, 1, 2
+        np.testing.assert_array_equal(x, np.arange(6))
+        np.testing.assert_allclose(y, 2 * np.arange(6) + 1)
+        scan_data.close_h5()
+
+    def test_point_dsets(self):
+        base_shape = (10, 15)
+        points = list(np.ndindex(*base_shape))
+        for storage in ("memory", "h5"):
+            self.app.settings["save_dir"] = tempfile.mkdtemp(dir=self.tmp_dir.name)
+            scan_data = NDScanData(base_shape, self.m, storage=storage)
+            fname = scan_data.h5_file.filename
+            # interrupted after 100 points
+            for indices in points[:100]:
+                scan_data.add_position(np.array(indices) * 0.5)
+                scan_data.add_indices(indices)
+            scan_data.add_overlap(0.5)
+            scan_data.add_overlap(0.25)
+            dset = scan_data.point_dsets["indices"].dset
+            # written in blocks as they come in
+            self.assertEqual(dset.dtype, int)
+            self.assertEqual(dset.attrs["logical_length"], 64)
+            scan_data.flush_h5()
+            self.assertEqual(dset.attrs["logical_length"], 100)
+            np.testing.assert_array_equal(dset[:100], points[:100])
+            # not trimmed until closed
+            capacity = dset.shape[0]
+            self.assertGreater(capacity, 100)
+            for indices in points[100:110]:
+                scan_data.add_indices(indices)
+            scan_data.flush_h5()
+            self.assertEqual(dset.shape[0], capacity)
+            self.assertEqual(dset.attrs["logical_length"], 110)
+            scan_data.close_h5()
+            with h5py.File(fname, "r") as file:
+                H = file["measurement/sweep_host"]
+                np.testing.assert_array_equal(H["indices"][:], points[:110])
+                np.testing.assert_array_equal(
+                    H["positions"][:], np.array(points[:100]) * 0.5
+                )
+                self.assertEqual(H["pipeline_overlap"].shape, (2,))
+                self.assertEqual(H["pipeline_overlap"].attrs["total"], 0.75)
+
+    def test_writer_raises_errors(self):
+        with h5py.File(f"{self.tmp_dir.name}/w.h5", "w") as file:
+            dset = file.create_dataset("d", (2, 3), dtype=float)
+            writer = AsyncH5Writer(max_pending=1)
+            writer.write(dset, 1, [1, 2, 3])
+            writer.write(dset, 5, [1, 2, 3])
+            with self.assertRaises(Exception):
+                writer.flush()
+            writer.close()
+            np.testing.assert_array_equal(dset[1], [1, 2, 3])
+
+
+if __name__ == "__main__":
+    unittest.main()
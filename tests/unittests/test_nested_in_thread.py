@@ -0,0 +1,162 @@
+import glob
+import tempfile
+import threading
+import time
+import unittest
+
+import h5py
+import numpy as np
+
+from ScopeFoundry import BaseMicroscopeApp, Measurement
+from ScopeFoundry.sweeping import Collector, SweepND
+
+
+class Readout(Measurement):
+    name = "readout"
+
+    def setup(self):
+        self.settings.New("wait_for_interrupt", bool, initial=False)
+        self.settings.New("fail", bool, initial=False)
+        self.threads = []
+        self.run_states = []
+
+    def run(self):
+        self.threads.append(threading.get_ident())
+        self.run_states.append(self.settings["run_state"])
+        self.set_progress(50.0)
+        if self.settings["fail"]:
+            raise RuntimeError("readout failed")
+        while self.settings["wait_for_interrupt"]:
+            if self.interrupt_measurement_called:
+                break
+            time.sleep(0.001)
+        self.data = {"value": float(len(self.threads))}
+
+
+class Host(Measurement):
+    name = "host"
+
+    def setup(self):
+        self.settings.New("nested_interrupt", bool, initial=True)
+
+    def run(self):
+        self.thread = threading.get_ident()
+        self.success = self.run_nested_in_thread(
+            self.app.measurements["readout"], self.settings["nested_interrupt"]
+        )
+
+
+class NestedInThreadTest(unittest.TestCase):
+
+    @classmethod
+    def setUpClass(cls):
+        cls.app = BaseMicroscopeApp([])
+        cls.readout = cls.app.add_measurement(Readout(cls.app))
+        cls.host = cls.app.add_measurement(Host(cls.app))
+        collector = Collector(
+            cls.app, "readout", target_measure_name="readout", run_in_thread=True
+        )
+        collector.repeated_dset_names = ("value",)
+        cls.position = {"a": 0.0}
+        cls.sweep = cls.app.add_measurement(
+            SweepND(
+                cls.app,
+                actuators=[
+                    (
+                        "a",
+                        lambda: cls.position["a"],
+                        lambda x: cls.position.__setitem__("a", x),
+                    )
+                ],
+                collectors=[collector],
+                actuator_names="x",
+                n_read_any_settings=0,
+                n_any_measurements=0,
+            )
+        )
+
+    def setUp(self):
+        self.readout.threads = []
+        self.readout.run_states = []
+        self.readout.settings["wait_for_interrupt"] = False
+        self.readout.settings["fail"] = False
+
+    def run_host(self, interrupt=None):
+        """runs the host like the GUI does, *interrupt* is called once running"""
+        self.host.start()
+        while self.host.is_measuring():
+            if interrupt and self.readout.is_measuring():
+                interrupt()
+                interrupt = None
+            self.app.qtapp.processEvents()
+            time.sleep(0.001)
+        self.app.qtapp.processEvents()
+
+    def test_run_state(self):
+        self.run_host()
+        self.assertTrue(self.host.success)
+        self.assertEqual(self.readout.threads, [self.host.thread])
+        self.assertEqual(self.readout.run_states, ["run_thread_run"])
+        self.assertEqual(self.readout.settings["run_state"], "stop_success")
+        self.assertFalse(self.readout.settings["activation"])
+
+    def test_progress(self):
+        if hasattr(self.readout, "_t0"):
+            del self.readout._t0
+        self.readout.settings["profile"] = True
+        try:
+            self.run_host()
+        finally:
+            self.readout.settings["profile"] = False
+        self.assertTrue(self.host.success)
+        self.assertGreater(self.readout._t0, 0)
+        # set back to zero like after a run in its own thread
+        self.assertEqual(self.readout.settings["progress"], 0.0)
+
+    def test_failure(self):
+        # the failure of the readout is reported, the host keeps running
+        self.readout.settings["fail"] = True
+        self.run_host()
+        self.assertFalse(self.host.success)
+        self.assertEqual(self.readout.settings["run_state"], "stop_failure")
+        self.assertFalse(self.readout.settings["activation"])
+        self.assertEqual(self.host.settings["run_state"], "stop_success")
+
+    def test_outer_interrupt(self):
+        self.readout.settings["wait_for_interrupt"] = True
+        self.run_host(interrupt=self.host.interrupt)
+        self.assertFalse(self.host.success)
+        self.assertEqual(self.readout.settings["run_state"], "stop_interrupted")
+        self.assertEqual(self.host.settings["run_state"], "stop_interrupted")
+
+    def test_nested_interrupt(self):
+        self.readout.settings["wait_for_interrupt"] = True
+        for nested_interrupt, host_state in (
+            (True, "stop_interrupted"),
+            (False, "stop_success"),
+        ):
+            self.host.settings["nested_interrupt"] = nested_interrupt
+            self.run_host(interrupt=self.readout.interrupt)
+            self.assertEqual(self.readout.settings["run_state"], "stop_interrupted")
+            self.assertEqual(self.host.settings["run_state"], host_state)
+
+    def test_sweep(self):
+        m = self.sweep
+        m.setup_figure()
+        m.settings["actuator_x"] = "a"
+        m.settings["range_x_num"] = 5
+        m.settings["collection_delay"] = 0
+        m.settings["readout_repetitions"] = 2
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            self.app.settings["save_dir"] = tmp_dir
+            m._thread_run()
+            (fname,) = glob.glob(f"{tmp_dir}/*.h5")
+            with h5py.File(fname, "r") as file:
+                values = file[f"measurement/{m.name}/readout_value_raw"][()]
+        np.testing.assert_array_equal(values.ravel(), np.arange(1, 11))
+        self.assertEqual(set(self.readout.threads), {threading.get_ident()})
+        self.assertEqual(self.readout.settings["run_state"], "stop_success")
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,107 @@
+import tempfile
+import unittest
+from unittest import mock
+
+import h5py
+import numpy as np
+
+from ScopeFoundry import BaseMicroscopeApp
+from ScopeFoundry.scanning import BaseNonRaster2DScan, BaseRaster2DSlowScan
+from ScopeFoundry.scanning import path_ordering
+from ScopeFoundry.scanning.path_ordering import (
+    MoveTimeModel,
+    neighbour_lists,
+    nearest_neighbour_order,
+    optimize_order,
+)
+
+
+class PathOrderingTest(unittest.TestCase):
+
+    def setUp(self):
+        self.points = np.random.default_rng(0).random((600, 2))
+        self.model = MoveTimeModel(velocity=(2.0, 0.5), settle_time=(0.01, 0.02))
+
+    def test_move_times(self):
+        times = self.model.move_times([0, 0], [[1.0, 0.0], [1.0, 1.0], [0.0, 0.0]])
+        np.testing.assert_allclose(times, [0.5 + 0.01, 2.0 + 0.02, 0.0])
+
+    def test_optimize_order(self):
+        result = optimize_order(self.points, self.model)
+        np.testing.assert_array_equal(np.sort(result.order), np.arange(600))
+        self.assertEqual(result.order[0], 0)
+        self.assertAlmostEqual(
+            result.travel_time, self.model.path_time(self.points, result.order)
+        )
+        greedy = nearest_neighbour_order(self.points, self.model)
+        self.assertLess(result.travel_time, self.model.path_time(self.points, greedy))
+        self.assertGreater(result.speedup, 5)
+
+    def test_keeps_good_order(self):
+        line = np.stack([np.arange(10.0), np.zeros(10)], axis=1)
+        result = optimize_order(line, self.model)
+        np.testing.assert_array_equal(result.order, np.arange(10))
+        self.assertEqual(result.travel_time, result.baseline_time)
+
+    def test_neighbour_lists_without_scipy(self):
+        expected = neighbour_lists(self.points, self.model, k=5)
+        with mock.patch.object(path_ordering, "_kd_tree", return_value=None):
+            np.testing.assert_array_equal(
+                neighbour_lists(self.points, self.model, k=5), expected
+            )
+            order = nearest_neighbour_order(self.points, self.model)
+        np.testing.assert_array_equal(
+            order, nearest_neighbour_order(self.points, self.model)
+        )
+
+
+class PointScan(BaseNonRaster2DScan, BaseRaster2DSlowScan):
+    name = "point_scan"
+
+    def pre_scan_setup(self):
+        pass
+
+    def move_position_start(self, h, v):
+        self.pos_h = h
+
+    def collect_pixel(self, pixel_num, k, j, i):
+        self.display_image_map[k, j, i] = self.pos_h
+
+    def post_scan_cleanup(self):
+        pass
+
+    def custom_scan_points(self):
+        x = np.linspace(0, 1, 20)
+        return x[::-1] * (np.arange(20) % 2), x
+
+
+class NonRasterScanTest(unittest.TestCase):
+
+    def setUp(self):
+        self.tmp_dir = tempfile.TemporaryDirectory()
+        self.app = BaseMicroscopeApp([])
+        self.app.settings["save_dir"] = self.tmp_dir.name
+
+    def tearDown(self):
+        self.tmp_dir.cleanup()
+
+    def test_data_lands_at_point_index(self):
+        m = self.app.add_measurement(PointScan(self.app))
+        m.settings["scan_type"] = "custom"
+        m.settings["optimize_order"] = True
+        m._thread_run()
+
+        h, _ = m.custom_scan_points()
+        self.assertFalse(np.array_equal(m.scan_order, np.arange(20)))
+        np.testing.assert_array_equal(m.display_image_map[0, 0], h)
+        self.assertLess(m.settings["travel_time"], m.settings["baseline_travel_time"])
+        with h5py.File(m.h5_filename, "r") as file:
+            H = file["measurement/point_scan"]
+            np.testing.assert_array_equal(H["scan_order"][:], m.scan_order)
+            self.assertEqual(
+                H["scan_order"].attrs["travel_time"], m.settings["travel_time"]
+            )
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,101 @@
+import tempfile
+import unittest
+
+import h5py
+import numpy as np
+
+from ScopeFoundry import BaseMicroscopeApp
+from ScopeFoundry.scanning import BaseRaster2DSlowScan, BaseRaster3DSlowScan
+
+
+class PixelScan(BaseRaster2DSlowScan):
+    name = "pixel_scan"
+
+    def pre_scan_setup(self):
+        self.collected = []
+
+    def move_position_start(self, h, v):
+        pass
+
+    def collect_pixel(self, pixel_num, k, j, i):
+        self.collected.append((k, j, i))
+
+    def post_scan_cleanup(self):
+        pass
+
+
+class LineScan(PixelScan):
+    name = "line_scan"
+
+    def collect_line(self, line_index, h_positions, v_positions):
+        self.collected.append(line_index)
+        return {"signal": h_positions + 10 * v_positions}
+
+
+class LineScan3D(BaseRaster3DSlowScan):
+    name = "line_scan_3d"
+
+    def pre_scan_setup(self):
+        self.starts = []
+
+    def move_position_start(self, h, v, z):
+        self.starts.append(z)
+
+    def collect_line(self, line_index, h_positions, v_positions):
+        return {"spec": np.ones((len(h_positions), 2))}
+
+    def post_scan_cleanup(self):
+        pass
+
+
+class LineCollectionTest(unittest.TestCase):
+
+    def setUp(self):
+        self.tmp_dir = tempfile.TemporaryDirectory()
+        self.app = BaseMicroscopeApp([])
+        self.app.settings["save_dir"] = self.tmp_dir.name
+
+    def tearDown(self):
+        self.tmp_dir.cleanup()
+
+    def run_scan(self, m, **settings):
+        for key, val in settings.items():
+            m.settings[key] = val
+        m._thread_run()
+        return h5py.File(m.h5_filename, "r")
+
+    def test_per_pixel_default(self):
+        m = self.app.add_measurement(PixelScan(self.app))
+        self.run_scan(m, Nh=3, Nv=2).close()
+        self.assertFalse(m.uses_collect_line())
+        self.assertEqual(len(m.collected), 6)
+
+    def check_collect_line(self, scan_type):
+        m = self.app.add_measurement(LineScan(self.app))
+        file = self.run_scan(m, Nh=4, Nv=3, scan_type=scan_type)
+        with file:
+            signal = file["measurement/line_scan/signal"][:]
+            self.assertGreater(file["measurement/line_scan/pixel_time"][0, 0, 0], 0)
+        H, V = np.meshgrid(m.h_array, m.v_array)
+        expected = np.broadcast_to(H + 10 * V, m.scan_shape)
+        np.testing.assert_allclose(signal, expected)
+        np.testing.assert_allclose(m.display_image_map, expected)
+        self.assertEqual(len(m.collected), len(m.line_starts()))
+
+    def test_collect_line(self):
+        self.check_collect_line("serpentine")
+
+    def test_collect_line_ortho_trace_retrace(self):
+        self.check_collect_line("ortho_trace_retrace")
+
+    def test_collect_line_3d(self):
+        m = self.app.add_measurement(LineScan3D(self.app))
+        file = self.run_scan(m, Nh=3, Nv=2, Nz=2, z0=0.0, z1=1.0)
+        with file:
+            self.assertEqual(file["measurement/line_scan_3d/spec"].shape, (2, 2, 3, 2))
+        # initial move and one start move per frame
+        self.assertEqual(m.starts, [0.0, 0.0, 1.0])
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,111 @@
+import tempfile
+import unittest
+from pathlib import Path
+
+import h5py
+import numpy as np
+
+from ScopeFoundry import BaseMicroscopeApp
+from ScopeFoundry.scanning.base_raster_scan import (
+    BaseRaster2DScan,
+    BaseRaster3DScan,
+    ijk_zigzag_generator,
+    ijk_zigzag_indices,
+)
+from ScopeFoundry.scanning.scan_trajectory import ScanTrajectory
+from ScopeFoundry.tests.benchmarks import scan_generator_benchmark as legacy
+
+
+class ScanGeneratorTest(unittest.TestCase):
+    """vectorized scan generators reproduce the former python loops exactly"""
+
+    @classmethod
+    def setUpClass(cls):
+        cls.app = BaseMicroscopeApp([])
+        cls.scan_2d = cls.app.add_measurement(BaseRaster2DScan(cls.app))
+        cls.scan_3d = cls.app.add_measurement(BaseRaster3DScan(cls.app))
+
+    def assert_identical(self, m, expected):
+        np.testing.assert_array_equal(m.scan_index_array, expected["index"])
+        np.testing.assert_array_equal(m.scan_slow_move, expected["slow_move"])
+        # bit-identical positions
+        for name in "hv":
+            positions = np.asarray(getattr(m, f"scan_{name}_positions"))
+            self.assertEqual(positions.tobytes(), expected[name].tobytes())
+        self.assertEqual(m.scan_index_array.dtype, expected["index"].dtype)
+
+    def test_2d(self):
+        m = self.scan_2d
+        for Nh, Nv in [(7, 5), (4, 6), (1, 3)]:
+            m.settings["h0"], m.settings["h1"] = -1.3, 2.7
+            m.settings["v0"], m.settings["v1"] = 0.1, 0.9
+            m.settings["Nh"], m.settings["Nv"] = Nh, Nv
+            for scan_type, legacy_func in [
+                ("serpentine", legacy.legacy_serpentine),
+                ("trace_retrace", legacy.legacy_trace_retrace),
+                ("ortho_raster", legacy.legacy_ortho_raster),
+                ("ortho_trace_retrace", legacy.legacy_ortho_trace_retrace),
+            ]:
+                with self.subTest(scan_type=scan_type, Nh=Nh, Nv=Nv):
+                    m.settings["scan_type"] = scan_type
+                    m.compute_scan_arrays()
+                    expected = legacy_func(m.h_array, m.v_array)
+                    self.assertEqual(m.Npixels, len(expected["index"]))
+                    self.assert_identical(m, expected)
+
+    def test_3d_serpentine(self):
+        m = self.scan_3d
+        m.settings["Nh"], m.settings["Nv"], m.settings["Nz"] = 5, 3, 4
+        m.settings["scan_type"] = "serpentine"
+        m.compute_scan_arrays()
+        expected = legacy.legacy_serpentine_3d(m.h_array, m.v_array, m.z_array)
+        self.assert_identical(m, expected)
+        z_positions = np.asarray(m.scan_z_positions)
+        self.assertEqual(z_positions.tobytes(), expected["z"].tobytes())
+        np.testing.assert_array_equal(m.scan_start_move, expected["start_move"])
+
+    def test_lazy_views(self):
+        m = self.scan_2d
+        m.settings["Nh"], m.settings["Nv"] = 9, 7
+        m.settings["scan_type"] = "ortho_trace_retrace"
+        m.compute_scan_arrays()
+        expected = legacy.legacy_ortho_trace_retrace(m.h_array, m.v_array)
+        m.scan_trajectory.chunk_size = 10
+        # pixel by pixel access across chunk boundaries, as in the slow scans
+        for i in range(m.Npixels):
+            kk, jj, ii = m.scan_index_array[i]
+            self.assertEqual((kk, jj, ii), tuple(expected["index"][i]))
+            self.assertEqual(m.scan_h_positions[i], expected["h"][i])
+        np.testing.assert_array_equal(
+            m.scan_index_array[5:40:3, 1], expected["index"][5:40:3, 1]
+        )
+        np.testing.assert_array_equal(list(m.scan_slow_move), expected["slow_move"])
+        self.assertEqual(m.scan_trajectory.indices().dtype, np.int16)
+
+    def test_h5_description(self):
+        trajectory = ScanTrajectory(
+            "raster", (np.linspace(0, 1, 4), np.linspace(2, 3, 3), np.arange(2.0))
+        )
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            with h5py.File(Path(tmp_dir) / "t.h5", "w") as file:
+                trajectory.write_h5(file)
+                loaded = ScanTrajectory.from_h5(file["scan_trajectory"])
+        self.assertEqual(loaded.scan_shape, (2, 3, 4))
+        KK, JJ, II = np.meshgrid(range(2), range(3), range(4), indexing="ij")
+        np.testing.assert_array_equal(
+            loaded.indices(), np.stack([KK.flat, JJ.flat, II.flat], axis=1)
+        )
+        np.testing.assert_array_equal(loaded.positions(2), np.repeat([0.0, 1.0], 12))
+
+    def test_ijk_zigzag(self):
+        for dims in [(3, 4, 5), (2, 1, 3)]:
+            for axis_order in [(0, 1, 2), (2, 0, 1), (1, 2, 0)]:
+                expected = list(legacy.legacy_ijk_zigzag_generator(dims, axis_order))
+                self.assertEqual(list(ijk_zigzag_generator(dims, axis_order)), expected)
+                np.testing.assert_array_equal(
+                    ijk_zigzag_indices(dims, axis_order), expected
+                )
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,109 @@
+import tempfile
+import unittest
+from unittest import mock
+
+import h5py
+import numpy as np
+
+from ScopeFoundry import BaseMicroscopeApp
+from ScopeFoundry.scanning import BaseRaster3DSlowScan
+from ScopeFoundry.scanning.scan_trajectory import TrajectoryView
+
+
+class CrashingScan(BaseRaster3DSlowScan):
+    name = "crashing_scan"
+
+    crash_at = None
+
+    def pre_scan_setup(self):
+        self.collected = []
+        self.data_h5 = self.h5_scan_dataset("data", self.scan_shape, float)
+        # plain h5py calls reopen the datasets when resuming as well
+        H = self.h5_meas_group
+        self.counts_h5 = H.create_dataset("counts", self.scan_shape, int)
+        H["wavelengths"] = np.arange(3.0)
+
+    def collect_pixel(self, pixel_num, k, j, i):
+        if pixel_num == self.crash_at:
+            raise IOError("detector lost")
+        self.collected.append(pixel_num)
+        self.data_h5[k, j, i] = pixel_num + 1
+        self.counts_h5[k, j, i] = 2 * pixel_num
+        self.display_image_map[k, j, i] = pixel_num + 1
+
+    def post_scan_cleanup(self):
+        pass
+
+
+class ScanResumeTest(unittest.TestCase):
+
+    def setUp(self):
+        self.tmp_dir = tempfile.TemporaryDirectory()
+        self.app = BaseMicroscopeApp([])
+        self.app.settings["save_dir"] = self.tmp_dir.name
+        self.m = self.app.add_measurement(CrashingScan(self.app))
+        self.m.settings["Nh"] = 4
+        self.m.settings["Nv"] = 3
+        self.m.settings["Nz"] = 2
+
+    def tearDown(self):
+        self.tmp_dir.cleanup()
+
+    def resume(self, fname):
+        with mock.patch.object(self.m, "start", self.m._thread_run):
+            self.m.resume(fname)
+
+    def test_resume_after_crash(self):
+        self.m.crash_at = 17
+        self.m._thread_run()
+        fname = self.m.h5_filename
+        with h5py.File(fname, "r") as file:
+            H = file["measurement/crashing_scan"]
+            # line of pixels 16..19 was not completed
+            self.assertEqual(H.attrs["checkpoint_pixel"], 16)
+            self.assertFalse(H.attrs["checkpoint_complete"])
+
+        self.m.crash_at = None
+        self.resume(fname)
+
+        self.assertEqual(self.m.collected, list(range(16, 24)))
+        self.assertEqual(self.m.h5_filename, fname)
+        with h5py.File(fname, "r") as file:
+            H = file["measurement/crashing_scan"]
+            self.assertTrue(H.attrs["checkpoint_complete"])
+            data = H["data"][:]
+            counts = H["counts"][:]
+            np.testing.assert_array_equal(H["wavelengths"][:], np.arange(3.0))
+            self.assertTrue((H["pixel_time"][:] > 0).all())
+        expected = np.zeros(self.m.scan_shape)
+        kk, jj, ii = np.asarray(self.m.scan_index_array).T
+        expected[kk, jj, ii] = np.arange(1, 25)
+        np.testing.assert_array_equal(data, expected)
+        np.testing.assert_array_equal(counts, 2 * (expected - 1))
+        # pixels of before the crash are restored from the file
+        np.testing.assert_array_equal(self.m.display_image_map, expected)
+
+    def test_trajectory_hash_is_lazy(self):
+        self.m.compute_scan_arrays()
+        with mock.patch.object(
+            TrajectoryView, "__array__", side_effect=AssertionError("materialized")
+        ):
+            trajectory_hash = self.m.trajectory_hash()
+        self.m.settings["Nz"] = 3
+        self.m.compute_scan_arrays()
+        self.assertNotEqual(self.m.trajectory_hash(), trajectory_hash)
+
+    def test_resume_requires_matching_settings(self):
+        self.m.crash_at = 5
+        self.m._thread_run()
+        self.m.settings["Nh"] = 5
+
+        self.resume(self.m.h5_filename)
+
+        self.assertIsInstance(self.m.last_err, ValueError)
+        self.assertIn("Nh", str(self.m.last_err))
+        self.assertEqual(self.m.collected, list(range(5)))
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,126 @@
+import tempfile
+import time
+import unittest
+from unittest import mock
+
+import numpy as np
+
+from ScopeFoundry import BaseMicroscopeApp
+from ScopeFoundry.scanning import BaseRaster2DSlowScan
+from ScopeFoundry.scanning.scan_timing import ScanTimingModel, fit_timing_model
+from ScopeFoundry.scanning.scan_trajectory import TrajectoryView
+
+
+class FitTimingModelTest(unittest.TestCase):
+
+    def test_recovers_costs(self):
+        # 3 frames of 4 lines of 5 pixels
+        n = 60
+        line_starts = np.arange(n) % 5 == 0
+        frame_starts = np.arange(n) % 20 == 0
+        truth = ScanTimingModel(pixel_cost=0.01, line_cost=0.1, frame_cost=0.5)
+        intervals = truth.pixel_cost + truth.line_cost * line_starts
+        intervals += truth.frame_cost * frame_starts
+        times = 100.0 + np.cumsum(intervals)
+
+        fitted = fit_timing_model(times, line_starts, frame_starts, t_start=100.0)
+        self.assertAlmostEqual(fitted.pixel_cost, truth.pixel_cost)
+        self.assertAlmostEqual(fitted.line_cost, truth.line_cost)
+        self.assertAlmostEqual(fitted.frame_cost, truth.frame_cost)
+        self.assertAlmostEqual(fitted.predict(n, 12, 3), times[-1] - 100.0)
+
+    def test_too_few_pixels(self):
+        self.assertIsNone(fit_timing_model([1.0], [True]))
+
+
+class SleepyScan(BaseRaster2DSlowScan):
+    name = "sleepy_scan"
+
+    def pre_scan_setup(self):
+        time.sleep(0.05)
+
+    def move_position_start(self, h, v):
+        pass
+
+    def collect_pixel(self, pixel_num, k, j, i):
+        time.sleep(0.002)
+
+    def post_scan_cleanup(self):
+        pass
+
+
+class ScanTimingTest(unittest.TestCase):
+
+    def setUp(self):
+        self.tmp_dir = tempfile.TemporaryDirectory()
+        self.app = BaseMicroscopeApp([])
+        self.app.settings["save_dir"] = self.tmp_dir.name
+        self.m = self.app.add_measurement(SleepyScan(self.app))
+        self.m.settings["Nh"] = 6
+        self.m.settings["Nv"] = 4
+
+    def tearDown(self):
+        self.tmp_dir.cleanup()
+
+    def test_calibrated_total_time(self):
+        S = self.m.settings
+        t0 = time.time()
+        self.m._thread_run()
+        duration = time.time() - t0
+
+        self.assertEqual(S["timing_runs"], 1)
+        # every line start includes a 10 ms settle sleep of the slow move
+        self.assertGreater(S["timing_line_cost"], 0.005)
+        self.assertGreater(S["timing_frame_cost"], 0.04)
+        self.assertGreater(S["timing_pixel_cost"], 0.0015)
+        self.assertAlmostEqual(S["total_time"], duration, delta=0.3 * duration)
+
+        self.m._t0 = time.time()
+        self.assertAlmostEqual(
+            self.m.remaining_time(50.0), S["total_time"] / 2, delta=1e-9
+        )
+
+        S["use_timing_model"] = False
+        self.assertEqual(S["total_time"], self.m.Npixels * S["pixel_time"])
+
+    def test_conditions_change(self):
+        S = self.m.settings
+        self.m._thread_run()
+        costs = self.m.timing_model
+        self.assertTrue(self.m.timing_model_active())
+
+        # the fitted costs do not apply to another dwell time or pattern
+        for name, value in (("pixel_time", 0.5), ("scan_type", "serpentine")):
+            initial = S[name]
+            S[name] = value
+            self.assertFalse(self.m.timing_model_active())
+            self.assertEqual(S["total_time"], self.m.Npixels * S["pixel_time"])
+            S[name] = initial
+            self.assertTrue(self.m.timing_model_active())
+
+        # a run under new conditions starts over instead of blending
+        S["scan_type"] = "serpentine"
+        self.m.update_timing_model(np.arange(10) * 0.1, np.zeros(10, bool))
+        self.assertEqual(S["timing_runs"], 1)
+        self.assertAlmostEqual(S["timing_pixel_cost"], 0.1)
+        S["scan_type"] = "raster"
+        self.assertFalse(self.m.timing_model_active())
+        self.assertNotEqual(self.m.timing_model, costs)
+
+    def test_calibrate_is_lazy(self):
+        self.m.compute_scan_arrays()
+        t0 = 100.0
+        pixel_time = np.zeros(self.m.scan_shape)
+        index = np.asarray(self.m.scan_index_array)
+        # interrupted after 10 pixels
+        pixel_time[tuple(index[:10].T)] = t0 + 0.01 * np.arange(1, 11)
+        with mock.patch.object(
+            TrajectoryView, "__array__", side_effect=AssertionError("materialized")
+        ):
+            fitted = self.m.calibrate_timing(pixel_time, t0)
+        self.assertAlmostEqual(fitted.pixel_cost, 0.01)
+        self.assertEqual(self.m.settings["timing_runs"], 1)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,176 @@
+import glob
+import tempfile
+import unittest
+
+import h5py
+import numpy as np
+
+from ScopeFoundry import BaseMicroscopeApp
+from ScopeFoundry.sweeping import Collector, Sweep2D, SweepND
+from ScopeFoundry.sweeping.sweep_modes import (
+    SweepMode,
+    mk_data_shape,
+    mk_trajectory,
+    std_sweep_modes,
+)
+from ScopeFoundry.tests.benchmarks import sweep_trajectory_benchmark as legacy
+
+
+class SweepTrajectoryTest(unittest.TestCase):
+    """vectorized trajectories reproduce the former nested generators"""
+
+    def test_legacy_modes(self):
+        sizes = {2: (4, 5), 3: (3, 4, 4), 4: (2, 3, 4, 4)}
+        for ndim, (_, _, modes) in legacy.LEGACY.items():
+            for name, mode in modes.items():
+                lengths = list(sizes[ndim])
+                # co-moving actuators have the same number of steps
+                for group in mode.groups:
+                    for axis in group:
+                        lengths[axis] = sizes[ndim][group[-1]]
+                arrays = [np.linspace(i, i + 1, n) for i, n in enumerate(lengths)]
+                with self.subTest(ndim=ndim, mode=name):
+                    positions, indices = mk_trajectory(arrays, mode)
+                    expected_positions, expected_indices = legacy.legacy_trajectory(
+                        arrays, name
+                    )
+                    np.testing.assert_array_equal(positions, expected_positions)
+                    np.testing.assert_array_equal(indices, expected_indices)
+                    # every point lands in the data
+                    shape = mk_data_shape(lengths, mode)
+                    self.assertEqual(
+                        len(set(map(tuple, indices))), np.prod(shape, dtype=int)
+                    )
+                    self.assertTrue((indices < shape).all())
+
+    def test_serpentine_nd(self):
+        lengths = (3, 2, 4, 3, 5)
+        arrays = [np.arange(n) for n in lengths]
+        for name in ("serpentine", "serpentine_swap_order"):
+            mode = std_sweep_modes(len(lengths))[name]
+            positions, indices = mk_trajectory(arrays, mode)
+            self.assertEqual(len(positions), np.prod(lengths))
+            np.testing.assert_array_equal(positions, indices)
+            # a continuous path: every step moves one actuator by one step
+            steps = np.abs(np.diff(indices, axis=0))
+            np.testing.assert_array_equal(steps.sum(axis=1), 1)
+            self.assertEqual(len(set(map(tuple, indices))), np.prod(lengths))
+
+    def test_co_move_shape(self):
+        mode = SweepMode(((0,), (1, 2, 3)))
+        self.assertEqual(mk_data_shape((2, 5, 5, 5), mode), (2, 1, 1, 5))
+        arrays = [np.arange(2), np.arange(5), np.arange(5) * 2, np.arange(5) * 3]
+        positions, indices = mk_trajectory(arrays, mode)
+        np.testing.assert_array_equal(positions[:5, 3], 3 * positions[:5, 1])
+        np.testing.assert_array_equal(indices[:, 1:3], 0)
+        with self.assertRaises(ValueError):
+            mk_trajectory(arrays[:3], mode)
+
+
+class IndexCollector(Collector):
+    name = "index"
+    points_on_disk = []
+
+    def run(self, index, host_measurement, *args, **kwargs):
+        self.data = {"value": float(index)}
+        # points whose positions and indices are in the file
+        dsets = host_measurement.scan_data.point_dsets
+        self.points_on_disk.append(
+            dsets["indices"].dset.attrs["logical_length"] if "indices" in dsets else 0
+        )
+
+
+class SweepNDTest(unittest.TestCase):
+
+    @classmethod
+    def setUpClass(cls):
+        cls.app = BaseMicroscopeApp([])
+        cls.positions = {}
+        actuators = [
+            (
+                name,
+                lambda name=name: cls.positions.get(name, 0.0),
+                lambda value, name=name: cls.positions.__setitem__(name, value),
+            )
+            for name in "abc"
+        ]
+        kwargs = dict(
+            actuators=actuators,
+            collectors=[IndexCollector(cls.app)],
+            n_read_any_settings=0,
+            n_any_measurements=0,
+        )
+        cls.sweep_3 = cls.app.add_measurement(
+            SweepND(cls.app, actuator_names="xyz", **kwargs)
+        )
+        cls.sweep_2d = cls.app.add_measurement(Sweep2D(cls.app, **kwargs))
+        for m in (cls.sweep_3, cls.sweep_2d):
+            m.setup_figure()
+            for name, actuator in zip(m.actuator_names, "abc"):
+                m.settings[f"actuator_{name}"] = actuator
+                m.settings[f"range_{name}_num"] = 3
+            m.settings["collection_delay"] = 0
+            m.settings["index_repetitions"] = 1
+
+    def setUp(self):
+        self.tmp_dir = tempfile.TemporaryDirectory()
+        self.app.settings["save_dir"] = self.tmp_dir.name
+
+    def tearDown(self):
+        self.tmp_dir.cleanup()
+
+    def run_sweep(self, m, scan_mode):
+        m.settings["scan_mode"] = scan_mode
+        m._thread_run()
+        (fname,) = glob.glob(f"{self.tmp_dir.name}/*.h5")
+        with h5py.File(fname, "r") as file:
+            group = file[f"measurement/{m.name}"]
+            return {name: group[name][()] for name in group if name != "settings"}
+
+    def test_modes(self):
+        self.assertEqual(
+            tuple(self.sweep_3.sweep_modes), tuple(std_sweep_modes(3).keys())
+        )
+        self.assertEqual(tuple(self.sweep_2d.sweep_modes)[0], "co-move")
+
+    def test_serpentine_3_actuators(self):
+        m = self.sweep_3
+        data = self.run_sweep(m, "serpentine")
+        arrays = [data[f"range_{name}"] for name in "xyz"]
+        positions, indices = mk_trajectory(arrays, m.sweep_modes["serpentine"])
+        np.testing.assert_array_equal(data["indices"], indices)
+        np.testing.assert_array_equal(data["positions"], positions)
+        np.testing.assert_array_equal(data["read_positions"], positions)
+        self.assertEqual(data["settle_times"].shape, (27, 3))
+
+    def test_points_written_per_line(self):
+        m = self.sweep_2d
+        m.settings["range_1_num"] = 3
+        collector = m.collectors[0]
+        for mode, expected in (
+            ("nested", [0, 0, 0, 3, 3, 3, 6, 6, 6]),
+            ("nested_swap_order", [0, 0, 0, 3, 3, 3, 6, 6, 6]),
+            # a single line
+            ("co-move", [0, 0, 0]),
+        ):
+            collector.points_on_disk = []
+            self.tmp_dir.cleanup()
+            self.setUp()
+            data = self.run_sweep(m, mode)
+            self.assertEqual(collector.points_on_disk, expected)
+            self.assertEqual(len(data["indices"]), len(expected))
+
+    def test_sweep_2d_co_move(self):
+        m = self.sweep_2d
+        m.settings["range_1_num"] = 5
+        data = self.run_sweep(m, "co-move")
+        # actuator 1 takes the number of steps of actuator 2
+        self.assertEqual(m.settings["range_1_num"], 3)
+        np.testing.assert_array_equal(data["indices"], [[0, 0], [0, 1], [0, 2]])
+        np.testing.assert_array_equal(
+            data["positions"], np.stack([data["range_1"], data["range_2"]], axis=1)
+        )
+
+
+if __name__ == "__main__":
+    unittest.main()
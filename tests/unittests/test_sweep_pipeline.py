@@ -0,0 +1,238 @@
+import glob
+import tempfile
+import threading
+import time
+import unittest
+
+import h5py
+import numpy as np
+
+from ScopeFoundry import BaseMicroscopeApp
+from ScopeFoundry.sweeping import Collector, SweepND
+from ScopeFoundry.sweeping.sweep_ND import SWEEP_PHASES
+
+MOVE_TIME = 0.02
+EXPOSURE = 0.01
+READOUT = 0.02
+
+
+class Stage:
+
+    def __init__(self):
+        self.position = 0.0
+        self.moving = False
+
+    def write(self, position):
+        self.moving = True
+        time.sleep(MOVE_TIME)
+        self.position = position
+        self.moving = False
+
+    def read(self):
+        return self.position
+
+
+class CameraCollector(Collector):
+    """exposes in the background, the readout takes READOUT"""
+
+    name = "camera"
+    repeated_dset_names = ("image",)
+
+    def __init__(self, app, stage):
+        super().__init__(app)
+        self.stage = stage
+        self.exposed = threading.Event()
+        self.exposures = []
+        self.fetches = 0
+        # index at which the host is interrupted during the exposure
+        self.interrupt_at = None
+
+    def trigger(self, index, host_measurement):
+        self.exposed.clear()
+        position = self.stage.position
+        if index == self.interrupt_at:
+            host_measurement.interrupt_measurement_called = True
+            return
+
+        def expose():
+            # the stage must be at rest during the exposure
+            self.exposures.append(self.stage.moving)
+            time.sleep(EXPOSURE)
+            self.frame = np.full(4, position)
+            self.exposed.set()
+
+        threading.Thread(target=expose).start()
+
+    def is_ready(self):
+        return self.exposed.is_set()
+
+    def fetch(self):
+        self.fetches += 1
+        time.sleep(READOUT)
+        self.data = {"image": self.frame}
+        return self.data
+
+
+class SyncCollector(Collector):
+    name = "sync"
+    repeated_dset_names = ("value",)
+    fail_at = None
+
+    def run(self, index, host_measurement, *args, **kwargs):
+        if index == self.fail_at:
+            raise RuntimeError("sync collector failed")
+        self.data = {"value": float(index)}
+
+
+class SweepPipelineTest(unittest.TestCase):
+
+    @classmethod
+    def setUpClass(cls):
+        cls.app = BaseMicroscopeApp([])
+        cls.stage = Stage()
+        camera = CameraCollector(cls.app, cls.stage)
+        cls.m = cls.app.add_measurement(
+            SweepND(
+                cls.app,
+                actuators=[("stage", cls.stage.read, cls.stage.write)],
+                collectors=[camera, SyncCollector(cls.app)],
+                actuator_names="x",
+                n_read_any_settings=0,
+                n_any_measurements=0,
+            )
+        )
+        cls.m.setup_figure()
+        S = cls.m.settings
+        S["actuator_x"] = "stage"
+        S["range_x_num"] = 8
+        S["collection_delay"] = 0
+        S["camera_repetitions"] = 2
+        S["sync_repetitions"] = 1
+
+    def setUp(self):
+        self.tmp_dir = tempfile.TemporaryDirectory()
+        self.app.settings["save_dir"] = self.tmp_dir.name
+        self.camera = self.m.collectors[0]
+        self.camera.exposures = []
+        self.camera.fetches = 0
+        self.camera.interrupt_at = None
+        self.camera.keep_raw = True
+        self.m.collectors[1].fail_at = None
+        self.m.settings["data_storage"] = "memory"
+
+    def tearDown(self):
+        self.tmp_dir.cleanup()
+
+    def run_sweep(self, pipeline):
+        self.m.settings["pipeline_collectors"] = pipeline
+        self.m._thread_run()
+        (fname,) = glob.glob(f"{self.tmp_dir.name}/*.h5")
+        with h5py.File(fname, "r") as file:
+            group = file[f"measurement/{self.m.name}"]
+            data = {name: group[name][()] for name in group if name != "settings"}
+            data["phase_times"] = {
+                phase: group.attrs[f"{phase}_time"] for phase in SWEEP_PHASES
+            }
+        return data
+
+    def test_pipelined(self):
+        data = self.run_sweep(pipeline=True)
+        positions = data["range_x"]
+        np.testing.assert_array_equal(
+            data["camera_image_raw"],
+            np.broadcast_to(positions[:, None, None], (8, 2, 4)),
+        )
+        np.testing.assert_array_equal(data["sync_value_raw"][:, 0], np.arange(8))
+        self.assertFalse(any(self.camera.exposures))
+        # the readout of the last repetition overlaps the move
+        self.assertEqual(len(data["pipeline_overlap"]), 7)
+        self.assertGreater(data["pipeline_overlap"].min(), 0.25 * MOVE_TIME)
+
+        self.tmp_dir.cleanup()
+        self.setUp()
+        sync_data = self.run_sweep(pipeline=False)
+        self.assertNotIn("pipeline_overlap", sync_data)
+        # 8 moves of MOVE_TIME, 8x2 readouts of READOUT
+        phase_times = sync_data["phase_times"]
+        self.assertGreater(phase_times["move"], 8 * MOVE_TIME)
+        self.assertGreater(phase_times["collect"], 16 * READOUT)
+        np.testing.assert_array_equal(
+            sync_data["camera_image_raw"], data["camera_image_raw"]
+        )
+
+    def test_h5_storage(self):
+        expected = self.run_sweep(pipeline=True)
+        self.tmp_dir.cleanup()
+        self.setUp()
+        self.m.settings["data_storage"] = "h5"
+        data = self.run_sweep(pipeline=True)
+        self.assertEqual(self.m.end_state, "stop_success")
+        for name in ("camera_image_raw", "camera_image_std", "sync_value_raw"):
+            np.testing.assert_array_equal(data[name], expected[name])
+
+    def test_statistics_only(self):
+        self.camera.keep_raw = False
+        for storage in ("memory", "h5"):
+            self.tmp_dir.cleanup()
+            self.setUp()
+            self.camera.keep_raw = False
+            self.m.settings["data_storage"] = storage
+            data = self.run_sweep(pipeline=True)
+            self.assertEqual(self.m.end_state, "stop_success")
+            self.assertNotIn("camera_image_raw", data)
+            np.testing.assert_array_equal(
+                data["camera_image"],
+                np.broadcast_to(data["range_x"][:, None], (8, 4)),
+            )
+            np.testing.assert_array_equal(data["camera_image_std"], 0)
+            np.testing.assert_array_equal(data["camera_image_count"], 2)
+            # the display reads the statistics after the file is closed
+            self.m.settings["plot_option"] = "camera_image"
+            self.m.update_display()
+            np.testing.assert_array_equal(
+                self.m.line.getData()[1], data["camera_image"].ravel()
+            )
+
+    def test_interrupted_acquisition(self):
+        self.camera.interrupt_at = 3
+        data = self.run_sweep(pipeline=True)
+        # nothing is fetched from the interrupted acquisition
+        self.assertEqual(self.camera.fetches, 3 * 2)
+        np.testing.assert_array_equal(data["indices"][:, 0], np.arange(4))
+        self.assertEqual(self.m.end_state, "stop_interrupted")
+
+    def test_failure_cleanup(self):
+        self.m.collectors[1].fail_at = 3
+        self.m.settings["pipeline_collectors"] = True
+        with self.assertRaises(RuntimeError):
+            self.m._thread_run()
+        # the file is closed and the worker threads are shut down
+        self.assertFalse(self.m.h5_file)
+        names = [t.name for t in threading.enumerate()]
+        self.assertFalse(
+            [n for n in names if n.startswith(("AsyncH5Writer", "move_ahead"))]
+        )
+        (fname,) = glob.glob(f"{self.tmp_dir.name}/*.h5")
+        with h5py.File(fname, "r") as file:
+            group = file[f"measurement/{self.m.name}"]
+            np.testing.assert_array_equal(group["indices"][:, 0], np.arange(3))
+
+    def test_display(self):
+        data = self.run_sweep(pipeline=True)
+        m = self.m
+        m.settings["plot_option"] = "sync_value_raw"
+        m.update_display()
+        x, y = m.line.getData()
+        np.testing.assert_array_equal(x, np.arange(8))
+        np.testing.assert_array_equal(y, np.arange(8))
+        # nothing new to push
+        self.assertFalse(m.has_new_display_data("sync_value_raw"))
+        m.settings["plot_option"] = "camera_image_raw"
+        m.update_display()
+        np.testing.assert_array_equal(
+            m.line.getData()[1], np.repeat(data["range_x"], 4)
+        )
+
+
+if __name__ == "__main__":
+    unittest.main()